@@ -0,0 +1,956 @@
+#!/usr/bin/env python3
+"""
+多应用反向代理 - 在同一个端口下通过 /apps/<名称>/ 访问多个 marimo run 服务，
+转发WebSocket，复用上游连接并统计每个应用的请求延迟；每个应用可以运行多个副本并按会话负载均衡
+"""
+
+import argparse
+import asyncio
+import base64
+import hmac
+import html
+import json
+import os
+import re
+import secrets
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import OrderedDict, deque
+from pathlib import Path
+
+from stats_utils import percentile
+
+
+APPS_PREFIX = "/apps/"
+STATS_PATH = "/_proxy/stats"
+ROUTES_PATH = "/_proxy/routes/"
+
+# 扩缩容接口的令牌：服务端和客户端都从环境变量读取（不出现在命令行中），请求时放在头部
+TOKEN_ENV = "MARIMO_PROXY_TOKEN"
+TOKEN_HEADER = "X-Proxy-Token"
+
+# 由代理自己管理的逐跳头部，不转发给上游/客户端
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-connection"}
+
+# 每个应用保留的延迟样本数
+LATENCY_SAMPLES = 2048
+
+# 会话ID到副本映射的上限
+MAX_SESSIONS = 10000
+
+READ_SIZE = 64 * 1024
+
+
+def free_port(host="127.0.0.1"):
+    """让系统分配一个空闲端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def stop_on_signals(stop):
+    """收到 SIGINT/SIGTERM 时设置 stop 事件；Windows 的事件循环不支持 add_signal_handler，改用 signal.signal"""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        if sys.platform == "win32":
+            signal.signal(sig, lambda *_args: loop.call_soon_threadsafe(stop.set))
+        else:
+            loop.add_signal_handler(sig, stop.set)
+
+
+def get_header(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+async def read_head(reader):
+    """读取起始行和头部，返回 (起始行, [(名称, 值)])"""
+    data = await reader.readuntil(b"\r\n\r\n")
+    lines = data.decode("latin-1").split("\r\n")
+    headers = []
+    for line in lines[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers.append((key.strip(), value.strip()))
+    return lines[0], headers
+
+
+def build_head(start_line, headers):
+    lines = [start_line] + [f"{key}: {value}" for key, value in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def read_body(reader, headers):
+    """按 Content-Length 或 chunked 读取完整请求体（保留原始分块格式）"""
+    if (get_header(headers, "Transfer-Encoding") or "").lower().endswith("chunked"):
+        parts = []
+        while True:
+            line = await reader.readline()
+            parts.append(line)
+            size = int(line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                # 尾部头部，直到空行
+                while True:
+                    line = await reader.readline()
+                    parts.append(line)
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                return b"".join(parts)
+            parts.append(await reader.readexactly(size + 2))
+    length = int(get_header(headers, "Content-Length") or 0)
+    return await reader.readexactly(length) if length else b""
+
+
+async def relay_body(reader, writer, headers):
+    """把响应体原样转发给客户端；返回 False 表示只能读到连接关闭为止（连接不可复用）"""
+    if (get_header(headers, "Transfer-Encoding") or "").lower().endswith("chunked"):
+        while True:
+            line = await reader.readline()
+            writer.write(line)
+            size = int(line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                while True:
+                    line = await reader.readline()
+                    writer.write(line)
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                await writer.drain()
+                return True
+            remaining = size + 2
+            while remaining:
+                data = await reader.readexactly(min(remaining, READ_SIZE))
+                writer.write(data)
+                remaining -= len(data)
+            await writer.drain()
+
+    length = get_header(headers, "Content-Length")
+    if length is not None:
+        remaining = int(length)
+        while remaining:
+            data = await reader.readexactly(min(remaining, READ_SIZE))
+            writer.write(data)
+            await writer.drain()
+            remaining -= len(data)
+        return True
+
+    while data := await reader.read(READ_SIZE):
+        writer.write(data)
+        await writer.drain()
+    return False
+
+
+class UpstreamPool:
+    """到单个上游服务的 keep-alive 连接池"""
+
+    def __init__(self, host, port, max_idle=16):
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self.idle = []
+        self.opened = 0
+        self.reused = 0
+
+    async def acquire(self):
+        """返回 (reader, writer, 是否复用)"""
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                self.reused += 1
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.opened += 1
+        return reader, writer, False
+
+    def release(self, reader, writer, reusable):
+        if reusable and len(self.idle) < self.max_idle and not reader.at_eof():
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+
+class RouteStats:
+    """单个应用的请求计数和延迟样本"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.websockets = 0
+        self.active_websockets = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, latency, error=False):
+        self.requests += 1
+        if error:
+            self.errors += 1
+        else:
+            self.latencies.append(latency)
+
+    def snapshot(self):
+        values = sorted(self.latencies)
+        to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "websockets": self.websockets,
+            "active_websockets": self.active_websockets,
+            "mean_ms": to_ms(sum(values) / len(values)) if values else None,
+            "p50_ms": to_ms(percentile(values, 50)),
+            "p95_ms": to_ms(percentile(values, 95)),
+            "max_ms": to_ms(values[-1]) if values else None,
+        }
+
+
+class AppServer:
+    """由代理启动的一个 marimo run 进程（某个应用的一个副本），base URL 为 /apps/<名称>"""
+
+    def __init__(self, name, notebook, replica=0, port=None, host="127.0.0.1", extra_args=()):
+        self.name = name
+        self.replica = replica
+        self.notebook = Path(notebook).resolve()
+        self.host = host
+        self.port = port or free_port(host)
+        self.extra_args = list(extra_args)
+        self.process = None
+        self.pool = UpstreamPool(host, self.port)
+        self.stats = RouteStats()
+        # 进行中的HTTP请求和打开的WebSocket数，用于最少连接调度
+        self.active = 0
+        # 分配到此副本的新客户端数，活动连接数相同时用于轮转
+        self.assigned = 0
+        self.draining = False
+
+    @property
+    def id(self):
+        return f"{self.name}-{self.replica}"
+
+    @property
+    def base_url(self):
+        return APPS_PREFIX + self.name
+
+    def command(self):
+        return [
+            sys.executable, "-m", "marimo", "run", str(self.notebook),
+            "--host", self.host, "--port", str(self.port),
+            "--base-url", self.base_url, "--headless", *self.extra_args,
+        ]
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self, timeout=60):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command(), cwd=self.notebook.parent, stdout=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.returncode is not None:
+                raise RuntimeError(f"{self.id}: marimo 进程退出，返回码 {self.process.returncode}")
+            try:
+                _, writer = await asyncio.open_connection(self.host, self.port)
+                writer.close()
+                return
+            except OSError:
+                await asyncio.sleep(0.2)
+        raise RuntimeError(f"{self.id}: 等待端口 {self.port} 超时")
+
+    async def stop(self, timeout=5):
+        self.pool.close()
+        if not self.running:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+    def snapshot(self):
+        snapshot = self.stats.snapshot()
+        snapshot.update({
+            "id": self.id,
+            "port": self.port,
+            "pid": self.process.pid if self.process else None,
+            "running": self.running,
+            "draining": self.draining,
+            "active": self.active,
+            "assigned": self.assigned,
+            "pool": {"opened": self.pool.opened, "reused": self.pool.reused, "idle": len(self.pool.idle)},
+        })
+        return snapshot
+
+
+class ReplicaPool:
+    """
+    同一个笔记本的一组副本：
+    会话优先按 marimo 会话ID、其次按 cookie 粘滞到同一副本（页面里的 server token 只对签发它的进程有效），
+    新客户端分配给活动连接最少的副本；副本可以在运行中增加或排空后移除。
+    """
+
+    def __init__(self, name, notebook, replicas=1, extra_args=()):
+        self.name = name
+        self.notebook = Path(notebook).resolve()
+        self.extra_args = list(extra_args)
+        self.replicas = []
+        self.stats = RouteStats()
+        self.sessions = OrderedDict()
+        self.next_replica = 0
+        self.initial = replicas
+
+    @property
+    def base_url(self):
+        return APPS_PREFIX + self.name
+
+    @property
+    def cookie_name(self):
+        return f"marimo_ui_replica_{self.name.replace('.', '_')}"
+
+    @property
+    def running(self):
+        return any(replica.running for replica in self.replicas)
+
+    def new_replica(self):
+        replica = AppServer(self.name, self.notebook, self.next_replica, extra_args=self.extra_args)
+        self.next_replica += 1
+        return replica
+
+    async def start(self):
+        replicas = [self.new_replica() for _ in range(self.initial)]
+        results = await asyncio.gather(*(replica.start() for replica in replicas), return_exceptions=True)
+        for replica, result in zip(replicas, results):
+            if isinstance(result, Exception):
+                print(f"启动失败: {result}", file=sys.stderr)
+            else:
+                self.replicas.append(replica)
+                print(f"{replica.id}: {self.notebook} -> 127.0.0.1:{replica.port}")
+
+    async def add(self):
+        replica = self.new_replica()
+        await replica.start()
+        self.replicas.append(replica)
+        print(f"已添加副本 {replica.id} -> 127.0.0.1:{replica.port}")
+        return replica
+
+    async def remove(self, replica_id=None, timeout=300):
+        """排空并停止一个副本（默认取活动连接最少的），至少保留一个副本"""
+        candidates = [replica for replica in self.replicas if not replica.draining]
+        if replica_id is not None:
+            candidates = [replica for replica in candidates if replica.id == replica_id]
+        if not candidates or len([replica for replica in self.replicas if not replica.draining]) <= 1:
+            raise ValueError("没有可以移除的副本（至少保留一个）")
+        replica = min(candidates, key=lambda candidate: candidate.active)
+        replica.draining = True
+        deadline = time.monotonic() + timeout
+        while replica.active and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+        await replica.stop()
+        self.replicas.remove(replica)
+        for session_id in [key for key, value in self.sessions.items() if value is replica]:
+            del self.sessions[session_id]
+        print(f"已移除副本 {replica.id}")
+        return replica
+
+    async def stop(self):
+        await asyncio.gather(*(replica.stop() for replica in self.replicas))
+
+    def choose(self, session_id, cookie):
+        """返回 (副本, 是否需要下发cookie)"""
+        replica = self.sessions.get(session_id) if session_id else None
+        if replica is not None and replica.running:
+            self.sessions.move_to_end(session_id)
+            return replica, False
+
+        live = [replica for replica in self.replicas if replica.running]
+        sticky = next((replica for replica in live if replica.id == cookie and not replica.draining), None)
+        replica = sticky or min(
+            (replica for replica in live if not replica.draining),
+            key=lambda candidate: (candidate.active, candidate.assigned),
+            default=None,
+        )
+        if replica is not None and sticky is None:
+            replica.assigned += 1
+        if replica is not None and session_id:
+            self.sessions[session_id] = replica
+            if len(self.sessions) > MAX_SESSIONS:
+                self.sessions.popitem(last=False)
+        return replica, replica is not None and sticky is None
+
+    def snapshot(self):
+        snapshot = self.stats.snapshot()
+        snapshot.update({
+            "notebook": str(self.notebook),
+            "running": self.running,
+            "sessions": len(self.sessions),
+            "active_websockets": sum(replica.stats.active_websockets for replica in self.replicas),
+            "replicas": [replica.snapshot() for replica in self.replicas],
+            "pool": {
+                "opened": sum(replica.pool.opened for replica in self.replicas),
+                "reused": sum(replica.pool.reused for replica in self.replicas),
+            },
+        })
+        return snapshot
+
+
+def parse_cookies(headers):
+    cookies = {}
+    for key, value in headers:
+        if key.lower() == "cookie":
+            for part in value.split(";"):
+                name, _, cookie = part.strip().partition("=")
+                cookies[name] = cookie
+    return cookies
+
+
+def session_id_of(headers, query):
+    """marimo 的会话ID：WebSocket 在查询参数 session_id 中，API 请求在 Marimo-Session-Id 头部中"""
+    session_id = get_header(headers, "Marimo-Session-Id")
+    if session_id:
+        return session_id
+    return urllib.parse.parse_qs(query).get("session_id", [None])[0]
+
+
+class AppProxy:
+    """asyncio HTTP/1.1 反向代理，按路径前缀把请求分发到各个应用的副本"""
+
+    def __init__(self, routes, host="127.0.0.1", port=8000, token=None):
+        self.routes = {route.name: route for route in routes}
+        self.host = host
+        self.port = port
+        self.token = token
+        self.server = None
+        self.started = time.time()
+
+    async def start(self):
+        await asyncio.gather(*(route.start() for route in self.routes.values()))
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        print(f"代理已启动: http://{self.host}:{self.port}/", flush=True)
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await asyncio.gather(*(route.stop() for route in self.routes.values()))
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        try:
+            while True:
+                try:
+                    start_line, headers = await read_head(reader)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                try:
+                    method, target, version = start_line.split(" ", 2)
+                except ValueError:
+                    await self.respond(writer, 400, "Bad Request", b"", keep_alive=False)
+                    break
+                keep_alive = self.client_keep_alive(version, headers)
+                keep_alive = await self.dispatch(method, target, version, headers, reader, writer, keep_alive, peer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def client_keep_alive(version, headers):
+        connection = (get_header(headers, "Connection") or "").lower()
+        if version == "HTTP/1.0":
+            return "keep-alive" in connection
+        return "close" not in connection
+
+    async def respond(self, writer, status, reason, body, content_type="text/plain; charset=utf-8",
+                      keep_alive=True, extra_headers=()):
+        headers = [
+            ("Content-Type", content_type),
+            ("Content-Length", str(len(body))),
+            ("Connection", "keep-alive" if keep_alive else "close"),
+            *extra_headers,
+        ]
+        writer.write(build_head(f"HTTP/1.1 {status} {reason}", headers) + body)
+        await writer.drain()
+        return keep_alive
+
+    async def respond_json(self, writer, data, keep_alive, status=200, reason="OK"):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        return await self.respond(writer, status, reason, body, "application/json", keep_alive)
+
+    async def dispatch(self, method, target, version, headers, reader, writer, keep_alive, peer):
+        path, _, query = target.partition("?")
+        if path == STATS_PATH:
+            await read_body(reader, headers)
+            return await self.respond_json(writer, self.snapshot(), keep_alive)
+        if path.startswith(ROUTES_PATH):
+            await read_body(reader, headers)
+            if not self.authorized(headers):
+                return await self.respond_json(writer, {"error": f"缺少或错误的 {TOKEN_HEADER}"}, keep_alive,
+                                               401, "Unauthorized")
+            return await self.scale(method, path, query, writer, keep_alive)
+        if path in ("/", APPS_PREFIX.rstrip("/"), APPS_PREFIX):
+            await read_body(reader, headers)
+            return await self.respond(writer, 200, "OK", self.index_page(), "text/html; charset=utf-8", keep_alive)
+
+        route = None
+        if path.startswith(APPS_PREFIX):
+            route = self.routes.get(path[len(APPS_PREFIX):].split("/", 1)[0])
+        if route is None:
+            await read_body(reader, headers)
+            return await self.respond(writer, 404, "Not Found", f"未知应用: {path}".encode("utf-8"), keep_alive=keep_alive)
+        if path == route.base_url:
+            # marimo 前端使用相对路径，入口必须以 / 结尾
+            await read_body(reader, headers)
+            location = route.base_url + "/" + (f"?{query}" if query else "")
+            return await self.respond(writer, 301, "Moved Permanently", b"", keep_alive=keep_alive,
+                                      extra_headers=[("Location", location)])
+
+        replica, new_client = route.choose(session_id_of(headers, query), parse_cookies(headers).get(route.cookie_name))
+        if replica is None:
+            await read_body(reader, headers)
+            route.stats.record(0, error=True)
+            return await self.respond(writer, 503, "Service Unavailable", b"no running replica", keep_alive=keep_alive)
+        set_cookie = [("Set-Cookie", f"{route.cookie_name}={replica.id}; Path={route.base_url}/; HttpOnly; SameSite=Lax")] \
+            if new_client else []
+
+        forwarded = [(key, value) for key, value in headers if key.lower() not in HOP_BY_HOP]
+        forwarded += [
+            ("X-Forwarded-For", peer[0] if peer else ""),
+            ("X-Forwarded-Host", get_header(headers, "Host") or ""),
+            ("X-Forwarded-Proto", "http"),
+        ]
+        replica.active += 1
+        try:
+            if (get_header(headers, "Upgrade") or "").lower() == "websocket":
+                return await self.tunnel(route, replica, method, target, headers, forwarded, reader, writer)
+            return await self.forward(route, replica, method, target, forwarded, reader, writer, keep_alive, set_cookie)
+        finally:
+            replica.active -= 1
+
+    def authorized(self, headers):
+        """扩缩容会启动和结束进程，必须带有与代理相同的令牌"""
+        given = get_header(headers, TOKEN_HEADER)
+        return bool(self.token) and given is not None and hmac.compare_digest(given.encode(), self.token.encode())
+
+    async def scale(self, method, path, query, writer, keep_alive):
+        """POST /_proxy/routes/<名称>/replicas 增加副本，DELETE 排空并移除一个副本（可用 ?id= 指定）"""
+        parts = path[len(ROUTES_PATH):].strip("/").split("/")
+        route = self.routes.get(parts[0])
+        if route is None or parts[1:] != ["replicas"] or method not in ("POST", "DELETE"):
+            return await self.respond_json(writer, {"error": "用法: POST|DELETE /_proxy/routes/<名称>/replicas"},
+                                           keep_alive, 404, "Not Found")
+        try:
+            if method == "POST":
+                replica = await route.add()
+            else:
+                replica_id = urllib.parse.parse_qs(query).get("id", [None])[0]
+                replica = await route.remove(replica_id)
+        except (RuntimeError, ValueError) as e:
+            return await self.respond_json(writer, {"error": str(e)}, keep_alive, 409, "Conflict")
+        return await self.respond_json(writer, {"replica": replica.id, "route": route.snapshot()}, keep_alive)
+
+    async def forward(self, route, replica, method, target, headers, reader, writer, keep_alive, extra_headers):
+        """转发普通HTTP请求，上游连接放回连接池复用"""
+        started = time.perf_counter()
+        body = await read_body(reader, headers)
+        request = build_head(f"{method} {target} HTTP/1.1", headers + [("Connection", "keep-alive")]) + body
+
+        def record(error):
+            elapsed = time.perf_counter() - started
+            route.stats.record(elapsed, error)
+            replica.stats.record(elapsed, error)
+
+        # 复用的空闲连接可能已被上游关闭，此时换新连接重试一次
+        for _ in range(2):
+            try:
+                upstream_reader, upstream_writer, reused = await replica.pool.acquire()
+            except OSError as e:
+                record(error=True)
+                message = f"无法连接到 {replica.id}: {e}".encode("utf-8")
+                return await self.respond(writer, 502, "Bad Gateway", message, keep_alive=keep_alive)
+            try:
+                upstream_writer.write(request)
+                await upstream_writer.drain()
+                status_line, response_headers = await read_head(upstream_reader)
+                break
+            except (asyncio.IncompleteReadError, ConnectionError):
+                upstream_writer.close()
+                if not reused:
+                    record(error=True)
+                    return await self.respond(writer, 502, "Bad Gateway", b"upstream closed", keep_alive=keep_alive)
+        else:
+            # 两次取到的都是已被上游关闭的复用连接
+            record(error=True)
+            return await self.respond(writer, 502, "Bad Gateway", b"upstream closed", keep_alive=keep_alive)
+
+        status = int(status_line.split(" ", 2)[1])
+        upstream_keep_alive = "close" not in (get_header(response_headers, "Connection") or "").lower()
+        no_body = method == "HEAD" or status in (204, 304) or 100 <= status < 200
+        framed = no_body or get_header(response_headers, "Content-Length") is not None or \
+            (get_header(response_headers, "Transfer-Encoding") or "").lower().endswith("chunked")
+        # 没有长度信息的响应只能读到上游关闭，客户端连接也随之关闭
+        keep_alive = keep_alive and framed
+
+        response_headers = [(key, value) for key, value in response_headers if key.lower() not in HOP_BY_HOP]
+        response_headers += list(extra_headers)
+        response_headers.append(("Connection", "keep-alive" if keep_alive else "close"))
+        writer.write(build_head(status_line, response_headers))
+        try:
+            reusable = True if no_body else await relay_body(upstream_reader, writer, response_headers)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            upstream_writer.close()
+            record(error=True)
+            return False
+        replica.pool.release(upstream_reader, upstream_writer, reusable and upstream_keep_alive)
+        record(error=status >= 500)
+        return keep_alive
+
+    async def tunnel(self, route, replica, method, target, headers, forwarded, reader, writer):
+        """WebSocket 升级：建立独立的上游连接后双向转发原始字节"""
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(replica.host, replica.port)
+        except OSError as e:
+            route.stats.record(0, error=True)
+            replica.stats.record(0, error=True)
+            return await self.respond(writer, 502, "Bad Gateway", str(e).encode("utf-8"), keep_alive=False)
+
+        upgrade = [("Connection", get_header(headers, "Connection") or "Upgrade")]
+        upstream_writer.write(build_head(f"{method} {target} HTTP/1.1", forwarded + upgrade))
+        await upstream_writer.drain()
+
+        async def pipe(source, destination):
+            try:
+                while data := await source.read(READ_SIZE):
+                    destination.write(data)
+                    await destination.drain()
+            except ConnectionError:
+                pass
+
+        for stats in (route.stats, replica.stats):
+            stats.websockets += 1
+            stats.active_websockets += 1
+        tasks = [
+            asyncio.create_task(pipe(reader, upstream_writer)),
+            asyncio.create_task(pipe(upstream_reader, writer)),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            upstream_writer.close()
+            for stats in (route.stats, replica.stats):
+                stats.active_websockets -= 1
+        return False
+
+    def snapshot(self):
+        return {
+            "uptime": time.time() - self.started,
+            "routes": {name: route.snapshot() for name, route in self.routes.items()},
+        }
+
+    def index_page(self):
+        rows = "".join(
+            f'<li><a href="{html.escape(route.base_url)}/">{html.escape(name)}</a> '
+            f'<small>{html.escape(route.notebook.name)} - {len(route.replicas)} 个副本'
+            f'{"" if route.running else " (未运行)"}</small></li>'
+            for name, route in sorted(self.routes.items())
+        )
+        return (
+            "<!doctype html><meta charset='utf-8'><title>marimo apps</title>"
+            f"<h1>marimo 应用</h1><ul>{rows}</ul><p><a href='{STATS_PATH}'>延迟统计</a></p>"
+        ).encode("utf-8")
+
+
+def parse_apps(specs):
+    """解析 [名称=]笔记本路径，名称默认取文件名（去掉 _marimo 后缀），重名时追加序号"""
+    apps = []
+    used = set()
+    for spec in specs:
+        name, sep, path = spec.partition("=")
+        if not sep:
+            path = spec
+            name = Path(path).stem.removesuffix("_marimo")
+        # 名称出现在URL和 --base-url 中，只保留ASCII字母数字和 -_.
+        name = "".join(char for char in name if char.isascii() and (char.isalnum() or char in "-_."))
+        name = name.strip("-_.") or "app"
+        base, counter = name, 2
+        while name in used:
+            name = f"{base}-{counter}"
+            counter += 1
+        used.add(name)
+        apps.append((name, path))
+    return apps
+
+
+async def serve(args):
+    extra_args = ["--session-ttl", str(args.session_ttl)]
+    if args.include_code:
+        extra_args.append("--include-code")
+    routes = [ReplicaPool(name, path, args.replicas, extra_args) for name, path in parse_apps(args.notebooks)]
+    token = os.environ.get(TOKEN_ENV)
+    if not token:
+        token = secrets.token_urlsafe(16)
+        print(f"扩缩容令牌（{TOKEN_ENV}）: {token}", flush=True)
+    proxy = AppProxy(routes, args.host, args.port, token)
+
+    stop = asyncio.Event()
+    stop_on_signals(stop)
+
+    try:
+        await proxy.start()
+        await stop.wait()
+    finally:
+        print("正在停止代理和所有应用...")
+        await proxy.stop()
+
+
+def request_json(url, method="GET", timeout=2, headers=None):
+    request = urllib.request.Request(url, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(json.loads(e.read().decode("utf-8")).get("error", str(e))) from e
+
+
+def fetch_stats(url, timeout=2):
+    return request_json(url.rstrip("/") + STATS_PATH, timeout=timeout)
+
+
+def scale_route(url, name, add=True, replica_id=None, timeout=300, token=None):
+    """增加或移除一个副本；移除会等待副本上的连接排空。token 默认取环境变量 MARIMO_PROXY_TOKEN"""
+    target = f"{url.rstrip('/')}{ROUTES_PATH}{urllib.parse.quote(name)}/replicas"
+    if replica_id:
+        target += f"?id={urllib.parse.quote(replica_id)}"
+    token = token or os.environ.get(TOKEN_ENV)
+    if not token:
+        raise RuntimeError(f"请设置环境变量 {TOKEN_ENV} 为代理启动时的扩缩容令牌")
+    return request_json(target, "POST" if add else "DELETE", timeout, {TOKEN_HEADER: token})
+
+
+def format_stats(stats):
+    fmt = lambda value: f"{value:.1f}" if value is not None else "-"
+    lines = [f"{'应用/副本':<20} {'请求':>8} {'错误':>6} {'WS':>4} {'平均ms':>9} {'p50ms':>9} {'p95ms':>9} {'连接复用':>8}"]
+    for name, route in sorted(stats["routes"].items()):
+        rows = [(name, route)] + [(f"  {replica['id']}", replica) for replica in route["replicas"]]
+        for label, entry in rows:
+            lines.append(
+                f"{label:<20} {entry['requests']:>8} {entry['errors']:>6} {entry['active_websockets']:>4} "
+                f"{fmt(entry['mean_ms']):>9} {fmt(entry['p50_ms']):>9} {fmt(entry['p95_ms']):>9} "
+                f"{entry['pool']['reused']:>8}"
+            )
+    return "\n".join(lines)
+
+
+# ---- 负载测试 ----
+
+async def ws_connect(host, port, path, headers):
+    """最小的 WebSocket 客户端握手（只用于负载测试接收服务器消息）"""
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode("ascii")
+    writer.write(build_head(f"GET {path} HTTP/1.1", [
+        ("Host", f"{host}:{port}"), ("Upgrade", "websocket"), ("Connection", "Upgrade"),
+        ("Sec-WebSocket-Key", key), ("Sec-WebSocket-Version", "13"), *headers,
+    ]))
+    await writer.drain()
+    status_line, _ = await read_head(reader)
+    if " 101 " not in status_line + " ":
+        writer.close()
+        raise RuntimeError(f"WebSocket 握手失败: {status_line}")
+    return reader, writer
+
+
+async def ws_recv(reader, writer):
+    """读取一条完整的文本消息，自动回复 ping，连接关闭时返回 None"""
+    message = b""
+    while True:
+        first, second = await reader.readexactly(2)
+        opcode, length = first & 0x0F, second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await reader.readexactly(8))[0]
+        payload = await reader.readexactly(length)
+        if opcode == 0x8:
+            return None
+        if opcode == 0x9:
+            mask = os.urandom(4)
+            masked = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+            writer.write(bytes([0x8A, 0x80 | len(payload)]) + mask + masked)
+            continue
+        if opcode in (0x0, 0x1, 0x2):
+            message += payload
+            if first & 0x80:
+                return message.decode("utf-8")
+
+
+def http_request(url, method="GET", body=None, headers=None, timeout=60):
+    """返回 (响应体, Set-Cookie 列表)"""
+    request = urllib.request.Request(url, data=body, headers=headers or {}, method=method)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read().decode("utf-8", errors="replace"), response.headers.get_all("Set-Cookie") or []
+
+
+async def run_session(host, port, name):
+    """模拟一个浏览器会话：加载页面、打开WebSocket、实例化内核并等待全部单元格运行完成"""
+    started = time.perf_counter()
+    base = f"http://{host}:{port}{APPS_PREFIX}{name}/"
+    page, set_cookies = await asyncio.to_thread(http_request, base)
+    cookie = "; ".join(value.split(";", 1)[0] for value in set_cookies)
+    token = re.search(r'marimo-server-token data-token="([^"]*)"', page)
+    session_id = "s_" + uuid.uuid4().hex[:6]
+    cookie_headers = [("Cookie", cookie)] if cookie else []
+
+    reader, writer = await ws_connect(host, port, f"{APPS_PREFIX}{name}/ws?session_id={session_id}", cookie_headers)
+    try:
+        while (message := await ws_recv(reader, writer)) is not None:
+            if json.loads(message).get("op") == "kernel-ready":
+                break
+        headers = {"Content-Type": "application/json", "Marimo-Session-Id": session_id, **dict(cookie_headers)}
+        if token:
+            headers["Marimo-Server-Token"] = token.group(1)
+        body = json.dumps({"objectIds": [], "values": [], "autoRun": True}).encode("utf-8")
+        await asyncio.to_thread(http_request, base + "api/kernel/instantiate", "POST", body, headers)
+        while (message := await ws_recv(reader, writer)) is not None:
+            if json.loads(message).get("op") == "completed-run":
+                break
+    finally:
+        writer.close()
+    return time.perf_counter() - started
+
+
+async def load_test(host, port, name, sessions, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            try:
+                latencies.append(await run_session(host, port, name))
+            except (OSError, RuntimeError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(sessions)))
+    elapsed = time.perf_counter() - started
+    values = sorted(latencies)
+    return {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed": elapsed,
+        "throughput": len(values) / elapsed if elapsed else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "mean": sum(values) / len(values) if values else None,
+    }
+
+
+def bench(notebook, replica_counts, sessions, concurrency):
+    """分别以不同副本数启动代理，对同一个笔记本做会话级负载测试"""
+    results = []
+    name = parse_apps([notebook])[0][0]
+    for replicas in replica_counts:
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "serve", notebook, "--replicas", str(replicas),
+             "--port", str(port)],
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.monotonic() + 120
+            while True:
+                try:
+                    fetch_stats(f"http://127.0.0.1:{port}", timeout=1)
+                    break
+                except (OSError, RuntimeError):
+                    if process.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError(f"代理启动失败（{replicas} 个副本）")
+                    time.sleep(0.3)
+            # 预热：每个副本至少跑一个会话，避免把首次导入算进去
+            asyncio.run(load_test("127.0.0.1", port, name, replicas, replicas))
+            result = asyncio.run(load_test("127.0.0.1", port, name, sessions, concurrency))
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        result["replicas"] = replicas
+        results.append(result)
+        # 全部会话失败时没有延迟样本，百分位数为 None
+        ms = lambda value: f"{value * 1000:.0f}" if value is not None else "-"
+        throughput = f"{result['throughput']:.2f}" if result["throughput"] is not None else "-"
+        print(f"{replicas} 个副本: {throughput} 会话/秒, "
+              f"p50 {ms(result['p50'])} ms, p95 {ms(result['p95'])} ms, 失败 {result['errors']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在一个端口下反向代理多个 marimo 应用")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="启动代理和各个应用")
+    serve_parser.add_argument("notebooks", nargs="+", help="笔记本路径，可写成 名称=路径")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--replicas", type=int, default=1, help="每个应用启动的副本数")
+    serve_parser.add_argument("--session-ttl", type=int, default=120, help="会话超时（秒）")
+    serve_parser.add_argument("--include-code", action="store_true", help="在应用中包含代码")
+
+    stats_parser = subparsers.add_parser("stats", help="查看运行中代理的逐应用延迟")
+    stats_parser.add_argument("--url", default="http://127.0.0.1:8000")
+
+    scale_parser = subparsers.add_parser("scale", help=f"为运行中的应用增加或移除副本（令牌取自 {TOKEN_ENV}）")
+    scale_parser.add_argument("name", help="应用名称")
+    scale_parser.add_argument("action", choices=["add", "remove"])
+    scale_parser.add_argument("--id", help="要移除的副本ID（默认活动连接最少的）")
+    scale_parser.add_argument("--url", default="http://127.0.0.1:8000")
+
+    bench_parser = subparsers.add_parser("bench", help="比较不同副本数下的会话吞吐量和延迟")
+    bench_parser.add_argument("notebook")
+    bench_parser.add_argument("--replicas", type=int, nargs="+", default=[1, 4], help="要比较的副本数")
+    bench_parser.add_argument("--sessions", type=int, default=40, help="每轮模拟的会话数")
+    bench_parser.add_argument("--concurrency", type=int, default=8, help="并发会话数")
+    bench_parser.add_argument("--output", help="把结果写入JSON文件")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        asyncio.run(serve(args))
+    elif args.command == "stats":
+        print(format_stats(fetch_stats(args.url)))
+    elif args.command == "scale":
+        try:
+            result = scale_route(args.url, args.name, args.action == "add", args.id)
+        except RuntimeError as e:
+            sys.exit(str(e))
+        print(f"{'已添加' if args.action == 'add' else '已移除'}副本 {result['replica']}，"
+              f"当前 {len(result['route']['replicas'])} 个副本")
+    else:
+        results = bench(args.notebook, args.replicas, args.sessions, args.concurrency)
+        if args.output:
+            Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
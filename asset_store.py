@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+共享静态资源 - html-wasm 导出所需的 marimo 前端资源按内容哈希只保存一份，
+每个导出通过硬链接（跨文件系统时退回复制）或指向共享目录的相对地址引用它们
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from marimo_internals import marimo_internals
+
+
+ASSET_MODES = ("copy", "link", "shared")
+
+# shared 模式下共享资源目录相对于输出目录的位置
+SHARED_DIR_NAME = "_marimo_assets"
+
+HASH_CHUNK = 1024 * 1024
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@marimo_internals("共享 WASM 资源")
+def marimo_static_root():
+    from marimo._server.export.exporter import ROOT
+
+    return Path(ROOT)
+
+
+def atomic_write(path, write):
+    """
+    write(临时路径) 写入同一目录下的唯一临时文件后改名为 path；
+    多个进程同时写同一路径时各自完整写完，最后一次改名生效。
+    临时文件由 write 创建而不用 mkstemp，权限按 umask 设置，不会变成只有所有者可读的 0600
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temp_path)
+        raise
+
+
+def place(source, target):
+    """
+    硬链接 source 到 target，不支持时复制；返回 "link"、"copy" 或 "skip"（已是同一文件）。
+    先建立临时文件再改名覆盖，多个进程同时建立同一目录时不会删除彼此刚建好的文件
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with contextlib.suppress(FileNotFoundError):
+        if os.path.samefile(source, target):
+            return "skip"
+    temp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        os.link(source, temp_path)
+        mode = "link"
+    except OSError:
+        shutil.copyfile(source, temp_path)
+        mode = "copy"
+    try:
+        os.replace(temp_path, target)
+    except OSError:
+        # Windows 上目标正被其他进程打开时不能覆盖；内容相同，目标已存在即可
+        if not target.exists():
+            raise
+    finally:
+        # 其他进程已经链接了同一对象时，rename 在两个硬链接之间什么也不做，临时名称仍然存在
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temp_path)
+    return mode
+
+
+class AssetStore:
+    """
+    objects/<前2位>/<sha256> 保存文件内容，bundles/<键>.json 记录一个资源包中
+    相对路径到哈希的映射；同一版本的资源包只在第一次使用时计算哈希
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.bundles = self.root / "bundles"
+
+    def object_path(self, digest):
+        return self.objects / digest[:2] / digest
+
+    def ingest(self, source_dir, key, exclude=("index.html",)):
+        """把目录加入存储，返回 {"digest": 资源包哈希, "files": {相对路径: 文件哈希}}"""
+        manifest_path = self.bundles / f"{key}.json"
+        if manifest_path.exists():
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            if all(self.object_path(digest).exists() for digest in manifest["files"].values()):
+                return manifest
+
+        source_dir = Path(source_dir)
+        files = {}
+        for path in sorted(source_dir.rglob("*")):
+            relative = path.relative_to(source_dir).as_posix()
+            if not path.is_file() or relative in exclude:
+                continue
+            digest = file_digest(path)
+            files[relative] = digest
+            stored = self.object_path(digest)
+            if not stored.exists():
+                # 并行导出时多个进程可能同时写入同一对象；内容由哈希决定，已存在即视为成功
+                try:
+                    atomic_write(stored, lambda temp_path, source=path: shutil.copy(source, temp_path))
+                except OSError:
+                    if not stored.exists():
+                        raise
+        bundle_digest = hashlib.sha256(json.dumps(files, sort_keys=True).encode("utf-8")).hexdigest()
+        manifest = {"digest": bundle_digest, "files": files}
+        atomic_write(manifest_path, lambda temp_path: Path(temp_path).write_text(
+            json.dumps(manifest, indent=1), encoding="utf-8"))
+        return manifest
+
+    def marimo_bundle(self):
+        """当前安装的 marimo 前端资源包，以版本号和安装路径为键"""
+        import marimo
+
+        root = marimo_static_root()
+        key = f"marimo-{marimo.__version__}-{hashlib.sha256(str(root).encode('utf-8')).hexdigest()[:12]}"
+        return self.ingest(root, key)
+
+    def materialize(self, manifest, target_dir):
+        """在目标目录中按清单建立全部文件，返回各方式的文件数"""
+        counts = {"link": 0, "copy": 0, "skip": 0}
+        for relative, digest in manifest["files"].items():
+            counts[place(self.object_path(digest), Path(target_dir) / relative)] += 1
+        return counts
+
+    def shared_dir(self, manifest, output_root):
+        """
+        输出根目录下按资源包哈希命名的共享目录，已存在时直接复用；
+        多个进程可能同时建立同一目录，place 保证互不干扰，标记文件最后写入
+        """
+        target = Path(output_root) / SHARED_DIR_NAME / manifest["digest"][:16]
+        marker = target / ".complete"
+        if not marker.exists():
+            self.materialize(manifest, target)
+            marker.touch()
+        return target
+
+
+def point_to_shared(html, manifest, relative_url):
+    """把 index.html 中对顶层静态文件（图标、manifest.json）的相对引用改为共享目录"""
+    for relative in manifest["files"]:
+        if "/" not in relative:
+            html = html.replace(f'="./{relative}"', f'="{relative_url}/{relative}"')
+    return html
+
+
+def disk_usage(directory):
+    """按 inode 去重的实际占用（字节），硬链接只计算一次"""
+    seen = set()
+    total = 0
+    for path in Path(directory).rglob("*"):
+        stat = path.lstat()
+        if not path.is_file() or (stat.st_dev, stat.st_ino) in seen:
+            continue
+        seen.add((stat.st_dev, stat.st_ino))
+        total += stat.st_blocks * 512
+    return total
+
+
+def bench(notebook, count):
+    """把同一笔记本导出 count 份 html-wasm，比较三种资源方式的耗时和磁盘占用"""
+    script = Path(__file__).resolve().parent / "multi_export.py"
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        copies = []
+        for index in range(count):
+            copy = Path(temp_dir) / "notebooks" / f"nb{index:03d}.py"
+            copy.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(notebook, copy)
+            copies.append(str(copy))
+        store = Path(temp_dir) / "store"
+        for mode in ASSET_MODES:
+            output_dir = Path(temp_dir) / mode
+            command = [sys.executable, str(script), *copies, "--formats", "html-wasm",
+                       "--output-dir", str(output_dir), "--wasm-assets", mode, "--asset-store", str(store)]
+            started = time.perf_counter()
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            elapsed = time.perf_counter() - started
+            # link 和 shared 的资源与存储共享 inode，另外单独报告存储大小
+            results[mode] = {"seconds": elapsed, "disk_bytes": disk_usage(output_dir)}
+        results["store_bytes"] = disk_usage(store)
+
+    print(f"{count} 个笔记本的 html-wasm 导出（单进程）")
+    for mode in ASSET_MODES:
+        print(f"  {mode:<7} {results[mode]['seconds']:6.2f} s  磁盘 {results[mode]['disk_bytes'] / 1024 ** 2:8.1f} MB")
+    print(f"  资源存储（所有导出共用一份） {results['store_bytes'] / 1024 ** 2:.1f} MB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="管理 html-wasm 导出的共享静态资源")
+    parser.add_argument("--store", default=".marimo_ui/assets", help="资源存储目录")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("ingest", help="把当前 marimo 版本的前端资源加入存储")
+    link_parser = subparsers.add_parser("link", help="在目录中建立资源的硬链接")
+    link_parser.add_argument("target")
+    bench_parser = subparsers.add_parser("bench", help="比较 copy、link、shared 三种方式")
+    bench_parser.add_argument("notebook")
+    bench_parser.add_argument("--count", type=int, default=20)
+    bench_parser.add_argument("--output", help="把结果写入JSON文件")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        results = bench(args.notebook, args.count)
+        if args.output:
+            Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        return
+
+    store = AssetStore(args.store)
+    started = time.perf_counter()
+    manifest = store.marimo_bundle()
+    if args.command == "ingest":
+        print(f"资源包 {manifest['digest'][:16]}: {len(manifest['files'])} 个文件，"
+              f"用时 {time.perf_counter() - started:.2f} 秒")
+    else:
+        counts = store.materialize(manifest, args.target)
+        print(f"硬链接 {counts['link']}，复制 {counts['copy']}，已存在 {counts['skip']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+单元格结果缓存 - 以单元格代码和输入值的哈希为键，把脚本模式运行的结果持久化到磁盘
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+
+# 默认缓存容量 2GB
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# 单元格源码中包含此标记时不缓存（用于依赖随机数、时间或外部文件的单元格）
+NO_CACHE_MARKER = "marimo-ui: no-cache"
+
+
+# 出现这些调用的单元格结果不确定，不缓存；同一单元格里调用了 seed() 的随机数除外
+NONDETERMINISTIC_CALLS = {"now", "today", "utcnow", "time", "perf_counter", "uuid1", "uuid4", "urandom", "open"}
+RANDOM_NAMES = {"random", "randn", "rand", "randint", "normal", "uniform", "choice", "shuffle", "default_rng"}
+
+
+def is_deterministic(cell):
+    """静态判断单元格结果是否可能每次不同（时间、随机数、读文件等）"""
+    seeded = False
+    uses_random = False
+    for node in ast.walk(cell.node):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", "")
+        if name == "seed":
+            seeded = True
+        elif name in RANDOM_NAMES:
+            uses_random = True
+        elif name in NONDETERMINISTIC_CALLS or name.startswith("read_"):
+            return False
+    return seeded or not uses_random
+
+
+def cell_code_hash(cell):
+    """单元格代码哈希，忽略注释、空行和单元格在文件中的位置"""
+    digest = hashlib.sha256()
+    if cell.kind != "cell":
+        # @app.function / @app.class_definition：签名、基类和装饰器都会影响行为
+        digest.update(ast.dump(cell.node, include_attributes=False).encode("utf-8"))
+        return digest.hexdigest()
+    node = ast.Module(body=cell.node.body, type_ignores=[])
+    digest.update(ast.dump(cell.node.args, include_attributes=False).encode("utf-8"))
+    digest.update(ast.dump(node, include_attributes=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def definition_hashes(graph, cell):
+    """
+    单元格直接或间接使用的 @app.function / @app.class_definition 的代码哈希 {名称: 哈希}；
+    这些定义是全局名称而不是单元格参数，修改它们也必须让缓存失效
+    """
+    hashes = {}
+    pending = [cell]
+    while pending:
+        current = pending.pop()
+        for node in ast.walk(current.node):
+            if not isinstance(node, ast.Name) or node.id in hashes:
+                continue
+            index = graph.definers.get(node.id)
+            if index is None or graph.cells[index].kind == "cell":
+                continue
+            definer = graph.cells[index]
+            hashes[node.id] = cell_code_hash(definer)
+            pending.append(definer)
+    return hashes
+
+
+def value_hash(value):
+    """计算变量值的内容哈希，无法哈希时返回None"""
+    try:
+        return _value_hash(value)
+    except Exception:
+        return None
+
+
+def _value_hash(value):
+    numpy = sys.modules.get("numpy")
+    pandas = sys.modules.get("pandas")
+    digest = hashlib.sha256()
+
+    if numpy is not None and isinstance(value, numpy.ndarray) and value.dtype != object:
+        array = numpy.ascontiguousarray(value)
+        digest.update(f"ndarray:{array.dtype.str}:{array.shape}".encode("utf-8"))
+        digest.update(memoryview(array).cast("B"))
+        return digest.hexdigest()
+
+    if pandas is not None and isinstance(value, (pandas.DataFrame, pandas.Series)):
+        try:
+            hashed = pandas.util.hash_pandas_object(value, index=True).to_numpy()
+        except TypeError:
+            hashed = None
+        if hashed is not None:
+            digest.update(f"{type(value).__name__}:{value.shape}".encode("utf-8"))
+            if isinstance(value, pandas.DataFrame):
+                columns, dtypes = list(value.columns), list(value.dtypes)
+            else:
+                columns, dtypes = [value.name], [value.dtype]
+            digest.update(repr((columns, [str(dtype) for dtype in dtypes])).encode("utf-8"))
+            digest.update(memoryview(hashed).cast("B"))
+            return digest.hexdigest()
+
+    if isinstance(value, type(sys)):
+        return hashlib.sha256(f"module:{value.__name__}".encode("utf-8")).hexdigest()
+
+    try:
+        digest.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return None
+    return digest.hexdigest()
+
+
+def _dump_value(value, directory, name):
+    """按类型选择存储格式，返回清单条目"""
+    numpy = sys.modules.get("numpy")
+    pandas = sys.modules.get("pandas")
+
+    if numpy is not None and isinstance(value, numpy.ndarray) and value.dtype != object:
+        filename = f"{name}.npy"
+        numpy.save(directory / filename, value, allow_pickle=False)
+        return {"format": "npy", "file": filename}
+
+    if pandas is not None and isinstance(value, pandas.DataFrame):
+        filename = f"{name}.parquet"
+        try:
+            value.to_parquet(directory / filename)
+            return {"format": "parquet", "file": filename}
+        except Exception:
+            # 没有安装 pyarrow 或列类型不受支持时退回 pickle
+            (directory / filename).unlink(missing_ok=True)
+
+    filename = f"{name}.pkl"
+    with open(directory / filename, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {"format": "pickle", "file": filename}
+
+
+def _load_value(entry, directory):
+    path = directory / entry["file"]
+    if entry["format"] == "npy":
+        import numpy
+        return numpy.load(path, allow_pickle=False)
+    if entry["format"] == "parquet":
+        import pandas
+        return pandas.read_parquet(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class CellCache:
+    """
+    内容寻址的单元格结果缓存：
+    每个条目是 objects/<键前两位>/<键>/ 目录，包含 manifest.json 和各输出变量的数据文件；
+    命中时更新 manifest 的修改时间，超出容量时按最近最少使用淘汰。
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.max_bytes = max_bytes
+        # 缓存总大小的近似值，首次写入时扫描一次，之后增量累加
+        self._size = None
+
+    def entry_dir(self, key):
+        return self.objects / key[:2] / key
+
+    @staticmethod
+    def make_key(code_hash, input_hashes):
+        digest = hashlib.sha256(code_hash.encode("utf-8"))
+        for name in sorted(input_hashes):
+            digest.update(f"\0{name}={input_hashes[name]}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """返回 (输出变量, 输出哈希)，未命中返回None"""
+        directory = self.entry_dir(key)
+        manifest_path = directory / "manifest.json"
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            outputs = {name: _load_value(entry, directory) for name, entry in manifest["outputs"].items()}
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError):
+            return None
+        try:
+            os.utime(manifest_path)
+        except OSError:
+            pass
+        return outputs, {name: entry["hash"] for name, entry in manifest["outputs"].items()}
+
+    def put(self, key, outputs, output_hashes, elapsed=0.0):
+        """写入缓存条目；先写临时目录再原子重命名，并发写同一个键时保留先完成的"""
+        directory = self.entry_dir(key)
+        if directory.exists():
+            return True
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{key[:8]}-", dir=directory.parent))
+        try:
+            manifest = {"created": time.time(), "elapsed": elapsed, "outputs": {}}
+            for position, (name, value) in enumerate(outputs.items()):
+                entry = _dump_value(value, staging, f"v{position}")
+                entry["hash"] = output_hashes[name]
+                manifest["outputs"][name] = entry
+            size = sum(path.stat().st_size for path in staging.iterdir())
+            manifest["size"] = size
+            (staging / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+            os.replace(staging, directory)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            return False
+        if self._size is None:
+            self._size = sum(entry_size for _, entry_size, _ in self.entries())
+        else:
+            self._size += size
+        if self._size > self.max_bytes:
+            self.evict()
+        return True
+
+    def entries(self):
+        """返回 [(最近使用时间, 大小, 目录)]"""
+        result = []
+        if not self.objects.exists():
+            return result
+        for manifest_path in self.objects.glob("*/*/manifest.json"):
+            try:
+                stat = manifest_path.stat()
+                size = json.loads(manifest_path.read_text(encoding="utf-8")).get("size", 0)
+            except (OSError, ValueError):
+                continue
+            result.append((stat.st_mtime, size + stat.st_size, manifest_path.parent))
+        return result
+
+    def evict(self):
+        """超过容量时删除最近最少使用的条目"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, directory in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
+            removed += 1
+        self._size = total
+        return removed
+
+    def stats_path(self):
+        return self.root / "stats.json"
+
+    def load_stats(self):
+        try:
+            return json.loads(self.stats_path().read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {"hits": 0, "misses": 0}
+
+    def record(self, hits, misses):
+        """累加命中统计，由编排运行的主进程在运行结束时调用一次"""
+        if not hits and not misses:
+            return
+        stats = self.load_stats()
+        stats["hits"] = stats.get("hits", 0) + hits
+        stats["misses"] = stats.get("misses", 0) + misses
+        stats["updated"] = time.time()
+        self.root.mkdir(parents=True, exist_ok=True)
+        temp_path = self.root / f".stats-{uuid.uuid4().hex}.json"
+        temp_path.write_text(json.dumps(stats), encoding="utf-8")
+        os.replace(temp_path, self.stats_path())
+
+    def stats(self):
+        entries = self.entries()
+        counters = self.load_stats()
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            "entries": len(entries),
+            "size": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "hit_ratio": counters.get("hits", 0) / lookups if lookups else None,
+        }
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="管理单元格结果缓存")
+    parser.add_argument("action", choices=["stats", "clear", "evict"])
+    parser.add_argument("root", help="缓存目录")
+    parser.add_argument("--max-size", type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2, help="容量上限（MB）")
+    args = parser.parse_args()
+
+    cache = CellCache(args.root, args.max_size * 1024 ** 2)
+    if args.action == "clear":
+        cache.clear()
+        print(f"已清空缓存: {cache.root}")
+    elif args.action == "evict":
+        print(f"已淘汰 {cache.evict()} 个条目")
+    else:
+        stats = cache.stats()
+        ratio = f"{stats['hit_ratio'] * 100:.1f}%" if stats["hit_ratio"] is not None else "-"
+        print(f"条目: {stats['entries']}  大小: {stats['size'] / 1024 ** 2:.1f} MB  "
+              f"命中: {stats['hits']}  未命中: {stats['misses']}  命中率: {ratio}")
+
+
+if __name__ == "__main__":
+    main()
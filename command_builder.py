@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+命令构建 - 从表单值构建 argv 列表并直接启动（不经过 /bin/sh），
+路径和提示词中的引号、空格无需转义；附带 shell 启动开销的基准测试
+"""
+
+import argparse
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+def to_arg(value):
+    """把表单值转换为单个命令行参数，只接受字符串、数字和路径"""
+    if isinstance(value, bool):
+        raise TypeError("布尔值请使用 flag()")
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, os.PathLike):
+        value = os.fspath(value)
+    if not isinstance(value, str):
+        raise TypeError(f"不支持的参数类型: {type(value).__name__}")
+    if "\0" in value:
+        raise ValueError("参数中不能包含空字符")
+    return value
+
+
+# 值为密码或令牌的选项，预览、历史和日志中只显示掩码
+SECRET_OPTIONS = ("--token-password",)
+SECRET_MASK = "******"
+
+
+def mask_secrets(argv):
+    """把 SECRET_OPTIONS 的值替换为掩码，支持 "--name value" 和 "--name=value" 两种写法"""
+    masked = []
+    hide_next = False
+    for part in argv:
+        if hide_next:
+            masked.append(SECRET_MASK)
+            hide_next = False
+        elif part in SECRET_OPTIONS:
+            masked.append(part)
+            hide_next = True
+        elif part.split("=", 1)[0] in SECRET_OPTIONS and "=" in part:
+            masked.append(f"{part.split('=', 1)[0]}={SECRET_MASK}")
+        else:
+            masked.append(part)
+    return masked
+
+
+def has_secrets(argv):
+    """argv 中是否带有 SECRET_OPTIONS，这样的记录被掩码后不能原样重新运行"""
+    return any(part.split("=", 1)[0] in SECRET_OPTIONS for part in argv)
+
+
+class Command:
+    """argv 构建器；值为 None 或空字符串的参数和选项会被省略"""
+
+    def __init__(self, *program):
+        self.argv = [to_arg(part) for part in program]
+
+    def arg(self, *values):
+        for value in values:
+            if value is not None and value != "":
+                self.argv.append(to_arg(value))
+        return self
+
+    def option(self, name, value):
+        if value is not None and value != "":
+            self.argv.extend([name, to_arg(value)])
+        return self
+
+    def flag(self, name, enabled=True):
+        if enabled:
+            self.argv.append(name)
+        return self
+
+    def extend(self, argv):
+        self.argv.extend(to_arg(part) for part in argv)
+        return self
+
+    def __iter__(self):
+        return iter(self.argv)
+
+    def __len__(self):
+        return len(self.argv)
+
+    def masked(self):
+        """隐藏密码类选项值后的 argv，用于显示和持久化"""
+        return mask_secrets(self.argv)
+
+    def preview(self):
+        """可以直接粘贴到 shell 中的等价命令（密码类选项的值已隐藏）"""
+        return shlex.join(self.masked())
+
+    def exact(self):
+        """逐个参数的精确表示（密码类选项的值已隐藏）"""
+        return json.dumps(self.masked(), ensure_ascii=False)
+
+    def __str__(self):
+        return self.preview()
+
+
+def uv_run(*program):
+    return Command("uv", "run", *program)
+
+
+def marimo_command(*subcommand):
+    return uv_run("marimo", *subcommand)
+
+
+def script_command(script, *subcommand):
+    return uv_run("python", Path(script), *subcommand)
+
+
+def time_spawns(launch, count):
+    durations = []
+    for _ in range(count):
+        started = time.perf_counter()
+        launch()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def bench(argv, count, rounds=5):
+    """分别通过 shell 字符串和 argv 列表顺序启动 count 个相同的作业，交替进行多轮以减少噪声"""
+    command_line = shlex.join(argv)
+    launchers = {
+        "shell=True": lambda: subprocess.run(command_line, shell=True, stdout=subprocess.DEVNULL),
+        "argv": lambda: subprocess.run(argv, stdout=subprocess.DEVNULL),
+    }
+    for launch in launchers.values():
+        time_spawns(launch, 3)
+    samples = {name: [] for name in launchers}
+    for _ in range(rounds):
+        for name, launch in launchers.items():
+            samples[name].extend(time_spawns(launch, max(1, count // rounds)))
+
+    results = {}
+    for name, durations in samples.items():
+        results[name] = {
+            "jobs": len(durations),
+            "median_ms": statistics.median(durations) * 1000,
+            "mean_ms": statistics.mean(durations) * 1000,
+        }
+    saved = results["shell=True"]["median_ms"] - results["argv"]["median_ms"]
+    results["saved_per_job_ms"] = saved
+    results["saved_per_batch_ms"] = saved * count
+
+    print(f"作业: {command_line}")
+    for name in launchers:
+        print(f"{name:<11} n={results[name]['jobs']:<5} 中位数 {results[name]['median_ms']:7.2f} ms  "
+              f"平均 {results[name]['mean_ms']:7.2f} ms")
+    print(f"每个作业节省 {saved:.2f} ms（{saved / results['shell=True']['median_ms'] * 100:.1f}%），"
+          f"{count} 个作业的批量节省约 {results['saved_per_batch_ms']:.0f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="比较 shell=True 与 argv 列表启动作业的开销",
+        usage="%(prog)s [--count N] [--output FILE] [-- 命令 参数...]",
+    )
+    parser.add_argument("--count", type=int, default=200, help="每种方式启动的作业数")
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="作业命令，默认是空的 Python 进程")
+    args = parser.parse_args()
+
+    argv = args.command[1:] if args.command[:1] == ["--"] else args.command
+    results = bench(argv or [sys.executable, "-c", "pass"], args.count)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+"""
+命令日志 - 把界面启动的每个进程的 stdout/stderr 写入按大小轮转（可选gzip压缩）的日志文件，
+后台为已关闭的日志段建立三元组布隆过滤器索引，支持在大量历史日志中快速正则搜索和按页读取
+"""
+
+import argparse
+import gzip
+import itertools
+import json
+import os
+import queue
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+
+# 单个日志段的大小上限，超过后轮转到下一段
+DEFAULT_SEGMENT_BYTES = 8 * 1024 ** 2
+
+# 所有日志的总容量，超过后删除最旧的运行记录
+DEFAULT_MAX_TOTAL_BYTES = 2 * 1024 ** 3
+
+# 写入缓冲区大小和定时刷新间隔（秒）
+WRITE_BUFFER = 256 * 1024
+FLUSH_INTERVAL = 1.0
+
+# 分页读取：每隔多少行记录一个字节偏移，以及建立索引时每次读取的字节数
+LINE_INDEX_STRIDE = 1000
+READ_CHUNK = 1024 ** 2
+
+# 布隆过滤器参数：1M 位（128KB），3 个哈希函数；10 万个不同三元组时误判率约 2%
+BLOOM_BITS_LOG2 = 20
+BLOOM_MULTIPLIERS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D)
+
+STDOUT = "O"
+STDERR = "E"
+
+SEGMENT_PATTERN = re.compile(r"^(\d{6})\.log(\.gz)?$")
+
+# 日志行的前缀："<时间戳> O|E "，搜索时 ^ 锚定在前缀之后的消息开头
+LINE_PREFIX = r"\S+ [OE] "
+
+# 正则中的这些结构会让其中的字面量不再是必需的，遇到时不使用索引过滤
+UNSAFE_REGEX = re.compile(r"\||\(\?[=!<#]|\(\?P=|\(\?\w*\)")
+
+
+def load_settings(root):
+    defaults = {"compress": True, "segment_bytes": DEFAULT_SEGMENT_BYTES, "max_total_bytes": DEFAULT_MAX_TOTAL_BYTES}
+    try:
+        defaults.update(json.loads((Path(root) / "settings.json").read_text(encoding="utf-8")))
+    except (OSError, ValueError):
+        pass
+    return defaults
+
+
+def save_settings(root, settings):
+    Path(root).mkdir(parents=True, exist_ok=True)
+    (Path(root) / "settings.json").write_text(json.dumps(settings), encoding="utf-8")
+
+
+def compress_segment(path):
+    """把已轮转的日志段压缩为 .gz，先写临时文件再重命名"""
+    path = Path(path)
+    target = path.with_name(path.name + ".gz")
+    temp_path = path.with_name(path.name + ".gz.tmp")
+    with open(path, "rb") as source, gzip.open(temp_path, "wb", compresslevel=6) as destination:
+        shutil.copyfileobj(source, destination, WRITE_BUFFER)
+    os.replace(temp_path, target)
+    path.unlink()
+
+
+class LogWriter:
+    """
+    单个命令的日志写入器：读取管道的线程只把行放入队列，
+    由独立的写入线程批量写文件、轮转和压缩，因此磁盘速度不会反压到子进程
+    """
+
+    def __init__(self, run_dir, meta, segment_bytes=DEFAULT_SEGMENT_BYTES, compress=True):
+        self.run_dir = Path(run_dir)
+        self.meta = meta
+        self.segment_bytes = segment_bytes
+        self.compress = compress
+        self.queue = queue.SimpleQueue()
+        self.segment = 0
+        self.file = None
+        self.size = 0
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self.write_meta()
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    def write_meta(self):
+        temp_path = self.run_dir / "meta.json.tmp"
+        temp_path.write_text(json.dumps(self.meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(temp_path, self.run_dir / "meta.json")
+
+    def write(self, stream, text):
+        """可在任意线程调用"""
+        self.queue.put((time.time(), stream, text))
+
+    def close(self, returncode):
+        self.queue.put(None)
+        self.thread.join()
+        self.meta["end"] = time.time()
+        self.meta["returncode"] = returncode
+        self.meta["segments"] = self.segment
+        self.write_meta()
+
+    def open_segment(self):
+        self.segment += 1
+        self.file = open(self.run_dir / f"{self.segment:06d}.log", "wb", buffering=WRITE_BUFFER)
+        self.size = 0
+
+    def rotate(self):
+        self.file.close()
+        if self.compress:
+            path = self.run_dir / f"{self.segment:06d}.log"
+            threading.Thread(target=compress_segment, args=(path,), daemon=True).start()
+        self.open_segment()
+
+    def write_loop(self):
+        self.open_segment()
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                item = False
+            if item is None:
+                break
+            if item:
+                timestamp, stream, text = item
+                stamp = datetime.fromtimestamp(timestamp).isoformat(timespec="milliseconds")
+                data = f"{stamp} {stream} {text.rstrip(chr(10))}\n".encode("utf-8", errors="replace")
+                if self.size and self.size + len(data) > self.segment_bytes:
+                    self.rotate()
+                self.file.write(data)
+                self.size += len(data)
+            if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                self.file.flush()
+                last_flush = time.monotonic()
+        self.file.close()
+
+
+class LogStore:
+    """日志根目录：每次运行一个子目录，包含 meta.json 和编号的日志段"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.runs_dir = self.root / "runs"
+        self._cache = OrderedDict()
+
+    def create_run(self, command, cwd, pid=None):
+        settings = load_settings(self.root)
+        self.prune(settings["max_total_bytes"])
+        run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        meta = {"id": run_id, "command": command, "cwd": str(cwd), "start": time.time(), "pid": pid,
+                "compress": settings["compress"]}
+        return LogWriter(self.runs_dir / run_id, meta, settings["segment_bytes"], settings["compress"])
+
+    def runs(self):
+        """按开始时间倒序返回所有运行的元数据"""
+        result = []
+        if not self.runs_dir.exists():
+            return result
+        for run_dir in self.runs_dir.iterdir():
+            try:
+                result.append(json.loads((run_dir / "meta.json").read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return sorted(result, key=lambda meta: meta.get("start", 0), reverse=True)
+
+    def segments(self, run_id):
+        run_dir = self.runs_dir / run_id
+        found = {}
+        if run_dir.exists():
+            for path in run_dir.iterdir():
+                match = SEGMENT_PATTERN.match(path.name)
+                # 压缩进行中时 .log 和 .log.gz 可能同时存在，优先使用未压缩的
+                if match and (match.group(1) not in found or not match.group(2)):
+                    found[match.group(1)] = path
+        return [found[key] for key in sorted(found)]
+
+    @staticmethod
+    def is_active(meta):
+        """运行未结束且进程仍然存在"""
+        if "end" in meta:
+            return False
+        pid = meta.get("pid")
+        if not pid:
+            return False
+        try:
+            os.kill(pid, 0)
+            return True
+        except PermissionError:
+            return True
+        except OSError:
+            return False
+
+    def read_text(self, path):
+        path = Path(path)
+        opener = gzip.open if path.suffix == ".gz" else open
+        try:
+            with opener(path, "rb") as f:
+                return f.read().decode("utf-8", errors="replace")
+        except (OSError, EOFError):
+            # 压缩线程刚把 .log 换成 .log.gz
+            alternative = path.with_name(path.name + ".gz")
+            if path.suffix != ".gz" and alternative.exists():
+                return self.read_text(alternative)
+            return ""
+
+    def open_segment(self, path):
+        """以二进制方式打开日志段；压缩线程刚把 .log 换成 .log.gz 时打开压缩后的文件"""
+        path = Path(path)
+        if path.suffix != ".gz" and not path.exists():
+            alternative = path.with_name(path.name + ".gz")
+            if alternative.exists():
+                path = alternative
+        return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+    def line_index(self, path, cache_size=16):
+        """
+        日志段的 (总行数, 每 LINE_INDEX_STRIDE 行的起始字节偏移)：流式扫描一遍换行符，不把整段读入内存；
+        偏移按解压后的位置记录，.log 压缩成 .log.gz 后仍然有效。最近的索引按 (路径, 修改时间, 大小) 缓存
+        """
+        path = Path(path)
+        try:
+            stat = path.stat()
+            key = (str(path), stat.st_mtime, stat.st_size)
+        except OSError:
+            key = None
+        if key is not None and key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        count = 0
+        position = 0
+        offsets = [0]
+        last = b"\n"
+        try:
+            with self.open_segment(path) as f:
+                while chunk := f.read(READ_CHUNK):
+                    ends = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10)
+                    # 第 count+k+1 行在 ends[k] 结束，下一行从 ends[k]+1 开始
+                    first = -(count + 1) % LINE_INDEX_STRIDE
+                    offsets.extend((position + ends[first::LINE_INDEX_STRIDE] + 1).tolist())
+                    count += len(ends)
+                    position += len(chunk)
+                    last = chunk[-1:]
+        except (OSError, EOFError):
+            pass
+        if last != b"\n":
+            # 正在写入的段末尾可能有一行还没写完换行符
+            count += 1
+        index = (count, offsets)
+        if key is not None:
+            self._cache[key] = index
+            while len(self._cache) > cache_size:
+                self._cache.popitem(last=False)
+        return index
+
+    def line_count(self, path):
+        return self.line_index(path)[0]
+
+    def read_page(self, path, start, count):
+        """读取日志段中从第 start 行（从 0 开始）起的 count 行：跳到最近的索引偏移，只读取这一页"""
+        total, offsets = self.line_index(path)
+        start = max(0, min(start, total))
+        checkpoint = start // LINE_INDEX_STRIDE
+        skip = start - checkpoint * LINE_INDEX_STRIDE
+        try:
+            with self.open_segment(path) as f:
+                f.seek(offsets[checkpoint])
+                return [
+                    line.decode("utf-8", errors="replace").rstrip("\r\n")
+                    for line in itertools.islice(f, skip, skip + count)
+                ]
+        except (OSError, EOFError):
+            return []
+
+    def total_size(self):
+        return sum(path.stat().st_size for path in self.runs_dir.glob("*/*") if path.is_file()) \
+            if self.runs_dir.exists() else 0
+
+    def prune(self, max_total_bytes):
+        """总大小超过上限时从最旧的已结束运行开始删除"""
+        if not self.runs_dir.exists():
+            return 0
+        sizes = {}
+        for path in self.runs_dir.glob("*/*"):
+            if path.is_file():
+                sizes[path.parent.name] = sizes.get(path.parent.name, 0) + path.stat().st_size
+        total = sum(sizes.values())
+        removed = 0
+        for meta in reversed(self.runs()):
+            if total <= max_total_bytes:
+                break
+            if self.is_active(meta):
+                continue
+            shutil.rmtree(self.runs_dir / meta["id"], ignore_errors=True)
+            total -= sizes.get(meta["id"], 0)
+            removed += 1
+        return removed
+
+
+def trigram_codes(data):
+    """把字节串中所有位置的三元组编码为24位整数并去重（向量化，8MB 约 0.1 秒）"""
+    array = np.frombuffer(data, dtype=np.uint8).astype(np.uint32)
+    if len(array) < 3:
+        return np.empty(0, dtype=np.uint64)
+    codes = (array[:-2] << 16) | (array[1:-1] << 8) | array[2:]
+    return np.unique(codes).astype(np.uint64)
+
+
+def bloom_positions(codes):
+    """乘法哈希：每个三元组对应 len(BLOOM_MULTIPLIERS) 个位"""
+    return np.concatenate([((codes * multiplier) & 0xFFFFFFFF) >> (32 - BLOOM_BITS_LOG2)
+                           for multiplier in BLOOM_MULTIPLIERS])
+
+
+def build_bloom(text):
+    bits = np.zeros(1 << BLOOM_BITS_LOG2, dtype=bool)
+    bits[bloom_positions(trigram_codes(text.lower().encode("utf-8", errors="replace")))] = True
+    return np.packbits(bits, bitorder="little").tobytes()
+
+
+def bloom_contains(bits, codes):
+    """布隆过滤器中是否（可能）包含全部三元组"""
+    return all(bits[position >> 3] & (1 << (position & 7)) for position in bloom_positions(codes).tolist())
+
+
+def anchor_to_message(pattern):
+    """把字符类之外的 ^ 改写为 ^LINE_PREFIX，使 ^ 匹配消息开头而不是时间戳"""
+    result = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern):
+            result += pattern[i:i + 2]
+            i += 2
+        elif char == "[":
+            # 字符类开头的 ] 或 ^] 是普通字符
+            end = pattern.find("]", i + 2 if pattern[i + 1:i + 2] != "^" else i + 3)
+            end = end + 1 if end != -1 else len(pattern)
+            result += pattern[i:end]
+            i = end
+        elif char == "^":
+            result += "^" + LINE_PREFIX
+            i += 1
+        else:
+            result += char
+            i += 1
+    return result
+
+
+def required_literals(pattern):
+    """从正则中提取每个匹配都必须包含的字面量片段；无法确定时返回空列表（不过滤）"""
+    if UNSAFE_REGEX.search(pattern):
+        return []
+    literals = []
+    groups = []
+    current = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern):
+            following = pattern[i + 1]
+            if following.isalnum():
+                # \d \w \b 等字符类或断言
+                literals.append(current)
+                current = ""
+            else:
+                current += following
+            i += 2
+        elif char in "*?{":
+            # 前一个字符可能出现0次
+            literals.append(current[:-1])
+            current = ""
+            if char == "{":
+                i = pattern.find("}", i) + 1 or len(pattern)
+                continue
+            i += 1
+        elif char == "[":
+            literals.append(current)
+            current = ""
+            end = pattern.find("]", i + 2)
+            i = end + 1 if end != -1 else len(pattern)
+        elif char == "(":
+            literals.append(current)
+            current = ""
+            groups.append(len(literals))
+            i += 1
+            if pattern[i:i + 1] == "?":
+                # (?:...)、(?P<name>...)、(?i:...) 的前缀不是字面量
+                i = pattern.find(">" if pattern[i + 1:i + 2] == "P" else ":", i) + 1 or len(pattern)
+        elif char == ")":
+            literals.append(current)
+            current = ""
+            start = groups.pop() if groups else 0
+            if pattern[i + 1:i + 2] in ("*", "?", "{"):
+                # 可选的分组，其中的字面量不是必需的
+                del literals[start:]
+            i += 1
+        elif char in ".^$+":
+            literals.append(current)
+            current = ""
+            i += 1
+        else:
+            current += char
+            i += 1
+    literals.append(current)
+    return [literal for literal in literals if len(literal.encode("utf-8")) >= 3]
+
+
+class LogIndex:
+    """SQLite 中保存已关闭日志段的行数和三元组布隆过滤器"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.store = LogStore(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.root / "index.sqlite", timeout=30)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS segments ("
+            "path TEXT PRIMARY KEY, run TEXT, size INTEGER, lines INTEGER, bloom BLOB)"
+        )
+
+    def close(self):
+        self.db.close()
+
+    def closed_segments(self):
+        """已结束运行的所有段，以及运行中命令除最后一段以外的段"""
+        for meta in self.store.runs():
+            segments = self.store.segments(meta["id"])
+            if self.store.is_active(meta) or "end" not in meta:
+                segments = segments[:-1]
+            for path in segments:
+                # 等待压缩完成后再索引，避免同一段先后被索引两次
+                if path.suffix == ".gz" or "end" in meta or not meta.get("compress", False):
+                    yield meta["id"], path
+
+    def index_pending(self, stop=None):
+        """为尚未索引的已关闭段建立索引，返回新索引的段数"""
+        known = {path: size for path, size in self.db.execute("SELECT path, size FROM segments")}
+        indexed = 0
+        for run_id, path in list(self.closed_segments()):
+            if stop is not None and stop.is_set():
+                break
+            try:
+                size = path.stat().st_size
+            except OSError:
+                continue
+            if known.get(str(path)) == size:
+                continue
+            text = self.store.read_text(path)
+            self.db.execute(
+                "INSERT OR REPLACE INTO segments (path, run, size, lines, bloom) VALUES (?, ?, ?, ?, ?)",
+                (str(path), run_id, size, text.count("\n"), build_bloom(text)),
+            )
+            self.db.commit()
+            indexed += 1
+        # 清理已被删除或已压缩的段
+        for (path,) in self.db.execute("SELECT path FROM segments").fetchall():
+            if not Path(path).exists():
+                self.db.execute("DELETE FROM segments WHERE path = ?", (path,))
+        self.db.commit()
+        return indexed
+
+    def search(self, pattern, ignore_case=False, limit=500, run_id=None):
+        """
+        返回 ([(运行ID, 段文件名, 段内行号, 行内容)], 统计)；
+        布隆过滤器判断不可能匹配的段直接跳过，其余段用编译后的正则整体扫描。
+        pattern 中的 ^ 匹配消息开头（时间戳和流标记之后），其余部分在整行上匹配
+        """
+        regex = re.compile(anchor_to_message(pattern), re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+        literals = required_literals(pattern)
+        needed = np.unique(np.concatenate([trigram_codes(literal.lower().encode("utf-8")) for literal in literals])) \
+            if literals else None
+        blooms = {path: bloom for path, bloom in self.db.execute("SELECT path, bloom FROM segments")}
+
+        results = []
+        stats = {"segments": 0, "skipped": 0, "scanned_bytes": 0}
+        runs = [meta for meta in self.store.runs() if run_id is None or meta["id"] == run_id]
+        for meta in runs:
+            for path in self.store.segments(meta["id"]):
+                stats["segments"] += 1
+                bloom = blooms.get(str(path))
+                if bloom is not None and needed is not None and not bloom_contains(bloom, needed):
+                    stats["skipped"] += 1
+                    continue
+                text = self.store.read_text(path)
+                stats["scanned_bytes"] += len(text)
+                line_number, position = 0, 0
+                last_line = -1
+                for match in regex.finditer(text):
+                    line_number += text.count("\n", position, match.start())
+                    position = match.start()
+                    if line_number == last_line:
+                        continue
+                    last_line = line_number
+                    start = text.rfind("\n", 0, match.start()) + 1
+                    end = text.find("\n", match.start())
+                    results.append((meta["id"], path.name, line_number, text[start:end if end != -1 else None]))
+                    if len(results) >= limit:
+                        return results, stats
+        return results, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="管理和搜索命令日志")
+    parser.add_argument("root", help="日志根目录（通常是 .marimo_ui/logs）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("list", help="列出运行记录")
+    subparsers.add_parser("index", help="为已关闭的日志段建立索引")
+    search_parser = subparsers.add_parser("search", help="正则搜索")
+    search_parser.add_argument("pattern")
+    search_parser.add_argument("-i", "--ignore-case", action="store_true")
+    search_parser.add_argument("--limit", type=int, default=100)
+    prune_parser = subparsers.add_parser("prune", help="按总容量删除最旧的运行记录")
+    prune_parser.add_argument("--max-size", type=int, default=DEFAULT_MAX_TOTAL_BYTES // 1024 ** 2, help="MB")
+    args = parser.parse_args()
+
+    store = LogStore(args.root)
+    if args.command == "list":
+        for meta in store.runs():
+            start = datetime.fromtimestamp(meta["start"]).isoformat(timespec="seconds")
+            status = "运行中" if store.is_active(meta) else f"返回码 {meta.get('returncode')}"
+            print(f"{meta['id']}  {start}  {status:<8}  {meta['command']}")
+    elif args.command == "index":
+        index = LogIndex(args.root)
+        started = time.perf_counter()
+        count = index.index_pending()
+        print(f"新索引 {count} 个日志段，用时 {time.perf_counter() - started:.2f} 秒")
+    elif args.command == "search":
+        index = LogIndex(args.root)
+        started = time.perf_counter()
+        results, stats = index.search(args.pattern, args.ignore_case, args.limit)
+        for run_id, segment, line_number, line in results:
+            print(f"{run_id}/{segment}:{line_number + 1}: {line}")
+        print(f"{len(results)} 条结果；{stats['segments']} 个段中跳过 {stats['skipped']} 个，"
+              f"扫描 {stats['scanned_bytes'] / 1024 ** 2:.1f} MB，用时 {time.perf_counter() - started:.2f} 秒")
+    else:
+        print(f"已删除 {store.prune(args.max_size * 1024 ** 2)} 个运行记录")
+
+
+if __name__ == "__main__":
+    main()
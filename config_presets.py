@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+性能预设 - 把影响性能的 marimo 运行时设置（on_cell_change、auto_instantiate、auto_reload、
+output_max_bytes、std_stream_max_bytes）组合成命名预设，写入项目 pyproject.toml 的 [tool.marimo.runtime]，
+并用 marimo 内核对选定笔记本做微基准测试，比较各预设的重新运行延迟和内核内存
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+from marimo_internals import marimo_internals
+from process_monitor import read_stat
+
+
+PRESET_KEYS = ("on_cell_change", "auto_instantiate", "auto_reload", "output_max_bytes", "std_stream_max_bytes")
+
+BUILTIN_PRESETS = {
+    "default": {
+        "description": "marimo 默认值",
+        "runtime": {"on_cell_change": "autorun", "auto_instantiate": True, "auto_reload": "off",
+                    "output_max_bytes": 8000000, "std_stream_max_bytes": 1000000},
+    },
+    "heavy-data lazy": {
+        "description": "大数据：打开时不自动运行，修改单元格只把下游标记为过期，限制输出和标准流大小",
+        "runtime": {"on_cell_change": "lazy", "auto_instantiate": False, "auto_reload": "off",
+                    "output_max_bytes": 2000000, "std_stream_max_bytes": 200000},
+    },
+    "low-latency dashboard": {
+        "description": "仪表板：自动运行下游保持界面一致，关闭模块重载，输出保持较小",
+        "runtime": {"on_cell_change": "autorun", "auto_instantiate": True, "auto_reload": "off",
+                    "output_max_bytes": 1000000, "std_stream_max_bytes": 100000},
+    },
+    "module dev": {
+        "description": "开发本地模块：修改 .py 模块后自动重载并重新运行依赖它的单元格",
+        "runtime": {"on_cell_change": "autorun", "auto_instantiate": True, "auto_reload": "autorun",
+                    "output_max_bytes": 8000000, "std_stream_max_bytes": 1000000},
+    },
+}
+
+
+def presets_path(working_dir):
+    return Path(working_dir) / ".marimo_ui" / "presets.json"
+
+
+def load_presets(path=None):
+    """内置预设加上用户保存的预设（同名时用户预设优先）"""
+    presets = {name: dict(preset) for name, preset in BUILTIN_PRESETS.items()}
+    if path is not None and Path(path).exists():
+        presets.update(json.loads(Path(path).read_text(encoding="utf-8")))
+    return presets
+
+
+def full_runtime(runtime):
+    """用户预设可以只包含部分设置，缺少的项取 marimo 默认值"""
+    return {**BUILTIN_PRESETS["default"]["runtime"], **runtime}
+
+
+def save_preset(path, name, runtime, description=""):
+    path = Path(path)
+    saved = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    saved[name] = {"description": description, "runtime": {key: runtime[key] for key in PRESET_KEYS if key in runtime}}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(saved, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def project_runtime(project_dir):
+    """项目 pyproject.toml 中 [tool.marimo.runtime] 的当前值"""
+    import tomllib
+
+    pyproject = Path(project_dir) / "pyproject.toml"
+    if not pyproject.exists():
+        return {}
+    data = tomllib.loads(pyproject.read_text(encoding="utf-8"))
+    return data.get("tool", {}).get("marimo", {}).get("runtime", {})
+
+
+def apply_preset(project_dir, runtime):
+    """
+    把预设写入项目 pyproject.toml 的 [tool.marimo.runtime]，保留文件中的其他内容和格式；
+    marimo 会从笔记本所在目录向上查找最近的 pyproject.toml，项目配置优先于用户配置
+    """
+    import tomlkit
+
+    pyproject = Path(project_dir) / "pyproject.toml"
+    document = tomlkit.parse(pyproject.read_text(encoding="utf-8")) if pyproject.exists() else tomlkit.document()
+    tool = document.setdefault("tool", tomlkit.table(is_super_table=True))
+    marimo_table = tool.setdefault("marimo", tomlkit.table(is_super_table=True))
+    runtime_table = marimo_table.setdefault("runtime", tomlkit.table())
+    for key in PRESET_KEYS:
+        if key in runtime:
+            runtime_table[key] = runtime[key]
+    pyproject.write_text(tomlkit.dumps(document), encoding="utf-8")
+    return pyproject
+
+
+def rerun_target(file_manager, notebook):
+    """默认重新运行下游单元格最多的单元格（相当于拖动驱动整个笔记本的滑块）"""
+    from notebook_graph import analyze_notebook
+
+    cells = list(file_manager.app.cell_manager.cell_data())
+    graph = analyze_notebook(notebook)
+    if len(graph.cells) != len(cells):
+        return 0
+    return max(range(len(cells)), key=lambda index: (len(graph.descendants(index)), -index))
+
+
+async def measure(notebook, runtime, reruns=5, cell_index=None, timeout=300):
+    """
+    在真实的 marimo 内核中运行笔记本，返回启动、首次运行、每次重新运行的耗时，
+    每次重新运行执行的单元格数、输出字节数和内核进程 RSS；runtime 中缺少的设置取 marimo 默认值
+    """
+    runtime = full_runtime(runtime)
+    with marimo_internals("预设测量"):
+        from marimo._config.manager import get_default_config_manager
+        from marimo._runtime.requests import AppMetadata, ExecuteMultipleRequest
+        from marimo._server.model import ConnectionState, SessionConsumer, SessionMode
+        from marimo._server.models.models import InstantiateRequest
+        from marimo._server.sessions import Session
+        from marimo._types.ids import ConsumerId
+
+    from multi_export import load_notebook
+
+    completed = asyncio.Event()
+    counters = {"cells": 0, "output_bytes": 0}
+
+    class BenchConsumer(SessionConsumer):
+        def __init__(self):
+            super().__init__(consumer_id=ConsumerId("bench"))
+
+        def on_start(self):
+            def listener(message):
+                if message[0] == "cell-op":
+                    data = message[1]
+                    if data.get("status") == "running":
+                        counters["cells"] += 1
+                    output = data.get("output")
+                    if output and isinstance(output.get("data"), str):
+                        counters["output_bytes"] += len(output["data"])
+                elif message[0] == "completed-run":
+                    completed.set()
+
+            return listener
+
+        def on_stop(self):
+            pass
+
+        def write_operation(self, op):
+            pass
+
+        def connection_state(self):
+            return ConnectionState.OPEN
+
+    file_manager = load_notebook(notebook)
+    with marimo_internals("预设测量"):
+        config_manager = get_default_config_manager(current_path=file_manager.path).with_overrides(
+            {"runtime": dict(runtime)}
+        )
+        session = Session.create(
+            initialization_id="_bench_",
+            session_consumer=BenchConsumer(),
+            mode=SessionMode.EDIT,
+            app_metadata=AppMetadata(query_params={}, filename=file_manager.path, cli_args={}, argv=[],
+                                     app_config=file_manager.app.config),
+            app_file_manager=file_manager,
+            config_manager=config_manager,
+            virtual_files_supported=False,
+            redirect_console_to_browser=False,
+            ttl_seconds=None,
+        )
+
+    async def run_and_wait(submit):
+        completed.clear()
+        counters["cells"] = counters["output_bytes"] = 0
+        started = time.perf_counter()
+        submit()
+        await asyncio.wait_for(completed.wait(), timeout)
+        return time.perf_counter() - started, counters["cells"], counters["output_bytes"]
+
+    def kernel_rss():
+        pid = getattr(session.kernel_manager.kernel_task, "pid", None)
+        stat = read_stat(pid) if pid else None
+        return stat[1] if stat else None
+
+    cells = list(file_manager.app.cell_manager.cell_data())
+    try:
+        # auto_instantiate 为 False 时，打开笔记本不运行任何单元格，随后手动“全部运行”
+        startup, _, _ = await run_and_wait(lambda: session.instantiate(
+            InstantiateRequest(object_ids=[], values=[], auto_run=runtime["auto_instantiate"]), http_request=None
+        ))
+        first_run = startup
+        if not runtime["auto_instantiate"]:
+            run_all, _, _ = await run_and_wait(lambda: session.put_control_request(
+                ExecuteMultipleRequest(cell_ids=[cell.cell_id for cell in cells], codes=[cell.code for cell in cells]),
+                from_consumer_id=None,
+            ))
+            first_run = startup + run_all
+        baseline_rss = kernel_rss()
+
+        index = rerun_target(file_manager, notebook) if cell_index is None else cell_index
+        target = cells[index]
+        samples = []
+        for _ in range(reruns):
+            seconds, cell_count, output_bytes = await run_and_wait(lambda: session.put_control_request(
+                ExecuteMultipleRequest(cell_ids=[target.cell_id], codes=[target.code]), from_consumer_id=None
+            ))
+            samples.append({"seconds": seconds, "cells": cell_count, "output_bytes": output_bytes, "rss": kernel_rss()})
+    finally:
+        session.close()
+
+    latencies = sorted(sample["seconds"] for sample in samples)
+    final_rss = samples[-1]["rss"] if samples else None
+    return {
+        "startup_s": startup,
+        "first_run_s": first_run,
+        "rerun_cell": index,
+        "rerun_p50_ms": statistics.median(latencies) * 1000,
+        "rerun_max_ms": latencies[-1] * 1000,
+        "cells_per_rerun": samples[-1]["cells"],
+        "output_bytes_per_rerun": samples[-1]["output_bytes"],
+        "kernel_rss_mb": final_rss / 1024 ** 2 if final_rss else None,
+        "rss_growth_mb": (final_rss - baseline_rss) / 1024 ** 2 if final_rss and baseline_rss else None,
+        "samples": samples,
+    }
+
+
+def compare(notebook, presets, reruns=5, cell_index=None):
+    """依次用每个预设运行笔记本并打印对比表"""
+    with marimo_internals("预设测量"):
+        from marimo._output.hypertext import patch_html_for_non_interactive_output
+
+    results = {}
+    for name, preset in presets.items():
+        with patch_html_for_non_interactive_output():
+            results[name] = asyncio.run(measure(notebook, preset["runtime"], reruns, cell_index))
+        results[name]["runtime"] = full_runtime(preset["runtime"])
+
+    print(f"{Path(notebook).name}: 重新运行单元格 #{next(iter(results.values()))['rerun_cell']} {reruns} 次")
+    print(f"{'预设':<24} {'启动':>8} {'首次运行':>9} {'重跑 p50':>10} {'重跑 max':>10} {'单元格':>6} "
+          f"{'输出':>9} {'内核 RSS':>9} {'RSS 增长':>9}")
+    for name, result in results.items():
+        rss = f"{result['kernel_rss_mb']:.0f} MB" if result["kernel_rss_mb"] is not None else "-"
+        growth = f"{result['rss_growth_mb']:+.1f} MB" if result["rss_growth_mb"] is not None else "-"
+        print(f"{name:<24} {result['startup_s']:>7.2f}s {result['first_run_s']:>8.2f}s "
+              f"{result['rerun_p50_ms']:>8.0f}ms {result['rerun_max_ms']:>8.0f}ms {result['cells_per_rerun']:>6} "
+              f"{result['output_bytes_per_rerun'] / 1024:>7.1f}KB {rss:>9} {growth:>9}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="管理 marimo 运行时性能预设并比较其效果")
+    parser.add_argument("--presets-file", default=".marimo_ui/presets.json", help="用户预设文件")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="列出所有预设")
+    apply_parser = subparsers.add_parser("apply", help="把预设写入项目 pyproject.toml")
+    apply_parser.add_argument("name")
+    apply_parser.add_argument("--project", default=".", help="项目目录")
+    show_parser = subparsers.add_parser("show", help="显示项目当前的运行时设置及匹配的预设")
+    show_parser.add_argument("--project", default=".", help="项目目录")
+    bench_parser = subparsers.add_parser("bench", help="在笔记本上比较多个预设")
+    bench_parser.add_argument("notebook")
+    bench_parser.add_argument("--presets", nargs="+", help="要比较的预设，默认全部")
+    bench_parser.add_argument("--reruns", type=int, default=5, help="重新运行次数")
+    bench_parser.add_argument("--cell", type=int, default=None, help="重新运行的单元格序号，默认是下游最多的单元格")
+    bench_parser.add_argument("--output", help="把结果写入JSON文件")
+    args = parser.parse_args()
+
+    presets = load_presets(args.presets_file)
+    if args.command == "list":
+        for name, preset in presets.items():
+            settings = ", ".join(f"{key}={value}" for key, value in preset["runtime"].items())
+            print(f"{name:<24} {preset.get('description', '')}\n{'':<24} {settings}")
+    elif args.command == "apply":
+        if args.name not in presets:
+            parser.error(f"未知预设: {args.name}")
+        path = apply_preset(args.project, presets[args.name]["runtime"])
+        print(f"已把预设 {args.name} 写入 {path}")
+    elif args.command == "show":
+        runtime = project_runtime(args.project)
+        for key in PRESET_KEYS:
+            print(f"{key} = {runtime.get(key, '(未设置)')}")
+        matches = [name for name, preset in presets.items()
+                   if all(runtime.get(key) == value for key, value in preset["runtime"].items())]
+        print(f"匹配的预设: {', '.join(matches) or '无'}")
+    else:
+        names = args.presets or list(presets)
+        unknown = [name for name in names if name not in presets]
+        if unknown:
+            parser.error(f"未知预设: {', '.join(unknown)}")
+        results = compare(args.notebook, {name: presets[name] for name in names}, args.reruns, args.cell)
+        if args.output:
+            Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
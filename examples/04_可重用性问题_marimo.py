@@ -35,23 +35,58 @@ def _(mo):
 @app.cell
 def _():
     # 这是一个有用的数据处理函数
-    def clean_data(data):
+    def clean_data(data, inplace=False, dtype=None):
         """
-        清理数据：移除空值，标准化格式
+        清理数据：移除空值，标准化格式。
+        数值列复制到一个二维数组后一次完成标准化，内存峰值约为一份数据框。
+        inplace=True 时直接修改传入的数据框并释放原来的数值列；
+        dtype 可以指定 float32 以减半数值列内存，默认全部为 float32 时保持 float32，否则为 float64
         """
         import pandas as pd
         import numpy as np
 
         if isinstance(data, list):
             data = pd.DataFrame(data)
+            inplace = True
 
-        # 移除空值
-        data = data.dropna()
-
-        # 标准化数值列
+        columns = list(data.columns)
         numeric_columns = data.select_dtypes(include=[np.number]).columns
-        for col in numeric_columns:
-            data[col] = (data[col] - data[col].mean()) / data[col].std()
+        if dtype is None:
+            all_float32 = len(numeric_columns) and (data.dtypes[numeric_columns] == np.float32).all()
+            dtype = np.float32 if all_float32 else np.float64
+
+        # 任意一列为空的行都要移除（与 dropna() 相同），只生成一个布尔掩码
+        keep = data.notna().all(axis=1).to_numpy()
+        dropped = not keep.all()
+
+        # 逐列只搬运数据，保留的行直接写入按列存储的二维数组，不生成中间数据框
+        block = np.empty((int(keep.sum()), len(numeric_columns)), dtype=dtype, order='F')
+        for position, column in enumerate(numeric_columns):
+            block[:, position] = data[column].array[keep] if dropped else data[column].array
+
+        # 标准化数值列：对整个二维数组原地计算，统计量用 float64 累加
+        with np.errstate(divide='ignore', invalid='ignore'):
+            block -= block.mean(axis=0, dtype=np.float64).astype(dtype)
+            variance = np.einsum('ij,ij->j', block, block, dtype=np.float64) / (len(block) - 1)
+            block /= np.sqrt(variance).astype(dtype)
+
+        if inplace:
+            data.drop(columns=numeric_columns, inplace=True)
+            if dropped:
+                # 按位置删除行：索引有重复标签时，按标签删除会连带删掉要保留的行
+                index = data.index
+                data.reset_index(drop=True, inplace=True)
+                data.drop(index=np.flatnonzero(~keep), inplace=True)
+                data.index = index[keep]
+        else:
+            others = data.columns.difference(numeric_columns, sort=False)
+            data = data.loc[keep, others] if dropped else data[others]
+
+        # 按原来的列顺序放回，各列都是 block 的视图，不再复制
+        standardized = pd.DataFrame(block, index=data.index, columns=numeric_columns, copy=False)
+        for position, column in enumerate(columns):
+            if column in standardized:
+                data.insert(position, column, standardized[column])
 
         return data
 
@@ -59,6 +94,98 @@ def _():
     return (clean_data,)
 
 
+@app.cell
+def _(mo):
+    clean_bench_button = mo.ui.run_button(label="运行数据清理基准测试（约 5 秒）")
+    clean_bench_button
+    return (clean_bench_button,)
+
+
+@app.cell
+def _(clean_bench_button, clean_data, mo):
+    # 基准测试：逐列循环 vs 整块标准化（复制 / 原地 / float32）；耗时较长，只在点击按钮后运行
+    mo.stop(not clean_bench_button.value, mo.md("点击上面的按钮比较逐列循环和整块标准化的耗时与内存"))
+
+    def clean_data_loop(data):
+        # 原来的实现：dropna() 复制一次，每列标准化再各生成几个临时 Series
+        import numpy as np
+
+        data = data.dropna()
+        for col in data.select_dtypes(include=[np.number]).columns:
+            data[col] = (data[col] - data[col].mean()) / data[col].std()
+        return data
+
+    def clean_benchmark(rows, repeat=3):
+        import time
+        import tracemalloc
+
+        import numpy as np
+        import pandas as pd
+
+        rng = np.random.default_rng(0)
+        frame = pd.DataFrame({
+            'price': rng.normal(100, 15, rows),
+            'volume': rng.integers(0, 10_000, rows),
+            'score': rng.normal(size=rows),
+            'ratio': rng.random(rows),
+            'label': np.where(rng.random(rows) < 0.5, 'a', 'b'),
+        })
+        frame.loc[rng.choice(rows, rows // 100, replace=False), 'score'] = np.nan
+        frame_bytes = frame.memory_usage(index=True).sum()
+        expected = clean_data_loop(frame)
+
+        variants = {
+            '逐列循环（原实现）': lambda data: clean_data_loop(data),
+            '整块标准化': lambda data: clean_data(data),
+            '整块标准化，原地': lambda data: clean_data(data, inplace=True),
+            '整块标准化，原地 + float32': lambda data: clean_data(data, inplace=True, dtype='float32'),
+        }
+        table = []
+        for name, function in variants.items():
+            best = None
+            for _ in range(repeat):
+                # 原地版本会修改输入，每次计时都用新的副本（复制不计入耗时）
+                data = frame.copy()
+                started = time.perf_counter()
+                output = function(data)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+
+            # 从复制输入开始统计，原地版本释放的旧列也计算在内；调用方同时持有输入和结果
+            tracemalloc.start()
+            data = frame.copy()
+            result = function(data)
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del data, result
+
+            tolerance = 1e-5 if 'float32' in name else 1e-12
+            assert output.index.equals(expected.index) and list(output.columns) == list(expected.columns)
+            assert np.allclose(output.select_dtypes('number'), expected.select_dtypes('number'), atol=tolerance)
+            table.append(f"| {name} | {best * 1000:.0f} ms | {peak / frame_bytes:.1f}x | {retained / frame_bytes:.1f}x |")
+        return frame_bytes, "\n".join(table)
+
+    clean_rows = 1_000_000
+    clean_frame_bytes, clean_table = clean_benchmark(clean_rows)
+    mo.md(
+        f"""
+    **数据清理基准测试**（{clean_rows:,} 行、4 个数值列和 1 个字符串列，约 1% 的行有空值，数据框 {clean_frame_bytes / 2 ** 20:.0f} MB）：
+
+    | 实现 | 耗时 | 内存峰值 | 调用后占用 |
+    |------|------|----------|------------|
+    {clean_table}
+
+    原实现先用 `dropna()` 复制整张表，每一列标准化时又生成多个与列等长的临时结果。
+    新实现只生成一个布尔掩码，把保留的行直接写入按列存储的二维数组，
+    在这个数组上一次完成减均值、除标准差，最后各列以视图的形式放回数据框。
+    原地模式直接修改传入的数据框，旧的数值列随后释放；指定 float32 时数值列内存再减半。
+    内存以数据框大小为单位，包含输入本身：复制模式调用后输入和结果同时存在，
+    原地模式只剩一份。内存与行数成正比，1000 万行时比例基本不变。
+    """
+    )
+    return
+
+
 @app.cell
 def _():
     # 另一个有用的分析函数
@@ -127,53 +254,146 @@ def _(mo):
     return
 
 
-@app.cell
-def _():
-    # 这个有用的工具类可以被其他程序直接导入
-    class DataProcessor:
+@app.class_definition
+class DataProcessor:
+    """
+    数据处理工具类（顶层定义，其他程序可以直接导入，也可以被进程池序列化）
+    """
+
+    # 快速路径按类型分组：bool 是 int 的子类，乘 2 的结果相同
+    TYPE_CODES = {int: 1, bool: 1, float: 2, str: 3}
+
+    def __init__(self, config=None):
+        self.config = config or {}
+        self.processed_count = 0
+
+    def process_batch(self, data_batch):
+        """
+        批量处理数据
+        """
+        results = []
+        for item in data_batch:
+            processed_item = self._process_single(item)
+            results.append(processed_item)
+            self.processed_count += 1
+
+        return results
+
+    def process_batch_vectorized(self, data_batch, chunk_size=None, workers=None):
         """
-        数据处理工具类
+        批量处理数据（向量化版本），结果与 process_batch 相同：
+        按类型分组，数值用 NumPy 一次完成，字符串批量转换，其他类型逐项处理后按原顺序合并。
+        数值型 NumPy 数组直接整体运算并返回数组。
+        workers 大于 1 且批量超过 chunk_size 时分块，在进程池中并行处理。
+        这个类定义在笔记本中，子进程无法按模块名重新导入它，只能通过 fork 继承，
+        因此并行只在 Linux 上启用，其他平台按单进程处理
         """
+        import sys
+
+        import numpy as np
 
-        def __init__(self, config=None):
-            self.config = config or {}
-            self.processed_count = 0
+        if isinstance(data_batch, np.ndarray) and data_batch.dtype.kind in "iuf":
+            self.processed_count += data_batch.size
+            return data_batch * 2
 
-        def process_batch(self, data_batch):
-            """
-            批量处理数据
-            """
+        items = data_batch if isinstance(data_batch, list) else list(data_batch)
+        chunk_size = chunk_size or self.config.get('chunk_size', 1_000_000)
+        workers = workers or self.config.get('workers', 1)
+        if workers > 1 and len(items) > chunk_size and sys.platform.startswith('linux'):
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            chunks = [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
             results = []
-            for item in data_batch:
-                processed_item = self._process_single(item)
-                results.append(processed_item)
-                self.processed_count += 1
-
-            return results
-
-        def _process_single(self, item):
-            """
-            处理单个数据项
-            """
-            # 简单的处理逻辑
-            if isinstance(item, (int, float)):
-                return item * 2
-            elif isinstance(item, str):
-                return item.upper()
-            else:
-                return str(item)
-
-        def get_stats(self):
-            """
-            获取处理统计信息
-            """
-            return {
-                'processed_count': self.processed_count,
-                'config': self.config
-            }
-
-    print("DataProcessor类已定义")
-    return (DataProcessor,)
+            # 显式使用 fork：spawn 和 forkserver 的子进程找不到笔记本中定义的类
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=context) as pool:
+                for part in pool.map(DataProcessor._process_chunk, chunks):
+                    results.extend(part)
+        else:
+            results = DataProcessor._process_chunk(items)
+
+        self.processed_count += len(items)
+        return results
+
+    @staticmethod
+    def _process_chunk(items):
+        """
+        处理一个分块：只有一种类型时整体转换，混合类型时先算出每项的类型编码再分组
+        """
+        import itertools
+        import numpy as np
+
+        kinds = set(map(type, items))
+        if kinds <= {float}:
+            return (np.asarray(items, dtype=np.float64) * 2).tolist()
+        if kinds <= {str}:
+            return list(map(str.upper, items))
+        if kinds <= {int, bool}:
+            doubled = DataProcessor._double_ints(items)
+            if doubled is not None:
+                return doubled
+
+        codes = np.fromiter(
+            map(DataProcessor.TYPE_CODES.get, map(type, items), itertools.repeat(0)),
+            dtype=np.int8, count=len(items),
+        )
+        values = np.empty(len(items), dtype=object)
+        values[:] = items
+        results = np.empty(len(items), dtype=object)
+
+        positions = np.flatnonzero(codes == 1)
+        if len(positions):
+            doubled = DataProcessor._double_ints(values[positions])
+            results[positions] = doubled if doubled is not None else [item * 2 for item in values[positions]]
+        positions = np.flatnonzero(codes == 2)
+        if len(positions):
+            results[positions] = (values[positions].astype(np.float64) * 2).tolist()
+        positions = np.flatnonzero(codes == 3)
+        if len(positions):
+            results[positions] = list(map(str.upper, values[positions]))
+        positions = np.flatnonzero(codes == 0)
+        if len(positions):
+            # 其他类型（包括 int/float/str 的子类）保持逐项语义
+            results[positions] = list(map(DataProcessor._process_single, values[positions]))
+        return results.tolist()
+
+    @staticmethod
+    def _double_ints(items):
+        """
+        整数在 int64 范围内且乘 2 不溢出时用 NumPy 计算，否则返回 None 由调用方逐项计算
+        """
+        import numpy as np
+
+        try:
+            array = np.asarray(items, dtype=np.int64)
+        except OverflowError:
+            return None
+        if array.size and (array.max() >= 2 ** 62 or array.min() < -2 ** 62):
+            return None
+        return (array * 2).tolist()
+
+    @staticmethod
+    def _process_single(item):
+        """
+        处理单个数据项
+        """
+        # 简单的处理逻辑
+        if isinstance(item, (int, float)):
+            return item * 2
+        elif isinstance(item, str):
+            return item.upper()
+        else:
+            return str(item)
+
+    def get_stats(self):
+        """
+        获取处理统计信息
+        """
+        return {
+            'processed_count': self.processed_count,
+            'config': self.config
+        }
 
 
 @app.cell
@@ -185,10 +405,91 @@ def _(DataProcessor):
     results = processor.process_batch(test_batch)
 
     print("处理结果:", results)
+    print("向量化结果相同:", processor.process_batch_vectorized(test_batch) == results)
     print("统计信息:", processor.get_stats())
     return
 
 
+@app.cell
+def _(mo):
+    batch_bench_button = mo.ui.run_button(label="运行批量处理基准测试（约 3 秒）")
+    batch_bench_button
+    return (batch_bench_button,)
+
+
+@app.cell
+def _(DataProcessor, batch_bench_button, mo):
+    # 基准测试：逐项循环 vs 向量化 vs 分块并行；耗时较长，只在点击按钮后运行
+    mo.stop(not batch_bench_button.value, mo.md("点击上面的按钮比较逐项循环、向量化和分块并行的耗时"))
+
+    import itertools
+    import os
+    import sys
+    import time
+
+    import numpy as np
+
+    def time_call(function, repeat=3):
+        # 取多次运行中最快的一次，减少其他进程造成的波动
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = function()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return output, best
+
+    bench_size = 300_000
+    # 分块并行依赖 fork，只在 Linux 上启用
+    bench_workers = (os.cpu_count() or 1) if sys.platform.startswith('linux') else 1
+    samples = {
+        '混合类型': [1, 2, 'hello', 3.14, 'world', [1, 2, 3]],
+        '数值与字符串': [1, 2, 'hello', 3.14, 'world'],
+        '浮点数': [0.5, 1.5, 2.5],
+        '字符串': ['alpha', 'beta', 'gamma'],
+    }
+    bench_rows = []
+    for bench_name, sample in samples.items():
+        bench_batch = list(itertools.islice(itertools.cycle(sample), bench_size))
+        expected, loop_seconds = time_call(lambda: DataProcessor().process_batch(bench_batch))
+        vectorized, vectorized_seconds = time_call(lambda: DataProcessor().process_batch_vectorized(bench_batch))
+        assert vectorized == expected
+        row = f"| {bench_name} | {loop_seconds * 1000:.0f} ms | {vectorized_seconds * 1000:.0f} ms " \
+              f"({loop_seconds / vectorized_seconds:.1f}x) |"
+        if bench_workers > 1:
+            parallel, parallel_seconds = time_call(lambda: DataProcessor().process_batch_vectorized(
+                bench_batch, chunk_size=bench_size // bench_workers, workers=bench_workers))
+            assert parallel == expected
+            row += f" {parallel_seconds * 1000:.0f} ms |"
+        else:
+            row += " 单核或非 Linux，跳过 |"
+        bench_rows.append(row)
+
+    bench_array = np.arange(bench_size, dtype=np.float64)
+    _, array_seconds = time_call(lambda: DataProcessor().process_batch_vectorized(bench_array))
+    _, array_loop_seconds = time_call(lambda: DataProcessor().process_batch(bench_array.tolist()))
+    bench_rows.append(f"| NumPy 数组 | {array_loop_seconds * 1000:.0f} ms | {array_seconds * 1000:.1f} ms "
+                      f"({array_loop_seconds / array_seconds:.0f}x) | - |")
+
+    bench_table = "\n".join(bench_rows)
+    mo.md(
+        f"""
+    **批量处理基准测试**（{bench_size:,} 项，{bench_workers} 个CPU核心）：
+
+    | 数据 | process_batch | process_batch_vectorized | 分块并行（{bench_workers} 进程） |
+    |------|---------------|--------------------------|------------------|
+    {bench_table}
+
+    向量化版本按类型分组：数值用 NumPy 一次计算，字符串用 `map(str.upper, ...)` 批量转换，
+    其他类型逐项处理，最后按原顺序合并。结果仍是 Python 列表时，创建结果对象的开销无法避免；
+    调用方可以直接传入 NumPy 数组时，整体运算快几个数量级。
+    分块并行需要在进程间传输数据，只有多核且批量达到数百万项时才有收益；
+    子进程通过 fork 继承笔记本中定义的类，因此只在 Linux 上启用。
+    """
+    )
+    return
+
+
 @app.cell
 def _(mo):
     mo.md(
@@ -218,49 +519,365 @@ def _(mo):
     return
 
 
+@app.class_definition
+class StreamingHistogram:
+    """
+    可合并的流式直方图：桶宽是 2 的整数次幂，第 i 个桶覆盖 [i * width, (i + 1) * width)。
+    桶数超过 max_bins 时相邻两个桶合并、桶宽加倍，因此任意分块的结果都能精确合并
+    """
+
+    def __init__(self, max_bins=64):
+        self.max_bins = max_bins
+        self.width = None
+        self.start = 0
+        self.counts = None
+
+    @classmethod
+    def from_values(cls, values, max_bins=64, integer=False):
+        """
+        用一块数值（NumPy 数组）建立直方图，忽略 NaN 和无穷大；integer=True 时桶宽至少为 1
+        """
+        import numpy as np
+
+        histogram = cls(max_bins)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return histogram
+        low, high = float(values.min()), float(values.max())
+        # 桶宽至少覆盖数值范围的 1/max_bins，同时保证桶编号不超出 int64
+        magnitude = max(abs(low), abs(high))
+        width = max(high - low, magnitude * 2.0 ** -50, np.finfo(float).tiny) / max_bins
+        histogram.width = 2.0 ** np.ceil(np.log2(max(width, 1.0) if integer else width))
+        indices = np.floor(values / histogram.width).astype(np.int64)
+        histogram.start = int(indices.min())
+        histogram.counts = np.bincount(indices - histogram.start)
+        histogram._shrink()
+        return histogram
+
+    def update(self, values, integer=False):
+        self.merge(StreamingHistogram.from_values(values, self.max_bins, integer))
+
+    def merge(self, other):
+        """
+        把另一个直方图合并进来：先把桶宽较小的一方加粗到相同桶宽，再按桶编号相加
+        """
+        import numpy as np
+
+        if other.counts is None:
+            return self
+        if self.counts is None:
+            self.width, self.start, self.counts = other.width, other.start, other.counts.copy()
+            return self
+        other = other.copy()
+        while self.width < other.width:
+            self._coarsen()
+        while other.width < self.width:
+            other._coarsen()
+        # 两块的数值范围相距很远时，先一起加粗到总跨度不超过 max_bins 再分配，内存不随间距增长
+        start = min(self.start, other.start)
+        end = max(self.start + len(self.counts), other.start + len(other.counts))
+        while end - start > self.max_bins:
+            self._coarsen()
+            other._coarsen()
+            start = min(self.start, other.start)
+            end = max(self.start + len(self.counts), other.start + len(other.counts))
+        counts = np.zeros(end - start, dtype=np.int64)
+        counts[self.start - start:self.start - start + len(self.counts)] += self.counts
+        counts[other.start - start:other.start - start + len(other.counts)] += other.counts
+        self.start, self.counts = start, counts
+        self._shrink()
+        return self
+
+    def copy(self):
+        histogram = StreamingHistogram(self.max_bins)
+        histogram.width, histogram.start = self.width, self.start
+        histogram.counts = None if self.counts is None else self.counts.copy()
+        return histogram
+
+    def _coarsen(self):
+        import numpy as np
+
+        # 桶编号整除 2：起点为奇数时在前面补一个空桶，使相邻两个桶成对相加
+        counts = self.counts
+        if self.start % 2:
+            counts = np.concatenate([[0], counts])
+        if len(counts) % 2:
+            counts = np.concatenate([counts, [0]])
+        self.counts = counts.reshape(-1, 2).sum(axis=1)
+        self.start //= 2
+        self.width *= 2
+
+    def _shrink(self):
+        while len(self.counts) > self.max_bins:
+            self._coarsen()
+
+    def to_dict(self):
+        import numpy as np
+
+        if self.counts is None:
+            return {'edges': [], 'counts': []}
+        nonzero = np.flatnonzero(self.counts)
+        first, last = nonzero[0], nonzero[-1] + 1
+        edges = (self.start + np.arange(first, last + 1)) * self.width
+        return {'edges': edges.tolist(), 'counts': self.counts[first:last].tolist()}
+
+
+@app.class_definition
+class ColumnAccumulator:
+    """
+    单列的可合并统计量：行数、空值数、均值、二阶中心矩（Chan 等人的并行合并公式）、最值和直方图。
+    每块数据先用 NumPy 整块算出部分结果再合并，内存只与块大小有关
+    """
+
+    def __init__(self, numeric, max_bins=64):
+        self.numeric = numeric
+        self.count = 0
+        self.nulls = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.histogram = StreamingHistogram(max_bins)
+
+    def update(self, series):
+        """
+        累加一块数据（pandas Series）
+        """
+        import numpy as np
+        import pandas as pd
+
+        if not self.numeric:
+            nulls = int(series.isna().sum())
+            self.nulls += nulls
+            self.count += len(series) - nulls
+            return self
+        # 后续分块中混入的非数值内容按空值计数
+        values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        part = ColumnAccumulator(True, self.histogram.max_bins)
+        present = values[~np.isnan(values)]
+        part.nulls = len(values) - len(present)
+        part.count = len(present)
+        if part.count:
+            part.mean = float(present.mean())
+            part.m2 = float(np.square(present - part.mean).sum())
+            part.minimum, part.maximum = float(present.min()), float(present.max())
+            part.histogram.update(present, pd.api.types.is_integer_dtype(series))
+        return self.merge(part)
+
+    def merge(self, other):
+        count = self.count + other.count
+        self.nulls += other.nulls
+        if self.numeric and other.count:
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self.m2 += other.m2 + delta * delta * self.count * other.count / count
+            self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+            self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+            self.histogram.merge(other.histogram)
+        self.count = count
+        return self
+
+    def to_dict(self):
+        summary = {'count': self.count, 'nulls': self.nulls}
+        if self.numeric:
+            summary.update({
+                'mean': self.mean if self.count else None,
+                # 与 pandas 的 std() 一致，使用样本标准差
+                'std': (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else None,
+                'min': self.minimum,
+                'max': self.maximum,
+                'histogram': self.histogram.to_dict(),
+            })
+        return summary
+
+
 @app.cell
-def _():
+def _(ColumnAccumulator):
     # 这个函数可以在生产环境中直接使用
-    def generate_report(data, output_path):
+    def iter_chunks(source, chunk_size=1_000_000):
+        """
+        按块读取数据：DataFrame 按行切片，CSV 用 read_csv 的 chunksize，
+        Parquet 按批读取（需要 pyarrow），.npy 以内存映射方式打开后切片
+        """
+        import os
+
+        import numpy as np
+        import pandas as pd
+
+        if isinstance(source, pd.DataFrame):
+            # 空数据框也产生一块，报告中仍然列出各列
+            for start in range(0, max(len(source), 1), chunk_size):
+                yield source.iloc[start:start + chunk_size]
+            return
+
+        path = os.fspath(source)
+        suffix = os.path.splitext(path)[1].lower()
+        if suffix in ('.parquet', '.pq'):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("按块读取 Parquet 需要安装 pyarrow") from None
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+        elif suffix == '.npy':
+            array = np.load(path, mmap_mode='r')
+            for start in range(0, len(array), chunk_size):
+                yield pd.DataFrame(np.asarray(array[start:start + chunk_size]))
+        else:
+            yield from pd.read_csv(path, chunksize=chunk_size)
+
+    def generate_report(data, output_path, chunk_size=1_000_000, max_bins=64):
         """
-        生成数据报告
+        生成数据报告。data 可以是 DataFrame，也可以是 CSV、Parquet 或 .npy 文件路径；
+        数据按块读取，统计量和直方图用可合并的累加器增量计算，内存占用只与块大小有关
         """
         import matplotlib.pyplot as plt
+        import os
         import pandas as pd
         from datetime import datetime
         import json
 
+        columns = {}
+        total_rows = 0
+        chunks = 0
+        for chunk in iter_chunks(data, chunk_size):
+            for column in chunk.columns:
+                name = str(column)
+                if name not in columns:
+                    numeric = pd.api.types.is_numeric_dtype(chunk[column]) and \
+                        not pd.api.types.is_bool_dtype(chunk[column])
+                    columns[name] = ColumnAccumulator(numeric, max_bins)
+                columns[name].update(chunk[column])
+            total_rows += len(chunk)
+            chunks += 1
+
         # 创建报告
+        data_summary = {
+            'total_rows': total_rows,
+            'columns': list(columns),
+            'chunks': chunks,
+        }
+        if isinstance(data, pd.DataFrame):
+            data_summary['memory_usage'] = int(data.memory_usage(deep=True).sum())
+        else:
+            data_summary['source'] = os.fspath(data)
+            data_summary['source_bytes'] = os.path.getsize(data)
         report = {
             'timestamp': datetime.now().isoformat(),
-            'data_summary': {
-                'total_rows': len(data),
-                'columns': list(data.columns),
-                'memory_usage': data.memory_usage(deep=True).sum()
-            }
+            'data_summary': data_summary,
+            'column_stats': {name: accumulator.to_dict() for name, accumulator in columns.items()},
         }
 
-        # 生成图表
+        # 生成图表：前四个数值列的分布，直接使用累加好的直方图
         fig, axes = plt.subplots(2, 2, figsize=(12, 8))
-
-        # 数值列的分布
-        numeric_cols = data.select_dtypes(include=['number']).columns
-        if len(numeric_cols) > 0:
-            data[numeric_cols[0]].hist(ax=axes[0, 0])
-            axes[0, 0].set_title(f'{numeric_cols[0]} 分布')
+        numeric_cols = [name for name, accumulator in columns.items() if accumulator.numeric]
+        for ax, name in zip(axes.flat, numeric_cols):
+            histogram = report['column_stats'][name]['histogram']
+            if histogram['counts']:
+                ax.stairs(histogram['counts'], histogram['edges'], fill=True)
+            ax.set_title(f'{name} 分布')
 
         # 保存报告
-        plt.savefig(f"{output_path}_charts.png")
-        plt.close()
+        fig.savefig(f"{output_path}_charts.png")
+        plt.close(fig)
 
         # 保存数据摘要
         with open(f"{output_path}_summary.json", 'w') as f:
-            json.dump(report, f, indent=2)
+            json.dump(report, f, indent=2, ensure_ascii=False)
 
         print(f"报告已保存到 {output_path}")
         return report
 
     print("报告生成函数已定义")
+    return (generate_report,)
+
+
+@app.cell
+def _(mo):
+    report_bench_button = mo.ui.run_button(label="运行流式报告基准测试（约 8 秒）")
+    report_bench_button
+    return (report_bench_button,)
+
+
+@app.cell
+def _(generate_report, mo, report_bench_button):
+    # 流式报告：文件变大时内存峰值不变，统计结果与一次性读入相同；需要写入临时文件，只在点击按钮后运行
+    mo.stop(not report_bench_button.value, mo.md("点击上面的按钮生成测试文件，比较一次性读入和流式报告的内存峰值"))
+
+    def streaming_benchmark(row_counts, chunk_size=100_000):
+        import os
+        import tempfile
+        import time
+        import tracemalloc
+
+        import numpy as np
+        import pandas as pd
+
+        def traced(function):
+            # tracemalloc 会拖慢分配，计时和内存统计分开运行
+            started = time.perf_counter()
+            output = function()
+            elapsed = time.perf_counter() - started
+            tracemalloc.start()
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return output, elapsed, peak
+
+        table = []
+        with tempfile.TemporaryDirectory() as directory:
+            for rows in row_counts:
+                rng = np.random.default_rng(rows)
+                frame = pd.DataFrame({
+                    'price': rng.normal(100, 15, rows).round(2),
+                    'volume': rng.integers(0, 10_000, rows),
+                    'score': rng.standard_exponential(rows).round(4),
+                    'label': rng.choice(['a', 'b', 'c'], rows),
+                })
+                frame.loc[rng.choice(rows, rows // 100, replace=False), 'score'] = np.nan
+                path = os.path.join(directory, f'data_{rows}.csv')
+                frame.to_csv(path, index=False)
+                npy_path = os.path.join(directory, f'data_{rows}.npy')
+                np.save(npy_path, frame[['price', 'volume', 'score']].to_numpy())
+                del frame
+
+                prefix = os.path.join(directory, f'report_{rows}')
+                report, elapsed, peak = traced(lambda: generate_report(path, prefix, chunk_size=chunk_size))
+                _, npy_elapsed, npy_peak = traced(lambda: generate_report(npy_path, prefix, chunk_size=chunk_size))
+
+                expected, full_elapsed, full_peak = traced(lambda: pd.read_csv(path).describe())
+
+                # 流式统计与一次性读入的 describe() 一致
+                for column in ('price', 'volume', 'score'):
+                    stats = report['column_stats'][column]
+                    assert stats['count'] == expected.loc['count', column]
+                    for key in ('mean', 'std', 'min', 'max'):
+                        assert np.isclose(stats[key], expected.loc[key, column], rtol=1e-9)
+                assert report['column_stats']['label']['count'] == rows
+
+                megabytes = os.path.getsize(path) / 2 ** 20
+                table.append(
+                    f"| {rows:,} | {megabytes:.0f} MB | {full_elapsed:.2f} s / {full_peak / 2 ** 20:.0f} MB "
+                    f"| {elapsed:.2f} s / {peak / 2 ** 20:.0f} MB | {npy_elapsed:.2f} s / {npy_peak / 2 ** 20:.0f} MB |"
+                )
+        return "\n".join(table)
+
+    report_chunk_size = 50_000
+    report_table = streaming_benchmark([100_000, 400_000], report_chunk_size)
+    mo.md(
+        f"""
+    **流式报告**（每块 {report_chunk_size:,} 行，耗时 / 内存峰值）：
+
+    | 行数 | CSV 大小 | 一次性读入 + describe | generate_report（CSV 分块） | generate_report（.npy 内存映射） |
+    |------|----------|-----------------------|-----------------------------|----------------------------------|
+    {report_table}
+
+    `generate_report` 对每一块数据用 NumPy 算出行数、均值、二阶中心矩、最值和直方图，
+    再与之前的结果合并；直方图的桶宽是 2 的整数次幂，范围扩大时相邻桶两两合并，合并结果与一次性统计完全相同。
+    内存峰值只取决于块大小，与文件大小无关，所以同样的报告可以处理比内存大得多的文件；
+    统计量已经与 `describe()` 的结果逐项核对；`generate_report` 的耗时还包括绘制和保存图表。
+    """
+    )
     return
 
 
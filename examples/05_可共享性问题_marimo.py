@@ -80,60 +80,115 @@ def _(mo):
 
 
 @app.cell
-def _(chart_type, noise_level, np, pd, plt, sample_size):
-    # 自动响应参数变化 - 在Web应用中完全交互
+def _(np, pd, plt):
+    # 有界 LRU 缓存：回到访问过的参数组合时直接复用生成的数据和渲染好的图片
+    import functools
+    import io
+    import textwrap
+    import time
+
+    @functools.lru_cache(maxsize=32)
+    def generate_data(size, noise):
+        # 固定种子的独立随机数生成器，与 np.random.seed(42) 得到相同的数据，但不修改全局状态
+        rng = np.random.RandomState(42)
+        x = np.linspace(0, 10, size)
+        y = 2 * x + 1 + rng.normal(0, noise * 5, size)
+        return pd.DataFrame({'X': x, 'Y': y})
+
+    @functools.lru_cache(maxsize=64)
+    def render_chart(size, noise, chart):
+        """
+        渲染图表并保存为 PNG，返回 (图片内容, 渲染耗时)；图形渲染后立即关闭
+        """
+        started = time.perf_counter()
+        data = generate_data(size, noise)
+
+        # 创建图表
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+
+        if chart == '散点图':
+            ax1.scatter(data['X'], data['Y'], alpha=0.6)
+            ax1.set_xlabel('X')
+            ax1.set_ylabel('Y')
+            ax1.set_title('X vs Y 散点图')
+        elif chart == '直方图':
+            ax1.hist(data['Y'], bins=20, alpha=0.7)
+            ax1.set_xlabel('Y值')
+            ax1.set_ylabel('频次')
+            ax1.set_title('Y值分布直方图')
+        else:  # 箱线图
+            ax1.boxplot([data['X'], data['Y']], tick_labels=['X', 'Y'])
+            ax1.set_title('X和Y的箱线图')
+
+        # 统计信息
+        ax2.axis('off')
+        stats_text = f"""
+        数据统计信息:
+
+        样本大小: {size}
+        噪声水平: {noise:.2f}
+
+        X统计:
+        均值: {data['X'].mean():.2f}
+        标准差: {data['X'].std():.2f}
+
+        Y统计:
+        均值: {data['Y'].mean():.2f}
+        标准差: {data['Y'].std():.2f}
+
+        相关系数: {data['X'].corr(data['Y']):.3f}
+        """
+        ax2.text(0.1, 0.9, textwrap.dedent(stats_text), transform=ax2.transAxes,
+                fontsize=10, verticalalignment='top')
+
+        plt.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png')
+        plt.close(fig)
+        return buffer.getvalue(), time.perf_counter() - started
+
+    def cached_chart(size, noise, chart):
+        """
+        从缓存取图表，返回图片内容、是否命中、本次耗时和首次渲染耗时
+        """
+        hits = render_chart.cache_info().hits
+        started = time.perf_counter()
+        png, render_seconds = render_chart(size, noise, chart)
+        return {
+            'png': png,
+            'hit': render_chart.cache_info().hits > hits,
+            'seconds': time.perf_counter() - started,
+            'render_seconds': render_seconds,
+        }
+    return cached_chart, generate_data, render_chart
+
+
+@app.cell
+def _(cached_chart, chart_type, generate_data, mo, noise_level, render_chart, sample_size):
+    # 自动响应参数变化 - 在Web应用中完全交互；访问过的参数组合直接从缓存读取
     size = sample_size.value
-    noise = noise_level.value
+    noise = round(noise_level.value, 2)
     chart = chart_type.value
 
-    # 生成数据
-    np.random.seed(42)  # 为了可重现性
-    x = np.linspace(0, 10, size)
-    y = 2 * x + 1 + np.random.normal(0, noise * 5, size)
-
-    data = pd.DataFrame({'X': x, 'Y': y})
-
-    # 创建图表
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-
-    if chart == '散点图':
-        ax1.scatter(data['X'], data['Y'], alpha=0.6)
-        ax1.set_xlabel('X')
-        ax1.set_ylabel('Y')
-        ax1.set_title('X vs Y 散点图')
-    elif chart == '直方图':
-        ax1.hist(data['Y'], bins=20, alpha=0.7)
-        ax1.set_xlabel('Y值')
-        ax1.set_ylabel('频次')
-        ax1.set_title('Y值分布直方图')
-    else:  # 箱线图
-        ax1.boxplot([data['X'], data['Y']], labels=['X', 'Y'])
-        ax1.set_title('X和Y的箱线图')
-
-    # 统计信息
-    ax2.axis('off')
-    stats_text = f"""
-    数据统计信息:
-
-    样本大小: {size}
-    噪声水平: {noise:.2f}
-
-    X统计:
-    均值: {data['X'].mean():.2f}
-    标准差: {data['X'].std():.2f}
-
-    Y统计:
-    均值: {data['Y'].mean():.2f}
-    标准差: {data['Y'].std():.2f}
-
-    相关系数: {data['X'].corr(data['Y']):.3f}
-    """
-    ax2.text(0.1, 0.9, stats_text, transform=ax2.transAxes, 
-            fontsize=10, verticalalignment='top')
+    data = generate_data(size, noise)
+    chart_result = cached_chart(size, noise, chart)
 
-    plt.tight_layout()
+    chart_cache = render_chart.cache_info()
+    data_cache = generate_data.cache_info()
+    if chart_result['hit']:
+        cache_status = (f"命中缓存，耗时 {chart_result['seconds'] * 1000:.2f} ms"
+                        f"（首次渲染 {chart_result['render_seconds'] * 1000:.0f} ms）")
+    else:
+        cache_status = f"重新渲染，耗时 {chart_result['seconds'] * 1000:.0f} ms"
 
-    fig
+    mo.vstack([
+        mo.image(chart_result['png']),
+        mo.md(
+            f"**图表缓存**：{cache_status}；累计命中 {chart_cache.hits} 次、未命中 {chart_cache.misses} 次，"
+            f"缓存图表 {chart_cache.currsize}/{chart_cache.maxsize} 张、"
+            f"数据 {data_cache.currsize}/{data_cache.maxsize} 份"
+        ),
+    ])
     return (data,)
 
 
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+导出后处理 - 压缩导出的 HTML（空白、marimo 挂载配置中的 JSON），把批量导出中重复出现的
+data URI 图片提取为共享文件，并在每个文件旁写出 .gz 和 .br 预压缩版本，供静态托管直接使用
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from asset_store import atomic_write
+
+
+# 预压缩的文本类型；图片等二进制文件本身已压缩
+TEXT_SUFFIXES = (".html", ".htm", ".js", ".mjs", ".css", ".json", ".svg", ".md", ".txt", ".ipynb", ".xml", ".map")
+
+# 小于该字节数的文件不生成压缩版本（响应头开销大于节省）
+MIN_COMPRESS_BYTES = 1024
+
+BLOB_DIR_NAME = "_blobs"
+
+# 只提取图片，其他类型（如下载链接中的 CSV）依赖 data URI 的文件名和类型
+BLOB_PATTERN = re.compile(r"data:(image/[\w.+-]+);base64,([A-Za-z0-9+/]+={0,2})")
+
+MOUNT_CONFIG_PATTERN = re.compile(r"window\.__MARIMO_MOUNT_CONFIG__\s*=\s*(\{.*\})\s*;?\s*$", re.S)
+
+# 不改动内容的元素
+RAW_ELEMENT_PATTERN = re.compile(r"(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2\s*>)", re.S | re.I)
+
+COMMENT_PATTERN = re.compile(r"<!--(?!\[if).*?-->", re.S)
+
+
+def load_brotli():
+    """brotli 是可选依赖，未安装时只生成 gzip 版本"""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def compact_mount_config(script):
+    """
+    marimo 把挂载配置写成带缩进、\\uXXXX 转义的对象字面量；重新序列化为紧凑的 UTF-8 JSON，
+    中文内容每个字符从 6 字节减为 3 字节。无法解析时原样返回
+    """
+    match = MOUNT_CONFIG_PATTERN.search(script)
+    if match is None:
+        return script
+    body = match.group(1)
+    try:
+        # 模板中最后一个键后面有逗号
+        config = json.loads(re.sub(r",\s*\}$", "}", body))
+        compact = json.dumps(config, ensure_ascii=False, separators=(",", ":"))
+        compact.encode("utf-8")
+    except (ValueError, UnicodeEncodeError):
+        return script
+    # 防止字符串中的 </script> 提前结束脚本
+    compact = compact.replace("</", "<\\/")
+    return script[:match.start()] + f"window.__MARIMO_MOUNT_CONFIG__ = {compact};"
+
+
+def minify_script(script):
+    if "__MARIMO_MOUNT_CONFIG__" in script:
+        return compact_mount_config(script)
+    if "`" in script:
+        # 模板字符串中的缩进有意义
+        return script
+    lines = (line.strip() for line in script.splitlines())
+    # 保留换行，不依赖自动分号插入以外的任何语法分析
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+
+def minify_markup(markup):
+    markup = COMMENT_PATTERN.sub("", markup)
+    # 空白序列折叠为一个字符，含换行时保留换行，渲染结果不变
+    return re.sub(r"\s+", lambda match: "\n" if "\n" in match.group(0) else " ", markup)
+
+
+def minify_html(text):
+    parts = []
+    position = 0
+    for match in RAW_ELEMENT_PATTERN.finditer(text):
+        parts.append(minify_markup(text[position:match.start()]))
+        open_tag, tag, content, close_tag = match.groups()
+        tag = tag.lower()
+        if tag == "script":
+            content = minify_script(content)
+        elif tag == "style":
+            content = re.sub(r"\s+", " ", re.sub(r"/\*.*?\*/", "", content, flags=re.S)).strip()
+        parts.append(minify_markup(open_tag) + content + close_tag)
+        position = match.end()
+    parts.append(minify_markup(text[position:]))
+    return "".join(parts).strip() + "\n"
+
+
+def blob_digest(data):
+    return hashlib.sha256(data.encode("ascii")).hexdigest()[:20]
+
+
+def blob_name(digest, mime):
+    extension = mimetypes.guess_extension(mime) or ".bin"
+    return f"{digest}{extension}"
+
+
+def scan_blobs(text, min_blob):
+    """返回 {摘要: [类型, base64 长度, 出现次数]}"""
+    blobs = {}
+    for match in BLOB_PATTERN.finditer(text):
+        data = match.group(2)
+        if len(data) < min_blob:
+            continue
+        digest = blob_digest(data)
+        entry = blobs.setdefault(digest, [match.group(1), len(data), 0])
+        entry[2] += 1
+    return blobs
+
+
+def replace_blobs(text, shared, blob_url):
+    """把 shared 中的 data URI 替换为 blob_url 目录下的文件地址"""
+    def replace(match):
+        digest = blob_digest(match.group(2))
+        if digest not in shared:
+            return match.group(0)
+        return f"{blob_url}/{blob_name(digest, match.group(1))}"
+
+    return BLOB_PATTERN.sub(replace, text)
+
+
+def write_text(path, text):
+    atomic_write(path, lambda temp_path: Path(temp_path).write_text(text, encoding="utf-8"))
+
+
+def write_bytes(path, data):
+    # 中途被结束时不留下截断的文件：截断的 .gz/.br 比源文件新，会被 is_fresh 当作最新版本一直保留
+    atomic_write(path, lambda temp_path: Path(temp_path).write_bytes(data))
+
+
+def is_fresh(variant, source):
+    return variant.exists() and variant.stat().st_mtime_ns >= source.stat().st_mtime_ns
+
+
+def compress_file(path, use_gzip=True, use_brotli=True):
+    """写出 .gz/.br，已是最新的版本跳过；返回 {"gzip": 字节数, "brotli": 字节数}"""
+    sizes = {}
+    data = None
+    if path.stat().st_size < MIN_COMPRESS_BYTES:
+        return sizes
+    variants = []
+    if use_gzip:
+        variants.append(("gzip", path.with_name(path.name + ".gz")))
+    brotli = load_brotli() if use_brotli else None
+    if brotli is not None:
+        variants.append(("brotli", path.with_name(path.name + ".br")))
+    for name, variant in variants:
+        if not is_fresh(variant, path):
+            if data is None:
+                data = path.read_bytes()
+            # mtime=0 使相同内容的输出逐字节一致
+            compressed = gzip.compress(data, 9, mtime=0) if name == "gzip" else brotli.compress(data, quality=11)
+            write_bytes(variant, compressed)
+        sizes[name] = variant.stat().st_size
+    return sizes
+
+
+def minify_phase(path, minify, min_blob):
+    """第一阶段：压缩 HTML 并统计其中的大图片"""
+    started = time.perf_counter()
+    original = path.stat().st_size
+    blobs = {}
+    if path.suffix.lower() in (".html", ".htm"):
+        text = path.read_text(encoding="utf-8")
+        if minify:
+            minified = minify_html(text)
+            if minified != text:
+                write_text(path, minified)
+                text = minified
+        if min_blob:
+            blobs = scan_blobs(text, min_blob)
+    return {"path": str(path), "original": original, "minified": path.stat().st_size,
+            "blobs": blobs, "seconds": time.perf_counter() - started}
+
+
+def compress_phase(path, shared, blob_dir, use_gzip, use_brotli):
+    """第二阶段：替换共享图片，写出预压缩版本"""
+    started = time.perf_counter()
+    if shared:
+        text = path.read_text(encoding="utf-8")
+        blob_url = Path(os.path.relpath(blob_dir, path.parent)).as_posix()
+        replaced = replace_blobs(text, shared, blob_url)
+        if replaced != text:
+            write_text(path, replaced)
+    sizes = compress_file(path, use_gzip, use_brotli)
+    return {"path": str(path), "final": path.stat().st_size, "gzip": sizes.get("gzip"),
+            "brotli": sizes.get("brotli"), "seconds": time.perf_counter() - started}
+
+
+def collect_files(paths):
+    """展开目录中的文本文件，跳过已有的压缩版本和共享图片"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(
+                item for item in path.rglob("*")
+                if item.is_file() and item.suffix.lower() in TEXT_SUFFIXES and BLOB_DIR_NAME not in item.parts
+            ))
+        elif path.is_file():
+            files.append(path)
+    return list(dict.fromkeys(files))
+
+
+def default_blob_dir(files):
+    html_dirs = [str(path.resolve().parent) for path in files if path.suffix.lower() in (".html", ".htm")]
+    return Path(os.path.commonpath(html_dirs) if html_dirs else ".") / BLOB_DIR_NAME
+
+
+def postprocess(paths, minify=True, use_gzip=True, use_brotli=True, min_blob=4096, blob_dir=None, workers=None):
+    """
+    对文件或目录执行后处理，返回 {"files": [每个文件的报告], "blobs": [提取的图片], "brotli": 是否可用}；
+    min_blob 为 0 时不提取图片，否则 base64 长度不小于它、在本批文件中出现两次以上的图片写入 blob_dir 一次
+    """
+    files = collect_files(paths)
+    blob_dir = Path(blob_dir) if blob_dir else default_blob_dir(files)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        first = list(pool.map(minify_phase, files, [minify] * len(files), [min_blob] * len(files)))
+
+        counts = Counter()
+        kinds = {}
+        for report in first:
+            for digest, (mime, length, count) in report["blobs"].items():
+                counts[digest] += count
+                kinds[digest] = (mime, length)
+        shared = {digest for digest, count in counts.items() if count >= 2}
+        extracted = []
+        if shared:
+            blob_dir.mkdir(parents=True, exist_ok=True)
+            for report in first:
+                if not any(digest in shared for digest in report["blobs"]):
+                    continue
+                text = Path(report["path"]).read_text(encoding="utf-8")
+                for match in BLOB_PATTERN.finditer(text):
+                    digest = blob_digest(match.group(2))
+                    target = blob_dir / blob_name(digest, match.group(1))
+                    if digest in shared and not target.exists():
+                        write_bytes(target, base64.b64decode(match.group(2)))
+                        extracted.append({"file": str(target), "uses": counts[digest], "bytes": target.stat().st_size})
+
+        shared_by_file = [shared & set(report["blobs"]) for report in first]
+        second = list(pool.map(compress_phase, files, shared_by_file, [blob_dir] * len(files),
+                               [use_gzip] * len(files), [use_brotli] * len(files)))
+
+    reports = []
+    for before, after in zip(first, second):
+        report = {key: value for key, value in before.items() if key != "blobs"}
+        report.update(after)
+        report["seconds"] = before["seconds"] + after["seconds"]
+        reports.append(report)
+    return {"files": reports, "blobs": extracted, "brotli": use_brotli and load_brotli() is not None}
+
+
+def format_size(size):
+    if size is None:
+        return "-"
+    if size >= 1024 * 1024:
+        return f"{size / 1024 / 1024:.1f}M"
+    return f"{size / 1024:.1f}K"
+
+
+def print_report(result):
+    print(f"{'文件':<48} {'原始':>8} {'压缩后':>8} {'gzip':>8} {'brotli':>8} {'耗时':>8}")
+    totals = Counter()
+    for report in result["files"]:
+        name = report["path"] if len(report["path"]) <= 48 else "..." + report["path"][-45:]
+        print(f"{name:<48} {format_size(report['original']):>8} {format_size(report['final']):>8} "
+              f"{format_size(report['gzip']):>8} {format_size(report['brotli']):>8} {report['seconds'] * 1000:>6.0f}ms")
+        for key in ("original", "final", "gzip", "brotli"):
+            totals[key] += report[key] or 0
+    print(f"{'合计':<48} {format_size(totals['original']):>8} {format_size(totals['final']):>8} "
+          f"{format_size(totals['gzip']):>8} {format_size(totals['brotli'] or None):>8}")
+    for blob in result["blobs"]:
+        print(f"共享图片 {blob['file']}（{format_size(blob['bytes'])}，{blob['uses']} 处引用）")
+    if not result["brotli"]:
+        print("未安装 brotli，只生成了 gzip 版本（pip install brotli）", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="压缩导出的 HTML 并生成 gzip/brotli 预压缩文件")
+    parser.add_argument("paths", nargs="+", help="导出的文件或目录")
+    parser.add_argument("--no-minify", action="store_true", help="不压缩 HTML")
+    parser.add_argument("--no-gzip", action="store_true")
+    parser.add_argument("--no-brotli", action="store_true")
+    parser.add_argument("--min-blob", type=int, default=4096,
+                        help="重复出现的图片 base64 长度达到此值时提取为共享文件，0 表示不提取")
+    parser.add_argument("--blob-dir", help=f"共享图片目录，默认是所有 HTML 的公共目录下的 {BLOB_DIR_NAME}")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数，默认为CPU核心数")
+    parser.add_argument("--output", help="把报告写入JSON文件")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = postprocess(args.paths, not args.no_minify, not args.no_gzip, not args.no_brotli,
+                         args.min_blob, args.blob_dir, args.workers)
+    print_report(result)
+    print(f"{len(result['files'])} 个文件，总耗时 {time.perf_counter() - started:.2f} 秒")
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+监视导出 - 轮询选定的笔记本，保存后只重新导出内容变化的笔记本；连续保存在防抖时间内合并为一次，
+导出期间再次修改会取消正在运行的导出，记录每个笔记本最近一次成功导出的时间
+"""
+
+import argparse
+import hashlib
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+
+# 状态：等待（防抖中）、导出中、成功、失败、取消、未变化（保存但内容相同）
+PENDING, RUNNING, SUCCEEDED, FAILED, CANCELLED, UNCHANGED = (
+    "pending", "running", "succeeded", "failed", "cancelled", "unchanged"
+)
+
+STATE_LABELS = {
+    PENDING: "等待",
+    RUNNING: "导出中",
+    SUCCEEDED: "成功",
+    FAILED: "失败",
+    CANCELLED: "已取消",
+    UNCHANGED: "未变化",
+}
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def content_hash(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def default_command(notebook, formats=("html",), output_dir=None):
+    """默认用多格式导出脚本写到笔记本旁边"""
+    command = [sys.executable, str(Path(__file__).resolve().parent / "multi_export.py"), str(notebook),
+               "--formats", *formats]
+    if output_dir:
+        command.extend(["--output-dir", str(output_dir)])
+    return command
+
+
+class WatchEntry:
+    def __init__(self, notebook):
+        self.notebook = str(notebook)
+        self.signature = file_signature(notebook)
+        self.due = None
+        self.queued = False
+        self.process = None
+        self.cancelled = False
+        self.started = None
+        self.exported_hash = None
+        self.last_success = None
+        self.last_duration = None
+        self.state = None
+        self.message = ""
+
+
+class ExportWatcher:
+    """
+    build_command(笔记本) 返回导出用的 argv；on_status(笔记本, 状态, 信息) 在监视线程中调用。
+    所有笔记本在一个轮询线程中检查，导出在子进程中并行运行，最多 workers 个；
+    cwd 为导出命令的工作目录，默认是笔记本所在目录
+    """
+
+    def __init__(self, notebooks, build_command=default_command, debounce=1.0, poll_interval=0.3,
+                 workers=None, on_status=None, export_on_start=False, cwd=None):
+        self.entries = {str(notebook): WatchEntry(notebook) for notebook in notebooks}
+        self.build_command = build_command
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.on_status = on_status
+        self.cwd = cwd
+        self.stop_event = threading.Event()
+        self.lock = threading.RLock()
+        self.pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        self.thread = None
+        if export_on_start:
+            for entry in self.entries.values():
+                entry.due = time.monotonic()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        with self.lock:
+            for entry in self.entries.values():
+                self.cancel(entry)
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def set_status(self, entry, state, message=""):
+        entry.state = state
+        entry.message = message
+        if self.on_status is not None:
+            self.on_status(entry.notebook, state, message)
+
+    def cancel(self, entry):
+        if entry.process is not None and entry.process.poll() is None:
+            entry.cancelled = True
+            entry.process.terminate()
+
+    def loop(self):
+        while not self.stop_event.wait(self.poll_interval):
+            now = time.monotonic()
+            with self.lock:
+                for entry in self.entries.values():
+                    self.check(entry, now)
+
+    def check(self, entry, now):
+        signature = file_signature(entry.notebook)
+        if signature != entry.signature:
+            entry.signature = signature
+            if signature is None:
+                return
+            # 每次保存都把到期时间推后，连续保存只导出一次；正在进行的导出已经过时，立即取消
+            entry.due = now + self.debounce
+            self.cancel(entry)
+            self.set_status(entry, PENDING, f"{self.debounce:.1f} 秒后导出")
+        if entry.due is not None and now >= entry.due and entry.process is None and not entry.queued:
+            entry.due = None
+            entry.queued = True
+            self.pool.submit(self.export, entry)
+
+    def export(self, entry):
+        entry.queued = False
+        try:
+            digest = content_hash(entry.notebook)
+        except OSError as e:
+            self.set_status(entry, FAILED, str(e))
+            return
+        if digest == entry.exported_hash:
+            self.set_status(entry, UNCHANGED, "内容与上次导出相同")
+            return
+        with tempfile.TemporaryFile() as stderr:
+            with self.lock:
+                if self.stop_event.is_set():
+                    return
+                entry.cancelled = False
+                entry.started = time.monotonic()
+                try:
+                    entry.process = subprocess.Popen(
+                        list(self.build_command(entry.notebook)), stdout=subprocess.DEVNULL, stderr=stderr,
+                        cwd=str(self.cwd or Path(entry.notebook).resolve().parent),
+                    )
+                except OSError as e:
+                    self.set_status(entry, FAILED, f"无法启动导出: {e}")
+                    return
+                self.set_status(entry, RUNNING)
+            returncode = entry.process.wait()
+            stderr.seek(0)
+            error = stderr.read().decode("utf-8", errors="replace").strip()
+        with self.lock:
+            entry.process = None
+            duration = time.monotonic() - entry.started
+            if entry.cancelled:
+                self.set_status(entry, CANCELLED, "笔记本在导出期间被修改")
+            elif returncode == 0:
+                entry.exported_hash = digest
+                entry.last_success = datetime.now()
+                entry.last_duration = duration
+                self.set_status(entry, SUCCEEDED, f"{duration:.1f} 秒")
+            else:
+                self.set_status(entry, FAILED, f"返回码 {returncode}: {error[-300:]}")
+
+    def status_line(self):
+        """每个笔记本的状态和最近一次成功导出的时间"""
+        parts = []
+        with self.lock:
+            for entry in self.entries.values():
+                text = f"{Path(entry.notebook).name}: {STATE_LABELS.get(entry.state, '监视中')}"
+                if entry.last_success is not None:
+                    text += f"，上次成功 {entry.last_success:%H:%M:%S}（{entry.last_duration:.1f}s）"
+                parts.append(text)
+        return " | ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="监视笔记本，保存后自动重新导出")
+    parser.add_argument("notebooks", nargs="+")
+    parser.add_argument("--formats", nargs="+", default=["html"], help="传给 multi_export.py 的格式")
+    parser.add_argument("--output-dir", help="输出目录，默认与笔记本相同")
+    parser.add_argument("--debounce", type=float, default=1.0, help="最后一次保存后等待的秒数")
+    parser.add_argument("--workers", type=int, default=None, help="同时运行的导出数")
+    parser.add_argument("--initial", action="store_true", help="启动时先导出一次所有笔记本")
+    args = parser.parse_args()
+
+    def report(notebook, state, message):
+        print(f"[{datetime.now():%H:%M:%S}] {Path(notebook).name}: {STATE_LABELS[state]} {message}", flush=True)
+
+    watcher = ExportWatcher(
+        args.notebooks,
+        build_command=lambda notebook: default_command(Path(notebook).resolve(), args.formats, args.output_dir
+                                                       and Path(args.output_dir).resolve()),
+        debounce=args.debounce, workers=args.workers, on_status=report, export_on_start=args.initial,
+    ).start()
+    print(f"正在监视 {len(args.notebooks)} 个笔记本，按 Ctrl+C 停止", flush=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        print(watcher.status_line())
+
+
+if __name__ == "__main__":
+    main()
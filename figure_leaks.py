@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+图形泄漏检测 - 无头运行笔记本后，用合成值逐个改变界面元素（滑块、下拉框、复选框等），
+像 marimo 一样只重新运行引用该元素的单元格及其下游，记录每次重新运行后仍打开的 matplotlib 图形数
+和进程 RSS 增长，找出在长时间运行的 marimo run 会话中不断积累内存的单元格
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import warnings
+from pathlib import Path
+
+from marimo_internals import marimo_internals
+from notebook_runner import HALTING_STATUSES, NotebookRunner
+from process_monitor import read_stat
+
+
+# 每次运行平均增长超过此值（在预热之后）的单元格视为泄漏内存
+DEFAULT_THRESHOLD_KB = 256
+
+# 前几次运行的增长多来自缓存和惰性初始化，不计入泄漏判断
+WARMUP_RUNS = 2
+
+
+def current_rss():
+    stat = read_stat(os.getpid())
+    return stat[1] if stat else 0
+
+
+def open_figures():
+    """当前在 pyplot 中登记的图形编号；笔记本未导入 pyplot 时为空"""
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    return set(pyplot.get_fignums()) if pyplot is not None else set()
+
+
+@marimo_internals("界面元素重放")
+def synthetic_values(element, count):
+    """
+    为界面元素生成 count 个前端格式的值（与浏览器发送给内核的值相同），
+    不支持的元素（按钮、文件上传等）返回空列表
+    """
+    kind = type(element).__name__
+    args = element._args.args
+    if kind in ("slider", "number"):
+        steps = args.get("steps") or []
+        if steps:
+            return [steps[i % len(steps)] for i in range(count)]
+        start, stop = args.get("start"), args.get("stop")
+        if start is None or stop is None:
+            return []
+        step = args.get("step") or (stop - start) / 100
+        positions = max(1, int(round((stop - start) / step)))
+        # 在范围内来回扫动，相邻两次的值不同
+        values = []
+        for i in range(1, count + 1):
+            cycle = i % (2 * positions)
+            index = cycle if cycle <= positions else 2 * positions - cycle
+            values.append(round(start + index * step, 10))
+        return values
+    if kind in ("dropdown", "multiselect"):
+        options = list(args.get("options") or [])
+        return [[options[i % len(options)]] for i in range(count)] if options else []
+    if kind == "radio":
+        options = list(args.get("options") or [])
+        return [options[i % len(options)] for i in range(count)] if options else []
+    if kind in ("checkbox", "switch"):
+        return [i % 2 == 0 for i in range(count)]
+    if kind in ("text", "text_area"):
+        return [f"synthetic {i}" for i in range(count)]
+    return []
+
+
+class CellLeakStats:
+    """一个单元格在重放中的统计"""
+
+    def __init__(self, index, label, lineno):
+        self.index = index
+        self.label = label
+        self.lineno = lineno
+        self.runs = 0
+        self.seconds = []
+        self.rss_deltas = []
+        self.figures_created = 0
+        self.figures = set()
+        self.errors = 0
+        self.error = None
+
+    def to_dict(self, threshold):
+        steady = self.rss_deltas[WARMUP_RUNS:] or self.rss_deltas
+        rss_per_run = statistics.mean(steady) if steady else 0
+        # 用中位数判断：真正泄漏的单元格每次都增长，堆扩展造成的偶发增长只出现在个别运行中
+        rss_median = statistics.median(steady) if steady else 0
+        still_open = len(self.figures & open_figures())
+        return {
+            "index": self.index,
+            "label": self.label,
+            "lineno": self.lineno,
+            "runs": self.runs,
+            "mean_ms": statistics.mean(self.seconds) * 1000 if self.seconds else 0,
+            "figures_created": self.figures_created,
+            "figures_open": still_open,
+            "rss_per_run_kb": rss_per_run / 1024,
+            "rss_median_kb": rss_median / 1024,
+            "rss_total_kb": sum(self.rss_deltas) / 1024,
+            "errors": self.errors,
+            "error": self.error,
+            "leaks_figures": still_open > 1,
+            "leaks_memory": self.runs > WARMUP_RUNS and rss_median > threshold * 1024,
+        }
+
+
+class ReplayRunner(NotebookRunner):
+    """
+    在 NotebookRunner 的基础上重放界面交互；render 为 True 时把单元格新建的图形保存为 PNG，
+    与 marimo 显示图形时的格式化相同（会分配渲染缓冲区）；close_figures 模拟修复后的写法，用于对比
+    """
+
+    def __init__(self, path, runs=20, render=True, close_figures=False, threshold_kb=DEFAULT_THRESHOLD_KB):
+        super().__init__(path, profile_memory=False)
+        self.runs = runs
+        self.render = render
+        self.close_figures = close_figures
+        self.threshold_kb = threshold_kb
+        self.stats = [CellLeakStats(cell.index, cell.label, cell.lineno) for cell in self.graph.cells]
+        self.timeline = []
+
+    def ui_elements(self):
+        """全局变量中的界面元素：[(变量名, 元素, 定义它的单元格)]"""
+        with marimo_internals("界面元素重放"):
+            from marimo._plugins.ui._core.ui_element import UIElement
+
+        elements = []
+        for name, value in self.values.items():
+            if isinstance(value, UIElement) and name in self.graph.definers:
+                elements.append((name, value, self.graph.definers[name]))
+        return elements
+
+    def affected_cells(self, name):
+        """界面元素的值改变时 marimo 重新运行的单元格：引用它的单元格及其下游（不含定义它的单元格）"""
+        definer = self.graph.definers[name]
+        roots = {cell.index for cell in self.graph.cells if name in cell.refs and cell.index != definer}
+        affected = set(roots)
+        for index in roots:
+            affected.update(self.graph.descendants(index))
+        return [index for index in self.graph.topological_order() if index in affected]
+
+    def instrumented_run(self, cell):
+        """执行单元格，记录耗时、新建并仍打开的图形以及 RSS 变化"""
+        stats = self.stats[cell.index]
+        before_figures = open_figures()
+        before_rss = current_rss()
+        started = time.perf_counter()
+        # 单元格的输出和错误堆栈与检测无关，重放几百次时会淹没报告；错误记录在统计中
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            result = self.run_cell(cell)
+        created = open_figures() - before_figures
+        if created and self.render:
+            pyplot = sys.modules["matplotlib.pyplot"]
+            for number in created:
+                pyplot.figure(number).savefig(io.BytesIO(), format="png")
+        if created and self.close_figures:
+            pyplot = sys.modules["matplotlib.pyplot"]
+            for number in created:
+                pyplot.close(number)
+        elapsed = time.perf_counter() - started
+        # 回收本次运行释放的循环引用，剩下的增长才是仍被引用的内存
+        gc.collect()
+        stats.runs += 1
+        stats.seconds.append(elapsed)
+        stats.rss_deltas.append(current_rss() - before_rss)
+        stats.figures_created += len(created)
+        stats.figures.update(created)
+        if result.status == "error":
+            stats.errors += 1
+            stats.error = result.error
+        return result
+
+    def replay(self):
+        """先完整运行一次，再逐个界面元素用合成值重放；返回报告"""
+        sys.path.insert(0, str(self.path.parent))
+        started = time.perf_counter()
+        gc.collect()
+        try:
+            failed = set()
+            for index in self.graph.topological_order():
+                cell = self.graph.cells[index]
+                if self.graph.parents[index] & failed:
+                    self.results[index].status = "skipped"
+                    failed.add(index)
+                    continue
+                if self.instrumented_run(cell).status in HALTING_STATUSES:
+                    failed.add(index)
+            # 首次运行的增长是正常的初始化，只统计重放
+            for stats in self.stats:
+                stats.runs = stats.errors = 0
+                stats.seconds.clear()
+                stats.rss_deltas.clear()
+
+            baseline_rss = current_rss()
+            elements = []
+            for name, element, definer in self.ui_elements():
+                values = synthetic_values(element, self.runs)
+                if not values:
+                    continue
+                cells = self.affected_cells(name)
+                elements.append({"name": name, "kind": type(element).__name__, "cells": cells})
+                for value in values:
+                    with marimo_internals("界面元素重放"):
+                        element._update(value)
+                    rss_before = current_rss()
+                    failed = set()
+                    for index in cells:
+                        if self.graph.parents[index] & failed:
+                            failed.add(index)
+                        elif self.instrumented_run(self.graph.cells[index]).status in HALTING_STATUSES:
+                            failed.add(index)
+                    self.timeline.append({
+                        "element": name,
+                        "value": value,
+                        "open_figures": len(open_figures()),
+                        "rss": current_rss(),
+                        "rss_delta": current_rss() - rss_before,
+                    })
+        finally:
+            sys.path.remove(str(self.path.parent))
+        return {
+            "notebook": str(self.path),
+            "runs_per_element": self.runs,
+            "render": self.render,
+            "close_figures": self.close_figures,
+            "seconds": time.perf_counter() - started,
+            "elements": elements,
+            "open_figures": len(open_figures()),
+            "rss_growth_kb": (self.timeline[-1]["rss"] - baseline_rss) / 1024 if self.timeline else 0,
+            "cells": [stats.to_dict(self.threshold_kb) for stats in self.stats if stats.runs],
+            "timeline": self.timeline,
+        }
+
+
+def detect(path, runs=20, render=True, threshold_kb=DEFAULT_THRESHOLD_KB, confirm=True):
+    """
+    重放并返回报告。有单元格不关闭图形时，泄漏的图形会让堆不断扩展，其他单元格也会显得在增长；
+    confirm 为 True 时关闭所有图形后以关闭图形的方式再重放一次，只有仍在增长的单元格才判定为内存泄漏
+    """
+    report = ReplayRunner(path, runs, render, threshold_kb=threshold_kb).replay()
+    suspects = {cell["index"] for cell in report["cells"] if cell["leaks_memory"] and not cell["figures_created"]}
+    if not (confirm and suspects and any(cell["leaks_figures"] for cell in report["cells"])):
+        return report
+    sys.modules["matplotlib.pyplot"].close("all")
+    confirmation = ReplayRunner(path, runs, render, close_figures=True, threshold_kb=threshold_kb).replay()
+    still_growing = {cell["index"] for cell in confirmation["cells"] if cell["leaks_memory"]}
+    for cell in report["cells"]:
+        if cell["index"] in suspects and cell["index"] not in still_growing:
+            cell["leaks_memory"] = False
+            cell["indirect"] = True
+    report["confirmation_rss_growth_kb"] = confirmation["rss_growth_kb"]
+    return report
+
+
+def print_report(report):
+    print(f"{report['notebook']}: {len(report['elements'])} 个界面元素，每个重放 {report['runs_per_element']} 次，"
+          f"用时 {report['seconds']:.1f} 秒")
+    for element in report["elements"]:
+        print(f"  {element['name']} ({element['kind']}) -> 重新运行 {len(element['cells'])} 个单元格")
+    print(f"重放结束时打开的图形 {report['open_figures']} 个，RSS 增长 {report['rss_growth_kb'] / 1024:.1f} MB")
+    if "confirmation_rss_growth_kb" in report:
+        print(f"关闭图形后再次重放：RSS 增长 {report['confirmation_rss_growth_kb'] / 1024:.1f} MB")
+    print(f"{'单元格':<32} {'行号':>5} {'运行':>5} {'平均耗时':>10} {'新建图形':>8} {'仍打开':>6} {'RSS/次':>10}  结论")
+    for cell in sorted(report["cells"], key=lambda cell: cell["rss_per_run_kb"], reverse=True):
+        verdicts = []
+        if cell["leaks_figures"]:
+            verdicts.append("图形未关闭")
+        if cell["leaks_memory"]:
+            verdicts.append("内存持续增长")
+        if cell.get("indirect"):
+            verdicts.append("增长由其他单元格的图形引起")
+        if cell["errors"]:
+            verdicts.append(f"{cell['errors']} 次出错: {cell['error']}")
+        print(f"{cell['label']:<32} {cell['lineno']:>5} {cell['runs']:>5} {cell['mean_ms']:>8.1f}ms "
+              f"{cell['figures_created']:>8} {cell['figures_open']:>6} {cell['rss_per_run_kb']:>8.0f}KB  "
+              f"{'，'.join(verdicts) or '-'}")
+
+
+def main():
+    # 无头运行时不弹出图形窗口
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    # 示例笔记本指定了本机可能没有的中文字体，缺字警告与泄漏检测无关
+    warnings.filterwarnings("ignore", message=".*[Gg]lyph.*")
+    warnings.filterwarnings("ignore", message=".*findfont.*")
+
+    parser = argparse.ArgumentParser(description="重放界面交互，检测不断积累图形和内存的单元格")
+    parser.add_argument("notebook", help="marimo笔记本文件")
+    parser.add_argument("--runs", type=int, default=20, help="每个界面元素重放的次数")
+    parser.add_argument("--no-render", action="store_true", help="不把新图形渲染为PNG（marimo显示图形时会渲染）")
+    parser.add_argument("--close-figures", action="store_true", help="每个单元格结束后关闭它新建的图形（模拟修复后）")
+    parser.add_argument("--no-confirm", action="store_true", help="不做关闭图形后的确认重放")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD_KB,
+                        help="判定为内存泄漏的每次运行增长（KB）")
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    parser.add_argument("--fail-on-leak", action="store_true", help="发现泄漏时以返回码 1 退出（用于CI）")
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger("matplotlib.font_manager").setLevel(logging.ERROR)
+
+    if args.close_figures:
+        report = ReplayRunner(args.notebook, runs=args.runs, render=not args.no_render, close_figures=True,
+                              threshold_kb=args.threshold).replay()
+    else:
+        report = detect(args.notebook, args.runs, not args.no_render, args.threshold, confirm=not args.no_confirm)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print_report(report)
+    leaking = [cell for cell in report["cells"] if cell["leaks_figures"] or cell["leaks_memory"]]
+    sys.exit(1 if leaking and args.fail_on_leak else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+启动历史 - 把界面运行的每条命令记录到本地 SQLite：argv、工作目录、笔记本、开始时间、
+首次输出耗时、就绪耗时、返回码和总时长，并按笔记本、选项组合或单个选项汇总 p50/p95
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+from stats_utils import percentile
+
+
+# marimo 服务器打印访问地址时即视为就绪
+READY_PATTERN = re.compile(r"https?://[\w.\-\[\]:]+:\d+")
+
+NOTEBOOK_SUFFIXES = (".py", ".ipynb", ".md")
+
+# python、python3、python3.12、python.exe 等解释器名
+PYTHON_PATTERN = re.compile(r"^python(\d+(\.\d+)?)?(\.exe)?$")
+
+GROUPS = ("notebook", "options", "flags")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS launches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    argv TEXT NOT NULL,
+    cwd TEXT NOT NULL,
+    program TEXT NOT NULL,
+    notebook TEXT,
+    options TEXT NOT NULL,
+    started REAL NOT NULL,
+    first_output REAL,
+    ready REAL,
+    exit_code INTEGER,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS launches_started ON launches (started);
+"""
+
+
+def inner_argv(argv):
+    """守护进程包装的命令取 "--" 之后的部分"""
+    return argv[argv.index("--") + 1:] if "--" in argv else argv
+
+
+def command_parts(argv):
+    """去掉 uv run / python 前缀，第一个元素是程序或脚本"""
+    parts = list(inner_argv(argv))
+    while parts and (parts[0] in ("uv", "run", "-m") or PYTHON_PATTERN.match(Path(parts[0]).name)):
+        parts.pop(0)
+    return parts
+
+
+def program_of(argv):
+    """程序名和子命令，例如 "marimo edit" 或 "app_proxy.py serve" """
+    parts = command_parts(argv)
+    words = [Path(parts[0]).name] if parts else []
+    if len(parts) > 1 and not parts[1].startswith("-"):
+        words.append(parts[1])
+    return " ".join(words)
+
+
+def notebook_of(argv):
+    for part in command_parts(argv)[1:]:
+        if part.endswith(NOTEBOOK_SUFFIXES) and not part.startswith("-"):
+            return part
+    return None
+
+
+def flags_of(argv):
+    """不带值的开关选项（后面紧跟另一个选项或位于末尾），如 --sandbox、--watch"""
+    parts = inner_argv(argv)
+    return sorted({
+        part for index, part in enumerate(parts)
+        if part.startswith("--") and (index + 1 == len(parts) or parts[index + 1].startswith("-"))
+    })
+
+
+class LaunchHistory:
+    """每次操作使用独立的连接，可以在读取输出的线程中直接更新记录"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        db = self.connect()
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _update(self, sql, values):
+        db = self.connect()
+        try:
+            with db:
+                db.execute(sql, values)
+        finally:
+            db.close()
+
+    def start(self, argv, cwd, started=None):
+        argv = list(argv)
+        db = self.connect()
+        try:
+            with db:
+                cursor = db.execute(
+                    "INSERT INTO launches (argv, cwd, program, notebook, options, started) VALUES (?, ?, ?, ?, ?, ?)",
+                    (json.dumps(argv, ensure_ascii=False), str(cwd), program_of(argv), notebook_of(argv),
+                     " ".join(flags_of(argv)), time.time() if started is None else started),
+                )
+            return cursor.lastrowid
+        finally:
+            db.close()
+
+    def first_output(self, launch_id, seconds):
+        self._update("UPDATE launches SET first_output = ? WHERE id = ? AND first_output IS NULL", (seconds, launch_id))
+
+    def ready(self, launch_id, seconds):
+        self._update("UPDATE launches SET ready = ? WHERE id = ? AND ready IS NULL", (seconds, launch_id))
+
+    def finish(self, launch_id, exit_code, duration):
+        self._update("UPDATE launches SET exit_code = ?, duration = ? WHERE id = ?", (exit_code, duration, launch_id))
+
+    def get(self, launch_id):
+        db = self.connect()
+        try:
+            row = db.execute("SELECT * FROM launches WHERE id = ?", (launch_id,)).fetchone()
+        finally:
+            db.close()
+        return self.to_record(row) if row is not None else None
+
+    @staticmethod
+    def to_record(row):
+        record = dict(row)
+        record["argv"] = json.loads(record["argv"])
+        return record
+
+    def recent(self, limit=500, program=None):
+        db = self.connect()
+        try:
+            if program:
+                rows = db.execute(
+                    "SELECT * FROM launches WHERE program = ? ORDER BY started DESC LIMIT ?", (program, limit)
+                ).fetchall()
+            else:
+                rows = db.execute("SELECT * FROM launches ORDER BY started DESC LIMIT ?", (limit,)).fetchall()
+        finally:
+            db.close()
+        return [self.to_record(row) for row in rows]
+
+    def programs(self):
+        db = self.connect()
+        try:
+            return [row[0] for row in db.execute("SELECT DISTINCT program FROM launches ORDER BY program")]
+        finally:
+            db.close()
+
+    @staticmethod
+    def summarize(key, records):
+        ready = sorted(record["ready"] for record in records if record["ready"] is not None)
+        first = sorted(record["first_output"] for record in records if record["first_output"] is not None)
+        finished = [record for record in records if record["exit_code"] is not None]
+        ms = lambda value: value * 1000 if value is not None else None
+        return {
+            "key": key,
+            "launches": len(records),
+            "ready_count": len(ready),
+            "ready_p50_ms": ms(percentile(ready, 50)),
+            "ready_p95_ms": ms(percentile(ready, 95)),
+            "first_output_p50_ms": ms(percentile(first, 50)),
+            # 负返回码表示被信号结束（通常是用户停止服务器），不计为失败
+            "failures": sum(1 for record in finished if record["exit_code"] > 0),
+        }
+
+    def stats(self, group="notebook", program=None, limit=100000):
+        """
+        按 notebook（笔记本）、options（完整的开关组合）或 flags（每个开关有/无对比）汇总；
+        flags 分组的键形如 "--sandbox" 和 "无 --sandbox"，便于看出哪个开关拖慢了启动
+        """
+        records = self.recent(limit, program)
+        groups = {}
+        if group == "flags":
+            all_flags = sorted({flag for record in records for flag in record["options"].split()})
+            for flag in all_flags:
+                for record in records:
+                    key = flag if flag in record["options"].split() else f"无 {flag}"
+                    groups.setdefault(key, []).append(record)
+        else:
+            for record in records:
+                key = record[group] if group == "notebook" else record["options"] or "(无开关)"
+                groups.setdefault(key or "(无笔记本)", []).append(record)
+        return [self.summarize(key, items) for key, items in sorted(groups.items())]
+
+
+def format_ms(value):
+    return f"{value:8.0f}" if value is not None else "       -"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看启动历史和启动耗时统计")
+    parser.add_argument("database", help="历史数据库（通常是 .marimo_ui/history.sqlite）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="最近的启动记录")
+    list_parser.add_argument("--limit", type=int, default=20)
+    stats_parser = subparsers.add_parser("stats", help="按分组统计就绪耗时")
+    stats_parser.add_argument("--by", choices=GROUPS, default="notebook")
+    stats_parser.add_argument("--program", help="只统计此程序，例如 \"marimo edit\"")
+    args = parser.parse_args()
+
+    history = LaunchHistory(args.database)
+    if args.command == "list":
+        for record in history.recent(args.limit):
+            started = datetime.fromtimestamp(record["started"]).isoformat(timespec="seconds")
+            ready = format_ms(record["ready"] * 1000 if record["ready"] is not None else None)
+            print(f"#{record['id']:<5} {started} {record['program']:<18} 就绪 {ready} ms  "
+                  f"返回码 {record['exit_code'] if record['exit_code'] is not None else '-':<4} "
+                  f"{record['notebook'] or ''} {record['options']}")
+    else:
+        print(f"{'分组':<32} {'次数':>5} {'就绪 p50':>9} {'就绪 p95':>9} {'首次输出 p50':>12} {'失败':>5}")
+        for row in history.stats(args.by, args.program):
+            print(f"{row['key'][:32]:<32} {row['launches']:>5} {format_ms(row['ready_p50_ms']):>9} "
+                  f"{format_ms(row['ready_p95_ms']):>9} {format_ms(row['first_output_p50_ms']):>12} "
+                  f"{row['failures']:>5}")
+
+
+if __name__ == "__main__":
+    main()
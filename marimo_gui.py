@@ -3,13 +3,24 @@
 Marimo GUI - 基于PySide6的marimo命令行工具图形界面
 """
 
+import json
+import multiprocessing
+import os
+import secrets
+import shlex
+import signal
 import subprocess
 import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime
 from pathlib import Path
 
-from PySide6.QtCore import QObject, Qt, QThread, Signal
+from PySide6.QtCore import QObject, Qt, QThread, QTimer, Signal
 from PySide6.QtGui import QFont
 from PySide6.QtWidgets import (
+    QAbstractItemView,
     QApplication,
     QCheckBox,
     QComboBox,
@@ -17,48 +28,256 @@ from PySide6.QtWidgets import (
     QFormLayout,
     QGroupBox,
     QHBoxLayout,
+    QHeaderView,
     QLabel,
     QLineEdit,
+    QListWidget,
+    QListWidgetItem,
     QMainWindow,
     QMessageBox,
+    QPlainTextEdit,
     QPushButton,
     QScrollArea,
     QSpinBox,
     QStatusBar,
+    QTableWidget,
+    QTableWidgetItem,
     QTabWidget,
     QTextEdit,
     QVBoxLayout,
     QWidget,
 )
 
+from app_proxy import TOKEN_ENV
+from cell_cache import CellCache
+from command_builder import Command, has_secrets, marimo_command, script_command
+from command_logs import STDERR, STDOUT, LogIndex, LogStore, load_settings, save_settings
+from config_presets import PRESET_KEYS, load_presets, presets_path, save_preset
+from export_watcher import STATE_LABELS, ExportWatcher
+from launch_history import GROUPS, READY_PATTERN, LaunchHistory
+from notebook_graph import analyze_notebook
+from notebook_runner import ProfileStore
+from perf_advisor import RULES, advise_many, collect, default_cache_path
+from process_monitor import ProcessMonitor, sparkline
+from server_guard import guard_available
+
+# 辅助脚本与GUI位于同一目录，通过 uv run 在项目环境中执行
+SCRIPT_DIR = Path(__file__).resolve().parent
+RUNNER_SCRIPT = SCRIPT_DIR / "notebook_runner.py"
+LEAKS_SCRIPT = SCRIPT_DIR / "figure_leaks.py"
+SCHEDULER_SCRIPT = SCRIPT_DIR / "notebook_scheduler.py"
+PROXY_SCRIPT = SCRIPT_DIR / "app_proxy.py"
+GUARD_SCRIPT = SCRIPT_DIR / "server_guard.py"
+ACTIVATION_SCRIPT = SCRIPT_DIR / "socket_activation.py"
+MULTI_EXPORT_SCRIPT = SCRIPT_DIR / "multi_export.py"
+SITE_BUILDER_SCRIPT = SCRIPT_DIR / "site_builder.py"
+CONFIG_PRESETS_SCRIPT = SCRIPT_DIR / "config_presets.py"
+
+# GUI 启动的所有进程树都登记在这里，由监控标签页定时采样
+PROCESS_MONITOR = ProcessMonitor()
+
 
 class CommandRunner(QObject):
-    """在后台线程中运行命令"""
+    """在后台线程中运行 argv 命令（不经过 shell）"""
     finished = Signal(str)
     error = Signal(str)
 
-    def __init__(self, command, working_dir=None):
+    def __init__(self, command, working_dir=None, env=None):
         super().__init__()
-        self.command = command
+        self.env = env or {}
+        self.argv = list(command)
+        # 进程监视、日志和启动历史只保存隐藏了密码的命令
+        self.masked_argv = command.masked()
+        self.command = shlex.join(self.masked_argv)
         self.working_dir = working_dir or Path.cwd()
 
     def run(self):
         try:
-            result = subprocess.run(
-                self.command,
-                shell=True,
-                capture_output=True,
+            started = time.time()
+            clock = time.perf_counter()
+            process = subprocess.Popen(
+                self.argv,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
                 text=True,
-                cwd=self.working_dir
+                errors="replace",
+                cwd=self.working_dir,
+                # 关闭子进程的输出缓冲，首次输出和就绪时间才准确
+                env={**os.environ, **self.env, "PYTHONUNBUFFERED": "1"},
             )
-            if result.returncode == 0:
-                self.finished.emit(result.stdout)
+            PROCESS_MONITOR.track(process.pid, self.command)
+            log = LogStore(command_log_dir(self.working_dir)).create_run(self.command, self.working_dir, process.pid)
+            history = LaunchHistory(launch_history_path(self.working_dir))
+            launch_id = history.start(self.masked_argv, self.working_dir, started)
+            milestones = {"first_output": False, "ready": False}
+            milestones_lock = threading.Lock()
+            stdout, stderr = [], []
+
+            def record_milestones(line):
+                with milestones_lock:
+                    if not milestones["first_output"]:
+                        milestones["first_output"] = True
+                        history.first_output(launch_id, time.perf_counter() - clock)
+                    if not milestones["ready"] and READY_PATTERN.search(line):
+                        milestones["ready"] = True
+                        history.ready(launch_id, time.perf_counter() - clock)
+
+            # 每个管道一个读取线程，只把行放入日志队列，子进程不会因写磁盘而阻塞
+            def drain(stream, tag, lines):
+                for line in iter(stream.readline, ""):
+                    if not milestones["ready"]:
+                        record_milestones(line)
+                    lines.append(line)
+                    log.write(tag, line)
+                stream.close()
+
+            readers = [
+                threading.Thread(target=drain, args=(process.stdout, STDOUT, stdout), daemon=True),
+                threading.Thread(target=drain, args=(process.stderr, STDERR, stderr), daemon=True),
+            ]
+            for reader in readers:
+                reader.start()
+            for reader in readers:
+                reader.join()
+            process.wait()
+            log.close(process.returncode)
+            history.finish(launch_id, process.returncode, time.perf_counter() - clock)
+            if process.returncode == 0:
+                self.finished.emit("".join(stdout))
             else:
-                self.error.emit(result.stderr or result.stdout)
+                self.error.emit("".join(stderr) or "".join(stdout))
         except Exception as e:
             self.error.emit(str(e))
 
 
+def command_log_dir(working_dir):
+    return Path(working_dir) / ".marimo_ui" / "logs"
+
+
+def launch_history_path(working_dir):
+    return Path(working_dir) / ".marimo_ui" / "history.sqlite"
+
+
+def asset_store_dir(working_dir):
+    return Path(working_dir) / ".marimo_ui" / "assets"
+
+
+class ProxyProcess:
+    """在独立进程组中运行 app_proxy.py serve，停止时连同各个 marimo 子进程一起结束"""
+
+    def __init__(self, log_path):
+        self.log_path = Path(log_path)
+        self.process = None
+        self.history = None
+        self.launch_id = None
+        self.started = None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    @property
+    def returncode(self):
+        return self.process.poll() if self.process is not None else None
+
+    def start(self, command, working_dir, env=None):
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, "w", encoding="utf-8") as log:
+            self.process = subprocess.Popen(
+                list(command), cwd=working_dir, stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+                env={**os.environ, **(env or {})},
+            )
+        PROCESS_MONITOR.track(self.process.pid, command.preview())
+        self.started = time.perf_counter()
+        self.history = LaunchHistory(launch_history_path(working_dir))
+        self.launch_id = self.history.start(command.masked(), working_dir)
+
+    def stop(self):
+        if self.running:
+            try:
+                if sys.platform == "win32":
+                    # Windows 没有进程组信号，只能结束代理进程本身
+                    self.process.terminate()
+                else:
+                    os.killpg(self.process.pid, signal.SIGTERM)
+                self.process.wait(timeout=10)
+            except (ProcessLookupError, subprocess.TimeoutExpired):
+                self.process.kill()
+        if self.process is not None and self.launch_id is not None:
+            self.history.finish(self.launch_id, self.process.wait(), time.perf_counter() - self.started)
+            self.launch_id = None
+        self.process = None
+
+    def log(self):
+        return self.log_path.read_text(encoding="utf-8", errors="replace") if self.log_path.exists() else ""
+
+
+class GuardGroup(QGroupBox):
+    """内存与空闲守护设置，运行和编辑标签页共用"""
+
+    def __init__(self, working_dir, show_log):
+        super().__init__("内存与空闲守护")
+        self.working_dir = working_dir
+        layout = QFormLayout()
+
+        self.enabled_check = QCheckBox("通过守护进程启动服务器")
+        layout.addRow(self.enabled_check)
+        if not guard_available():
+            # 守护依赖 /proc 读取连接数和内存，其他系统上空闲策略会误停正在使用的服务器
+            self.enabled_check.setEnabled(False)
+            self.enabled_check.setToolTip("当前系统没有 /proc，无法检测连接数和内存，守护仅支持 Linux")
+
+        self.soft_rss_input = QSpinBox()
+        self.soft_rss_input.setRange(0, 1024 * 1024)
+        self.soft_rss_input.setSuffix(" MB")
+        self.soft_rss_input.setSpecialValueText("不限制")
+        layout.addRow("软内存限制 (记录警告):", self.soft_rss_input)
+
+        self.hard_rss_input = QSpinBox()
+        self.hard_rss_input.setRange(0, 1024 * 1024)
+        self.hard_rss_input.setSuffix(" MB")
+        self.hard_rss_input.setSpecialValueText("不限制")
+        layout.addRow("硬内存限制 (平滑重启):", self.hard_rss_input)
+
+        self.idle_input = QSpinBox()
+        self.idle_input.setRange(0, 24 * 60)
+        self.idle_input.setSuffix(" 分钟")
+        self.idle_input.setSpecialValueText("不启用")
+        layout.addRow("无连接后停止:", self.idle_input)
+
+        log_btn = QPushButton("查看守护日志")
+        log_btn.clicked.connect(lambda: show_log(self.read_log()))
+        layout.addRow(log_btn)
+        self.setLayout(layout)
+
+    def log_path(self):
+        return Path(self.working_dir) / ".marimo_ui" / "guard.log"
+
+    def read_log(self, lines=200):
+        if not self.log_path().exists():
+            return "暂无守护日志"
+        return "\n".join(self.log_path().read_text(encoding="utf-8").splitlines()[-lines:])
+
+    def wrap(self, command, port, label):
+        """启用守护时把服务器命令包装为 server_guard.py 的子命令"""
+        if not self.enabled_check.isChecked():
+            return command
+        wrapped = script_command(GUARD_SCRIPT).option("--port", port)
+        wrapped.option("--soft-rss", self.soft_rss_input.value()).option("--hard-rss", self.hard_rss_input.value())
+        wrapped.option("--idle-minutes", self.idle_input.value())
+        wrapped.option("--label", label).option("--log", self.log_path())
+        return wrapped.arg("--").extend(command)
+
+
+def fetch_proxy_stats(url):
+    """读取运行中代理的统计，代理未就绪时返回None"""
+    try:
+        with urllib.request.urlopen(f"{url}/_proxy/stats", timeout=0.5) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
 class BaseTab(QWidget):
     """基础标签页类"""
 
@@ -78,24 +297,65 @@ class BaseTab(QWidget):
         output_group.setLayout(output_layout)
         self.layout.addWidget(output_group)
         
-    def run_command(self, command):
-        """运行命令并显示输出"""
+    def add_command_preview(self):
+        """添加命令预览：表单中任一输入变化时重新调用 build_command 显示精确的 argv"""
+        preview_group = QGroupBox("命令预览 (argv)")
+        preview_layout = QVBoxLayout()
+        self.preview_input = QLineEdit()
+        self.preview_input.setReadOnly(True)
+        self.preview_input.setFont(QFont("Consolas", 9))
+        preview_layout.addWidget(self.preview_input)
+        preview_group.setLayout(preview_layout)
+        self.layout.addWidget(preview_group)
+
+        for widget in self.findChildren(QLineEdit):
+            if widget is not self.preview_input:
+                widget.textChanged.connect(self.refresh_preview)
+        for widget in self.findChildren(QTextEdit):
+            if widget is not self.output_text:
+                widget.textChanged.connect(self.refresh_preview)
+        for widget in self.findChildren(QSpinBox):
+            widget.valueChanged.connect(self.refresh_preview)
+        for widget in self.findChildren(QCheckBox):
+            widget.toggled.connect(self.refresh_preview)
+        for widget in self.findChildren(QComboBox):
+            widget.currentIndexChanged.connect(self.refresh_preview)
+        for widget in self.findChildren(QListWidget):
+            widget.model().rowsInserted.connect(self.refresh_preview)
+            widget.model().rowsRemoved.connect(self.refresh_preview)
+        self.refresh_preview()
+
+    def refresh_preview(self, *_args):
+        command = self.build_command()
+        self.preview_input.setText(command.exact())
+        self.preview_input.setToolTip(command.preview())
+        self.preview_input.setCursorPosition(0)
+
+    def run_command(self, command, on_finished=None, working_dir=None, env=None):
+        """运行 argv 命令并显示输出，on_finished 在命令成功后额外调用，env 中的变量追加到子进程环境"""
+        working_dir = working_dir or self.working_dir
         self.output_text.clear()
-        self.output_text.append(f"工作目录: {self.working_dir}")
-        self.output_text.append(f"执行命令: {command}\n")
+        self.output_text.append(f"工作目录: {working_dir}")
+        self.output_text.append(f"执行命令: {command.preview()}\n")
 
         self.thread = QThread()
-        self.runner = CommandRunner(command, self.working_dir)
+        self.runner = CommandRunner(command, working_dir, env)
         self.runner.moveToThread(self.thread)
 
         self.thread.started.connect(self.runner.run)
         self.runner.finished.connect(self.on_command_finished)
         self.runner.error.connect(self.on_command_error)
+        if on_finished is not None:
+            self.runner.finished.connect(on_finished)
         self.runner.finished.connect(self.thread.quit)
         self.runner.error.connect(self.thread.quit)
 
         self.thread.start()
     
+    def show_guard_log(self, text):
+        self.output_text.clear()
+        self.output_text.append(text)
+
     def on_command_finished(self, output):
         self.output_text.append("执行成功:")
         self.output_text.append(output)
@@ -172,6 +432,9 @@ class EditTab(BaseTab):
         self.token_password_input.setPlaceholderText("令牌密码 (可选)")
         self.token_password_input.setEchoMode(QLineEdit.Password)
         
+        # 内存与空闲守护
+        self.guard_group = GuardGroup(self.working_dir, self.show_guard_log)
+
         # 运行按钮
         run_btn = QPushButton("启动编辑器")
         run_btn.clicked.connect(self.run_edit)
@@ -185,6 +448,7 @@ class EditTab(BaseTab):
         scroll_layout.addWidget(options_group)
         scroll_layout.addWidget(QLabel("令牌密码:"))
         scroll_layout.addWidget(self.token_password_input)
+        scroll_layout.addWidget(self.guard_group)
         scroll_layout.addWidget(run_btn)
         scroll_layout.addStretch()
         
@@ -192,6 +456,7 @@ class EditTab(BaseTab):
         scroll.setWidgetResizable(True)
         
         self.layout.addWidget(scroll)
+        self.add_command_preview()
         self.add_output_section()
     
     def browse_file(self):
@@ -200,49 +465,43 @@ class EditTab(BaseTab):
         )
         if file_path:
             self.file_input.setText(file_path)
-    
-    def run_edit(self):
-        command = "uv run marimo edit"
-        
-        if self.file_input.text().strip():
-            command += f' "{self.file_input.text().strip()}"'
-        
-        command += f" --port {self.port_input.value()}"
-        command += f" --host {self.host_input.text()}"
-        
-        if self.proxy_input.text().strip():
-            command += f' --proxy "{self.proxy_input.text().strip()}"'
-        
-        if self.base_url_input.text().strip():
-            command += f' --base-url "{self.base_url_input.text().strip()}"'
-        
-        if self.headless_check.isChecked():
-            command += " --headless"
-        
+
+    def build_command(self):
+        command = marimo_command("edit").arg(self.file_input.text().strip())
+        command.option("--port", self.port_input.value())
+        command.option("--host", self.host_input.text().strip())
+        command.option("--proxy", self.proxy_input.text().strip())
+        command.option("--base-url", self.base_url_input.text().strip())
+        command.flag("--headless", self.headless_check.isChecked())
+
         if self.token_check.isChecked():
-            command += " --token"
-            if self.token_password_input.text().strip():
-                command += f' --token-password "{self.token_password_input.text().strip()}"'
+            command.flag("--token")
+            command.option("--token-password", self.token_password_input.text().strip())
         else:
-            command += " --no-token"
-        
-        if self.sandbox_check.isChecked():
-            command += " --sandbox"
-        
-        if self.watch_check.isChecked():
-            command += " --watch"
-        
-        if self.skip_update_check.isChecked():
-            command += " --skip-update-check"
-        
-        self.run_command(command)
+            command.flag("--no-token")
+
+        command.flag("--sandbox", self.sandbox_check.isChecked())
+        command.flag("--watch", self.watch_check.isChecked())
+        command.flag("--skip-update-check", self.skip_update_check.isChecked())
+
+        label = f"edit {Path(self.file_input.text().strip()).name or ''}:{self.port_input.value()}"
+        return self.guard_group.wrap(command, self.port_input.value(), label)
+    
+    def run_edit(self):
+        self.run_command(self.build_command())
 
 
 class RunTab(BaseTab):
     """运行标签页"""
     def __init__(self, working_dir=None):
         super().__init__(working_dir)
+        self.replicas = ProxyProcess(Path(self.working_dir) / ".marimo_ui" / "replicas.log")
+        self.replicas_token = None
+        # 端口 -> 按需启动激活器进程
+        self.activations = {}
         self.init_ui()
+        QApplication.instance().aboutToQuit.connect(self.stop_replicas)
+        QApplication.instance().aboutToQuit.connect(self.stop_all_activations)
         
     def init_ui(self):
         # 文件选择
@@ -296,10 +555,167 @@ class RunTab(BaseTab):
         options_layout.addWidget(self.redirect_console_check)
         options_group.setLayout(options_layout)
         
+        # 内存与空闲守护
+        self.guard_group = GuardGroup(self.working_dir, self.show_guard_log)
+
         # 运行按钮
         run_btn = QPushButton("运行应用")
         run_btn.clicked.connect(self.run_app)
-        
+
+        # 性能分析
+        profile_group = QGroupBox("单元格性能分析")
+        profile_layout = QVBoxLayout()
+
+        self.profile_memory_check = QCheckBox("统计峰值内存 (tracemalloc，会拖慢导入)")
+        self.profile_memory_check.setChecked(True)
+        profile_btn = QPushButton("性能分析 (无头运行)")
+        profile_btn.clicked.connect(self.profile_app)
+
+        self.profile_summary_label = QLabel("尚未分析")
+        self.profile_table = QTableWidget(0, 7)
+        self.profile_table.setHorizontalHeaderLabels(
+            ["单元格", "行号", "墙钟时间(ms)", "CPU时间(ms)", "峰值内存(KB)", "较上次(ms)", "状态"]
+        )
+        self.profile_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.profile_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.profile_table.horizontalHeader().setStretchLastSection(True)
+        self.profile_table.setSortingEnabled(True)
+        self.profile_table.setMinimumHeight(240)
+
+        profile_layout.addWidget(self.profile_memory_check)
+        profile_layout.addWidget(profile_btn)
+        profile_layout.addWidget(self.profile_summary_label)
+        profile_layout.addWidget(self.profile_table)
+        profile_group.setLayout(profile_layout)
+
+        # 图形泄漏检测
+        leaks_group = QGroupBox("图形泄漏检测")
+        leaks_layout = QVBoxLayout()
+        leaks_form = QFormLayout()
+
+        self.leak_runs_input = QSpinBox()
+        self.leak_runs_input.setRange(3, 500)
+        self.leak_runs_input.setValue(20)
+        leaks_form.addRow("每个界面元素重放次数:", self.leak_runs_input)
+
+        self.leak_render_check = QCheckBox("把新图形渲染为PNG（与 marimo 显示图形相同）")
+        self.leak_render_check.setChecked(True)
+        leaks_form.addRow("", self.leak_render_check)
+
+        leaks_btn = QPushButton("检测泄漏 (用合成值重放界面交互)")
+        leaks_btn.clicked.connect(self.detect_leaks)
+
+        self.leaks_summary_label = QLabel("尚未检测")
+        self.leaks_table = QTableWidget(0, 7)
+        self.leaks_table.setHorizontalHeaderLabels(
+            ["单元格", "行号", "运行次数", "新建图形", "仍打开图形", "RSS/次(KB)", "结论"]
+        )
+        self.leaks_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.leaks_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.leaks_table.horizontalHeader().setStretchLastSection(True)
+        self.leaks_table.setSortingEnabled(True)
+        self.leaks_table.setMinimumHeight(200)
+
+        leaks_layout.addLayout(leaks_form)
+        leaks_layout.addWidget(leaks_btn)
+        leaks_layout.addWidget(self.leaks_summary_label)
+        leaks_layout.addWidget(self.leaks_table)
+        leaks_group.setLayout(leaks_layout)
+
+        # 多副本负载均衡
+        replicas_group = QGroupBox("多副本负载均衡")
+        replicas_layout = QVBoxLayout()
+        replicas_form = QFormLayout()
+
+        self.replica_count_input = QSpinBox()
+        self.replica_count_input.setRange(1, 64)
+        self.replica_count_input.setValue(max(2, min(4, os.cpu_count() or 1)))
+        replicas_form.addRow("副本数:", self.replica_count_input)
+
+        self.balancer_port_input = QSpinBox()
+        self.balancer_port_input.setRange(1000, 65535)
+        self.balancer_port_input.setValue(8100)
+        replicas_form.addRow("均衡器端口:", self.balancer_port_input)
+
+        self.bench_sessions_input = QSpinBox()
+        self.bench_sessions_input.setRange(1, 10000)
+        self.bench_sessions_input.setValue(40)
+        replicas_form.addRow("对比测试会话数:", self.bench_sessions_input)
+
+        self.bench_concurrency_input = QSpinBox()
+        self.bench_concurrency_input.setRange(1, 1000)
+        self.bench_concurrency_input.setValue(8)
+        replicas_form.addRow("对比测试并发数:", self.bench_concurrency_input)
+        replicas_layout.addLayout(replicas_form)
+
+        replica_buttons = QHBoxLayout()
+        self.start_replicas_btn = QPushButton("启动副本")
+        self.start_replicas_btn.clicked.connect(self.start_replicas)
+        self.stop_replicas_btn = QPushButton("停止副本")
+        self.stop_replicas_btn.clicked.connect(self.stop_replicas)
+        self.stop_replicas_btn.setEnabled(False)
+        add_replica_btn = QPushButton("增加副本")
+        add_replica_btn.clicked.connect(lambda: self.scale_replicas("add"))
+        remove_replica_btn = QPushButton("移除副本")
+        remove_replica_btn.clicked.connect(lambda: self.scale_replicas("remove"))
+        bench_replicas_btn = QPushButton("单进程与多副本对比")
+        bench_replicas_btn.clicked.connect(self.bench_replicas)
+        for button in (self.start_replicas_btn, self.stop_replicas_btn, add_replica_btn,
+                       remove_replica_btn, bench_replicas_btn):
+            replica_buttons.addWidget(button)
+        replicas_layout.addLayout(replica_buttons)
+
+        self.replicas_label = QLabel("副本未运行")
+        self.replicas_table = QTableWidget(0, 7)
+        self.replicas_table.setHorizontalHeaderLabels(
+            ["副本", "端口", "活动连接", "请求数", "p50(ms)", "p95(ms)", "状态"]
+        )
+        self.replicas_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.replicas_table.horizontalHeader().setStretchLastSection(True)
+        replicas_layout.addWidget(self.replicas_label)
+        replicas_layout.addWidget(self.replicas_table)
+        replicas_group.setLayout(replicas_layout)
+
+        self.replicas_timer = QTimer(self)
+        self.replicas_timer.setInterval(2000)
+        self.replicas_timer.timeout.connect(self.refresh_replicas)
+
+        # 按需启动
+        activation_group = QGroupBox("按需启动 (首个连接到达时才启动服务器)")
+        activation_layout = QVBoxLayout()
+        activation_form = QFormLayout()
+
+        self.activation_idle_input = QSpinBox()
+        self.activation_idle_input.setRange(1, 24 * 60)
+        self.activation_idle_input.setValue(10)
+        self.activation_idle_input.setSuffix(" 分钟")
+        activation_form.addRow("空闲后停止:", self.activation_idle_input)
+        activation_layout.addLayout(activation_form)
+
+        activation_buttons = QHBoxLayout()
+        register_btn = QPushButton("注册当前笔记本")
+        register_btn.clicked.connect(self.register_activation)
+        unregister_btn = QPushButton("注销选中")
+        unregister_btn.clicked.connect(self.unregister_activation)
+        bench_activation_btn = QPushButton("首请求延迟对比")
+        bench_activation_btn.clicked.connect(self.bench_activation)
+        activation_buttons.addWidget(register_btn)
+        activation_buttons.addWidget(unregister_btn)
+        activation_buttons.addWidget(bench_activation_btn)
+        activation_layout.addLayout(activation_buttons)
+
+        self.activation_table = QTableWidget(0, 5)
+        self.activation_table.setHorizontalHeaderLabels(["笔记本", "端口", "状态", "冷启动次数", "上次冷启动(ms)"])
+        self.activation_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.activation_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.activation_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        activation_layout.addWidget(self.activation_table)
+        activation_group.setLayout(activation_layout)
+
+        self.activation_timer = QTimer(self)
+        self.activation_timer.setInterval(2000)
+        self.activation_timer.timeout.connect(self.refresh_activations)
+
         # 布局
         scroll = QScrollArea()
         scroll_widget = QWidget()
@@ -307,13 +723,19 @@ class RunTab(BaseTab):
         scroll_layout.addWidget(file_group)
         scroll_layout.addWidget(server_group)
         scroll_layout.addWidget(options_group)
+        scroll_layout.addWidget(self.guard_group)
         scroll_layout.addWidget(run_btn)
+        scroll_layout.addWidget(activation_group)
+        scroll_layout.addWidget(replicas_group)
+        scroll_layout.addWidget(profile_group)
+        scroll_layout.addWidget(leaks_group)
         scroll_layout.addStretch()
         
         scroll.setWidget(scroll_widget)
         scroll.setWidgetResizable(True)
         
         self.layout.addWidget(scroll)
+        self.add_command_preview()
         self.add_output_section()
     
     def browse_file(self):
@@ -322,34 +744,299 @@ class RunTab(BaseTab):
         )
         if file_path:
             self.file_input.setText(file_path)
+
+    def build_command(self):
+        command = marimo_command("run").arg(self.file_input.text().strip())
+        command.option("--port", self.port_input.value())
+        command.option("--host", self.host_input.text().strip())
+        command.option("--session-ttl", self.session_ttl_input.value())
+        command.flag("--headless", self.headless_check.isChecked())
+        command.flag("--include-code", self.include_code_check.isChecked())
+        command.flag("--watch", self.watch_check.isChecked())
+        command.flag("--sandbox", self.sandbox_check.isChecked())
+        command.flag("--redirect-console-to-browser", self.redirect_console_check.isChecked())
+
+        label = f"run {Path(self.file_input.text().strip()).name}:{self.port_input.value()}"
+        return self.guard_group.wrap(command, self.port_input.value(), label)
     
     def run_app(self):
         if not self.file_input.text().strip():
             QMessageBox.warning(self, "警告", "请选择要运行的笔记本文件")
             return
-        
-        command = f'uv run marimo run "{self.file_input.text().strip()}"'
-        command += f" --port {self.port_input.value()}"
-        command += f" --host {self.host_input.text()}"
-        command += f" --session-ttl {self.session_ttl_input.value()}"
-        
-        if self.headless_check.isChecked():
-            command += " --headless"
-        
-        if self.include_code_check.isChecked():
-            command += " --include-code"
-        
-        if self.watch_check.isChecked():
-            command += " --watch"
-        
-        if self.sandbox_check.isChecked():
-            command += " --sandbox"
-        
-        if self.redirect_console_check.isChecked():
-            command += " --redirect-console-to-browser"
-        
+        self.run_command(self.build_command())
+
+    def activation_dir(self):
+        return Path(self.working_dir) / ".marimo_ui" / "activation"
+
+    def register_activation(self):
+        """由激活器进程持有端口，第一个连接到达时才启动 marimo run"""
+        if not self.file_input.text().strip():
+            QMessageBox.warning(self, "警告", "请选择要运行的笔记本文件")
+            return
+        port = self.port_input.value()
+        if port in self.activations and self.activations[port].running:
+            QMessageBox.warning(self, "警告", f"端口 {port} 已注册")
+            return
+
+        command = script_command(ACTIVATION_SCRIPT, "serve", self.notebook_path())
+        command.option("--host", self.host_input.text().strip()).option("--port", port)
+        command.option("--idle-minutes", self.activation_idle_input.value())
+        command.option("--session-ttl", self.session_ttl_input.value())
+        command.option("--status", self.activation_dir() / f"{port}.json")
+        command.flag("--include-code", self.include_code_check.isChecked())
+
+        activation = ProxyProcess(self.activation_dir() / f"{port}.log")
+        activation.start(command, self.working_dir)
+        self.activations[port] = activation
+        self.output_text.append(f"已注册按需启动: {command.preview()}")
+        self.activation_timer.start()
+        self.refresh_activations()
+
+    def unregister_activation(self):
+        for row in sorted({index.row() for index in self.activation_table.selectedIndexes()}, reverse=True):
+            port = int(self.activation_table.item(row, 1).text())
+            activation = self.activations.pop(port, None)
+            if activation is not None:
+                activation.stop()
+        self.refresh_activations()
+
+    def stop_all_activations(self):
+        for activation in self.activations.values():
+            activation.stop()
+        self.activations.clear()
+
+    def bench_activation(self):
+        """比较按需启动时的首个请求、之后的请求与常驻服务器的延迟"""
+        if not self.file_input.text().strip():
+            QMessageBox.warning(self, "警告", "请选择要运行的笔记本文件")
+            return
+        self.run_command(script_command(ACTIVATION_SCRIPT, "bench", self.notebook_path()).option("--runs", 3))
+
+    def refresh_activations(self):
+        self.activation_table.setRowCount(len(self.activations))
+        for row, (port, activation) in enumerate(sorted(self.activations.items())):
+            try:
+                status = json.loads((self.activation_dir() / f"{port}.json").read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                status = {}
+            if not activation.running:
+                state = f"已退出 ({activation.returncode})"
+            else:
+                state = {"stopped": "待命 (未启动)", "starting": "启动中", "running": "运行中"}.get(
+                    status.get("state"), "准备中"
+                )
+            values = [Path(status.get("notebook", "")).name or "-", port, state,
+                      status.get("cold_starts", 0), status.get("last_cold_start_ms") or "-"]
+            for column, value in enumerate(values):
+                item = numeric_item(value) if isinstance(value, (int, float)) else QTableWidgetItem(str(value))
+                self.activation_table.setItem(row, column, item)
+        if not self.activations:
+            self.activation_timer.stop()
+
+    def balancer_url(self):
+        return f"http://127.0.0.1:{self.balancer_port_input.value()}"
+
+    def start_replicas(self):
+        """通过本地均衡器启动同一笔记本的多个 marimo run 副本"""
+        if not self.file_input.text().strip():
+            QMessageBox.warning(self, "警告", "请选择要运行的笔记本文件")
+            return
+        if self.replicas.running:
+            return
+        notebook = self.notebook_path()
+
+        command = script_command(PROXY_SCRIPT, "serve", notebook)
+        command.option("--replicas", self.replica_count_input.value())
+        command.option("--port", self.balancer_port_input.value())
+        command.option("--session-ttl", self.session_ttl_input.value())
+        command.flag("--include-code", self.include_code_check.isChecked())
+
+        self.output_text.clear()
+        self.output_text.append(f"执行命令: {command.preview()}")
+        self.output_text.append(f"日志文件: {self.replicas.log_path}\n")
+        # 扩缩容令牌只通过环境变量传给均衡器和 scale 命令
+        self.replicas_token = secrets.token_urlsafe(16)
+        self.replicas.start(command, self.working_dir, {TOKEN_ENV: self.replicas_token})
+        self.start_replicas_btn.setEnabled(False)
+        self.stop_replicas_btn.setEnabled(True)
+        self.replicas_label.setText("正在启动副本...")
+        self.replicas_timer.start()
+
+    def stop_replicas(self):
+        self.replicas_timer.stop()
+        self.replicas.stop()
+        self.start_replicas_btn.setEnabled(True)
+        self.stop_replicas_btn.setEnabled(False)
+        self.replicas_label.setText("副本未运行")
+
+    def scale_replicas(self, action):
+        """增加一个副本，或排空后移除活动连接最少的副本"""
+        stats = fetch_proxy_stats(self.balancer_url()) if self.replicas.running else None
+        if stats is None:
+            QMessageBox.warning(self, "警告", "副本尚未运行")
+            return
+        name = next(iter(stats["routes"]))
+        self.run_command(
+            script_command(PROXY_SCRIPT, "scale", name, action).option("--url", self.balancer_url()),
+            on_finished=lambda _output: self.refresh_replicas(),
+            env={TOKEN_ENV: self.replicas_token},
+        )
+
+    def bench_replicas(self):
+        """分别用1个进程和N个副本运行会话级负载测试，比较吞吐量和延迟"""
+        if not self.file_input.text().strip():
+            QMessageBox.warning(self, "警告", "请选择要运行的笔记本文件")
+            return
+        command = script_command(PROXY_SCRIPT, "bench", self.notebook_path())
+        command.arg("--replicas", 1, self.replica_count_input.value())
+        command.option("--sessions", self.bench_sessions_input.value())
+        command.option("--concurrency", self.bench_concurrency_input.value())
         self.run_command(command)
 
+    def refresh_replicas(self):
+        if self.replicas.process is None:
+            return
+        if not self.replicas.running:
+            self.output_text.append(f"均衡器已退出，返回码 {self.replicas.returncode}")
+            self.output_text.append(self.replicas.log())
+            self.stop_replicas()
+            return
+        stats = fetch_proxy_stats(self.balancer_url())
+        if stats is None:
+            return
+
+        route_name, route = next(iter(stats["routes"].items()))
+        self.replicas_label.setText(
+            f"{self.balancer_url()}/apps/{route_name}/  {len(route['replicas'])} 个副本, "
+            f"{route['sessions']} 个会话, p95 {route['p95_ms'] or 0:.1f} ms"
+        )
+        self.replicas_table.setRowCount(len(route["replicas"]))
+        for row, replica in enumerate(route["replicas"]):
+            if replica["draining"]:
+                state = "排空中"
+            else:
+                state = "运行中" if replica["running"] else "已退出"
+            ms = lambda value: round(value, 1) if value is not None else "-"
+            values = [replica["id"], replica["port"], replica["active"], replica["requests"],
+                      ms(replica["p50_ms"]), ms(replica["p95_ms"]), state]
+            for column, value in enumerate(values):
+                item = numeric_item(value) if isinstance(value, (int, float)) else QTableWidgetItem(str(value))
+                self.replicas_table.setItem(row, column, item)
+
+    def profile_store(self):
+        return ProfileStore(Path(self.working_dir) / ".marimo_ui" / "profiles")
+
+    def notebook_path(self):
+        path = Path(self.file_input.text().strip())
+        if not path.is_absolute():
+            path = Path(self.working_dir) / path
+        return path
+
+    def profile_app(self):
+        """以脚本方式无头运行笔记本，逐单元格记录耗时与内存"""
+        if not self.file_input.text().strip():
+            QMessageBox.warning(self, "警告", "请选择要分析的笔记本文件")
+            return
+
+        command = script_command(RUNNER_SCRIPT, "profile", self.notebook_path())
+        command.option("--store", self.profile_store().root)
+        command.flag("--no-memory", not self.profile_memory_check.isChecked())
+
+        self.run_command(command, on_finished=self.show_profile)
+
+    def show_profile(self, _output):
+        """显示最近一次分析结果，并与上一次对比"""
+        runs = self.profile_store().latest(self.notebook_path(), count=2)
+        if not runs:
+            self.profile_summary_label.setText("未找到分析结果")
+            return
+
+        current = runs[0]
+        previous_times = {}
+        if len(runs) > 1:
+            previous_times = {cell["index"]: cell["wall_time"] for cell in runs[1]["cells"]}
+
+        summary = f"{current['timestamp']} 总耗时 {current['total_time'] * 1000:.1f} ms"
+        if len(runs) > 1:
+            delta = (current["total_time"] - runs[1]["total_time"]) * 1000
+            summary += f" (较上次 {delta:+.1f} ms"
+            if runs[1]["digest"] != current["digest"]:
+                summary += "，代码已修改"
+            summary += ")"
+        self.profile_summary_label.setText(summary)
+
+        self.profile_table.setSortingEnabled(False)
+        self.profile_table.setRowCount(len(current["cells"]))
+        for row, cell in enumerate(current["cells"]):
+            self.profile_table.setItem(row, 0, QTableWidgetItem(cell["label"]))
+            self.profile_table.setItem(row, 1, numeric_item(cell["lineno"]))
+            self.profile_table.setItem(row, 2, numeric_item(round(cell["wall_time"] * 1000, 2)))
+            self.profile_table.setItem(row, 3, numeric_item(round(cell["cpu_time"] * 1000, 2)))
+            self.profile_table.setItem(row, 4, numeric_item(round(cell["peak_memory"] / 1024, 1)))
+            if cell["index"] in previous_times:
+                delta = (cell["wall_time"] - previous_times[cell["index"]]) * 1000
+                self.profile_table.setItem(row, 5, numeric_item(round(delta, 2)))
+            else:
+                self.profile_table.setItem(row, 5, QTableWidgetItem(""))
+            status_item = QTableWidgetItem(cell["status"])
+            if cell["error"] or cell.get("output"):
+                # 被 mo.stop() 停止的单元格显示其输出
+                status_item.setToolTip(cell["error"] or cell["output"])
+            self.profile_table.setItem(row, 6, status_item)
+        self.profile_table.setSortingEnabled(True)
+        self.profile_table.sortItems(2, Qt.DescendingOrder)
+        self.profile_table.resizeColumnsToContents()
+
+
+    def leaks_report_path(self):
+        return Path(self.working_dir) / ".marimo_ui" / "figure_leaks.json"
+
+    def detect_leaks(self):
+        """无头运行笔记本，用合成值重放界面元素的变化，统计仍打开的图形和 RSS 增长"""
+        if not self.file_input.text().strip():
+            QMessageBox.warning(self, "警告", "请选择要检测的笔记本文件")
+            return
+
+        report_path = self.leaks_report_path()
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        command = script_command(LEAKS_SCRIPT, self.notebook_path())
+        command.option("--runs", self.leak_runs_input.value()).option("--output", report_path)
+        command.flag("--no-render", not self.leak_render_check.isChecked())
+        self.leaks_summary_label.setText("正在重放...")
+        self.run_command(command, on_finished=self.show_leaks)
+
+    def show_leaks(self, _output):
+        report = json.loads(self.leaks_report_path().read_text(encoding="utf-8"))
+        leaking = [cell for cell in report["cells"] if cell["leaks_figures"] or cell["leaks_memory"]]
+        self.leaks_summary_label.setText(
+            f"{len(report['elements'])} 个界面元素各重放 {report['runs_per_element']} 次；"
+            f"结束时仍打开 {report['open_figures']} 个图形，RSS 增长 {report['rss_growth_kb'] / 1024:.1f} MB；"
+            f"{len(leaking)} 个单元格泄漏"
+        )
+        self.leaks_table.setSortingEnabled(False)
+        self.leaks_table.setRowCount(len(report["cells"]))
+        for row, cell in enumerate(report["cells"]):
+            verdicts = []
+            if cell["leaks_figures"]:
+                verdicts.append("图形未关闭")
+            if cell["leaks_memory"]:
+                verdicts.append("内存持续增长")
+            if cell.get("indirect"):
+                verdicts.append("增长由其他单元格的图形引起")
+            verdict_item = QTableWidgetItem("，".join(verdicts) or "-")
+            if cell["error"]:
+                verdict_item.setToolTip(cell["error"])
+            self.leaks_table.setItem(row, 0, QTableWidgetItem(cell["label"]))
+            self.leaks_table.setItem(row, 1, numeric_item(cell["lineno"]))
+            self.leaks_table.setItem(row, 2, numeric_item(cell["runs"]))
+            self.leaks_table.setItem(row, 3, numeric_item(cell["figures_created"]))
+            self.leaks_table.setItem(row, 4, numeric_item(cell["figures_open"]))
+            self.leaks_table.setItem(row, 5, numeric_item(round(cell["rss_per_run_kb"], 1)))
+            self.leaks_table.setItem(row, 6, verdict_item)
+        self.leaks_table.setSortingEnabled(True)
+        self.leaks_table.sortItems(5, Qt.DescendingOrder)
+        self.leaks_table.resizeColumnsToContents()
+
 
 class ConvertTab(BaseTab):
     """转换标签页"""
@@ -400,6 +1087,7 @@ class ConvertTab(BaseTab):
         scroll.setWidgetResizable(True)
 
         self.layout.addWidget(scroll)
+        self.add_command_preview()
         self.add_output_section()
 
     def browse_input_file(self):
@@ -417,17 +1105,15 @@ class ConvertTab(BaseTab):
         if file_path:
             self.output_file.setText(file_path)
 
+    def build_command(self):
+        command = marimo_command("convert").arg(self.input_file.text().strip())
+        return command.option("-o", self.output_file.text().strip())
+
     def convert_file(self):
         if not self.input_file.text().strip():
             QMessageBox.warning(self, "警告", "请选择要转换的输入文件")
             return
-
-        command = f'uv run marimo convert "{self.input_file.text().strip()}"'
-
-        if self.output_file.text().strip():
-            command += f' -o "{self.output_file.text().strip()}"'
-
-        self.run_command(command)
+        self.run_command(self.build_command())
 
 
 class NewTab(BaseTab):
@@ -492,32 +1178,36 @@ class NewTab(BaseTab):
         scroll.setWidgetResizable(True)
 
         self.layout.addWidget(scroll)
+        self.add_command_preview()
         self.add_output_section()
 
-    def create_new(self):
-        command = "uv run marimo new"
-
-        prompt_text = self.prompt_input.toPlainText().strip()
-        if prompt_text:
-            command += f' "{prompt_text}"'
+    def build_command(self):
+        # 提示词作为单个参数传递，其中的引号和换行无需转义
+        command = marimo_command("new").arg(self.prompt_input.toPlainText().strip())
+        command.option("--port", self.port_input.value())
+        command.option("--host", self.host_input.text().strip())
+        command.flag("--headless", self.headless_check.isChecked())
+        command.flag("--sandbox", self.sandbox_check.isChecked())
+        return command
 
-        command += f" --port {self.port_input.value()}"
-        command += f" --host {self.host_input.text()}"
-
-        if self.headless_check.isChecked():
-            command += " --headless"
+    def create_new(self):
+        self.run_command(self.build_command())
 
-        if self.sandbox_check.isChecked():
-            command += " --sandbox"
 
-        self.run_command(command)
+class ExportWatchSignals(QObject):
+    """监视线程通过此对象把导出状态送回界面线程"""
+    status = Signal(str, str, str)
 
 
 class ExportTab(BaseTab):
     """导出标签页"""
     def __init__(self, working_dir=None):
         super().__init__(working_dir)
+        self.watcher = None
+        self.watch_signals = ExportWatchSignals()
+        self.watch_signals.status.connect(self.on_watch_status)
         self.init_ui()
+        QApplication.instance().aboutToQuit.connect(self.stop_watch)
 
     def init_ui(self):
         # 文件选择
@@ -561,6 +1251,107 @@ class ExportTab(BaseTab):
         format_layout.addWidget(self.format_combo)
         format_group.setLayout(format_layout)
 
+        # 多格式导出：一个进程中只加载和执行一次笔记本
+        multi_group = QGroupBox("多格式导出 (一次执行)")
+        multi_layout = QFormLayout()
+
+        self.multi_check = QCheckBox("一次导出所有选中的格式 (忽略上面的输出文件和格式)")
+        self.multi_check.toggled.connect(lambda checked: format_group.setEnabled(not checked))
+        multi_layout.addRow(self.multi_check)
+
+        formats_row = QHBoxLayout()
+        self.multi_format_checks = {}
+        for export_format in ("html", "html-wasm", "ipynb", "md", "script"):
+            check = QCheckBox(export_format)
+            check.setChecked(export_format in ("html", "ipynb", "md"))
+            self.multi_format_checks[export_format] = check
+            formats_row.addWidget(check)
+        multi_layout.addRow("格式:", formats_row)
+
+        self.extra_inputs = QLineEdit()
+        self.extra_inputs.setPlaceholderText(f"可选，多个路径用 {os.pathsep} 分隔，在同一进程中依次导出")
+        extra_inputs_btn = QPushButton("添加...")
+        extra_inputs_btn.clicked.connect(self.browse_extra_inputs)
+        extra_inputs_row = QHBoxLayout()
+        extra_inputs_row.addWidget(self.extra_inputs)
+        extra_inputs_row.addWidget(extra_inputs_btn)
+        multi_layout.addRow("更多笔记本:", extra_inputs_row)
+
+        self.output_dir_input = QLineEdit()
+        self.output_dir_input.setPlaceholderText("默认与笔记本相同的目录")
+        output_dir_btn = QPushButton("浏览...")
+        output_dir_btn.clicked.connect(self.browse_output_dir)
+        output_dir_row = QHBoxLayout()
+        output_dir_row.addWidget(self.output_dir_input)
+        output_dir_row.addWidget(output_dir_btn)
+        multi_layout.addRow("输出目录:", output_dir_row)
+
+        self.ipynb_outputs_check = QCheckBox("ipynb 包含单元格输出 (与 HTML 共用同一次执行)")
+        multi_layout.addRow(self.ipynb_outputs_check)
+
+        # html-wasm 静态资源约 24 MB，批量导出时从 .marimo_ui/assets 硬链接或共用一份
+        self.wasm_assets_combo = QComboBox()
+        self.wasm_assets_combo.addItems([
+            "copy - 每个导出复制一份 (与 marimo export 相同)",
+            "link - 从共享存储硬链接 (导出目录可单独发布)",
+            "shared - 输出目录下共用一份 (导出引用 _marimo_assets)",
+        ])
+        multi_layout.addRow("WASM 资源:", self.wasm_assets_combo)
+
+        self.postprocess_check = QCheckBox("导出后压缩 HTML 并生成 .gz/.br 预压缩文件 (重复图片提取到 _blobs)")
+        multi_layout.addRow(self.postprocess_check)
+
+        bench_btn = QPushButton("与逐格式导出对比耗时")
+        bench_btn.clicked.connect(self.bench_multi_export)
+        multi_layout.addRow(bench_btn)
+        multi_group.setLayout(multi_layout)
+
+        # 监视模式：保存后只重新导出变化的笔记本
+        watch_group = QGroupBox("监视模式 (保存后自动导出)")
+        watch_layout = QFormLayout()
+        watch_layout.addRow(QLabel("监视输入文件和“更多笔记本”，按上面多格式导出的格式和输出目录导出"))
+        self.watch_debounce_input = QSpinBox()
+        self.watch_debounce_input.setRange(100, 30000)
+        self.watch_debounce_input.setSingleStep(100)
+        self.watch_debounce_input.setValue(1000)
+        self.watch_debounce_input.setSuffix(" ms")
+        watch_layout.addRow("防抖:", self.watch_debounce_input)
+        self.watch_btn = QPushButton("开始监视")
+        self.watch_btn.clicked.connect(self.toggle_watch)
+        watch_layout.addRow(self.watch_btn)
+        self.watch_status = QLabel("未监视")
+        self.watch_status.setWordWrap(True)
+        watch_layout.addRow("状态:", self.watch_status)
+        watch_group.setLayout(watch_layout)
+
+        # 静态站点：导出工作目录中的全部笔记本并生成索引页，只重新导出变化的笔记本
+        site_group = QGroupBox("构建站点 (工作目录中的全部笔记本)")
+        site_layout = QFormLayout()
+        self.site_output_input = QLineEdit()
+        self.site_output_input.setPlaceholderText("默认是工作目录下的 site")
+        site_output_btn = QPushButton("浏览...")
+        site_output_btn.clicked.connect(self.browse_site_output)
+        site_output_row = QHBoxLayout()
+        site_output_row.addWidget(self.site_output_input)
+        site_output_row.addWidget(site_output_btn)
+        site_layout.addRow("站点目录:", site_output_row)
+        self.site_format_combo = QComboBox()
+        self.site_format_combo.addItems([
+            "html - 执行笔记本，导出静态结果",
+            "html-wasm - 浏览器中运行 (静态资源共用一份)",
+        ])
+        site_layout.addRow("页面格式:", self.site_format_combo)
+        self.site_workers_input = QSpinBox()
+        self.site_workers_input.setRange(0, 64)
+        self.site_workers_input.setSpecialValueText("CPU核心数")
+        site_layout.addRow("并行进程:", self.site_workers_input)
+        self.site_force_check = QCheckBox("全部重新导出 (忽略构建清单)")
+        site_layout.addRow(self.site_force_check)
+        site_btn = QPushButton("构建站点")
+        site_btn.clicked.connect(lambda: self.run_command(self.build_site_command()))
+        site_layout.addRow(site_btn)
+        site_group.setLayout(site_layout)
+
         # 运行按钮
         run_btn = QPushButton("导出文件")
         run_btn.clicked.connect(self.export_file)
@@ -571,6 +1362,9 @@ class ExportTab(BaseTab):
         scroll_layout = QVBoxLayout(scroll_widget)
         scroll_layout.addWidget(file_group)
         scroll_layout.addWidget(format_group)
+        scroll_layout.addWidget(multi_group)
+        scroll_layout.addWidget(watch_group)
+        scroll_layout.addWidget(site_group)
         scroll_layout.addWidget(run_btn)
         scroll_layout.addStretch()
 
@@ -578,6 +1372,7 @@ class ExportTab(BaseTab):
         scroll.setWidgetResizable(True)
 
         self.layout.addWidget(scroll)
+        self.add_command_preview()
         self.add_output_section()
 
     def browse_input_file(self):
@@ -604,21 +1399,115 @@ class ExportTab(BaseTab):
         if file_path:
             self.output_file.setText(file_path)
 
+    def browse_output_dir(self):
+        directory = QFileDialog.getExistingDirectory(self, "选择输出目录", str(self.working_dir))
+        if directory:
+            self.output_dir_input.setText(directory)
+
+    def browse_extra_inputs(self):
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, "选择更多marimo笔记本文件", str(self.working_dir), "Python Files (*.py);;All Files (*)"
+        )
+        if file_paths:
+            existing = [path for path in self.extra_inputs.text().split(os.pathsep) if path.strip()]
+            self.extra_inputs.setText(os.pathsep.join(existing + file_paths))
+
+    def multi_formats(self):
+        return [name for name, check in self.multi_format_checks.items() if check.isChecked()]
+
     def export_file(self):
         if not self.input_file.text().strip():
             QMessageBox.warning(self, "警告", "请选择要导出的输入文件")
             return
 
-        if not self.output_file.text().strip():
+        if self.multi_check.isChecked():
+            if not self.multi_formats():
+                QMessageBox.warning(self, "警告", "请至少选择一种导出格式")
+                return
+        elif not self.output_file.text().strip():
             QMessageBox.warning(self, "警告", "请指定输出文件路径")
             return
 
-        format_text = self.format_combo.currentText()
-        export_format = format_text.split(" - ")[0]
+        self.run_command(self.build_command())
+
+    def notebooks(self):
+        paths = [self.input_file.text().strip()]
+        paths.extend(path.strip() for path in self.extra_inputs.text().split(os.pathsep))
+        return [path for path in paths if path]
+
+    def build_multi_command(self, notebooks=None):
+        command = script_command(MULTI_EXPORT_SCRIPT, *(notebooks or self.notebooks()))
+        command.arg("--formats", *self.multi_formats())
+        command.option("--output-dir", self.output_dir_input.text().strip())
+        command.flag("--ipynb-outputs", self.ipynb_outputs_check.isChecked())
+        wasm_assets = self.wasm_assets_combo.currentText().split(" - ")[0]
+        if "html-wasm" in self.multi_formats() and wasm_assets != "copy":
+            command.option("--wasm-assets", wasm_assets).option("--asset-store", asset_store_dir(self.working_dir))
+        return command.flag("--postprocess", self.postprocess_check.isChecked())
+
+    def browse_site_output(self):
+        directory = QFileDialog.getExistingDirectory(self, "选择站点目录", str(self.working_dir))
+        if directory:
+            self.site_output_input.setText(directory)
+
+    def build_site_command(self):
+        command = script_command(SITE_BUILDER_SCRIPT, self.working_dir)
+        command.option("--output-dir", self.site_output_input.text().strip())
+        command.option("--format", self.site_format_combo.currentText().split(" - ")[0])
+        command.option("--workers", self.site_workers_input.value() or None)
+        command.option("--asset-store", asset_store_dir(self.working_dir))
+        return command.flag("--force", self.site_force_check.isChecked())
+
+    def toggle_watch(self):
+        if self.watcher is not None:
+            self.stop_watch()
+            self.watch_status.setText("未监视")
+            return
+        notebooks = [str((Path(self.working_dir) / path).resolve()) for path in self.notebooks()]
+        if not notebooks or not self.multi_formats():
+            QMessageBox.warning(self, "警告", "请选择要监视的笔记本和至少一种导出格式")
+            return
+        # 在界面线程中生成每个笔记本的命令，监视线程不读取控件
+        commands = {notebook: list(self.build_multi_command([notebook])) for notebook in notebooks}
+        self.watcher = ExportWatcher(
+            notebooks,
+            build_command=commands.__getitem__,
+            debounce=self.watch_debounce_input.value() / 1000,
+            on_status=self.watch_signals.status.emit,
+            cwd=self.working_dir,
+        ).start()
+        self.watch_btn.setText("停止监视")
+        self.watch_status.setText(self.watcher.status_line())
+        self.output_text.append(f"开始监视 {len(notebooks)} 个笔记本")
+
+    def stop_watch(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.watch_btn.setText("开始监视")
+
+    def on_watch_status(self, notebook, state, message):
+        if self.watcher is None:
+            return
+        self.watch_status.setText(self.watcher.status_line())
+        self.output_text.append(f"[{datetime.now():%H:%M:%S}] {Path(notebook).name}: {STATE_LABELS[state]} {message}")
 
-        command = f'uv run marimo export {export_format} "{self.input_file.text().strip()}" -o "{self.output_file.text().strip()}"'
+    def bench_multi_export(self):
+        """分别用逐格式的 marimo export 和一次多格式导出写出相同文件，比较耗时"""
+        if not self.input_file.text().strip() or not self.multi_formats():
+            QMessageBox.warning(self, "警告", "请选择输入文件和至少一种导出格式")
+            return
+        command = script_command(MULTI_EXPORT_SCRIPT, self.input_file.text().strip())
+        command.arg("--formats", *self.multi_formats())
+        command.flag("--ipynb-outputs", self.ipynb_outputs_check.isChecked())
+        self.run_command(command.flag("--bench"))
 
-        self.run_command(command)
+    def build_command(self):
+        if self.multi_check.isChecked():
+            return self.build_multi_command()
+        export_format = self.format_combo.currentText().split(" - ")[0]
+        command = marimo_command("export", export_format).arg(self.input_file.text().strip())
+        return command.option("-o", self.output_file.text().strip())
 
 
 class TutorialTab(BaseTab):
@@ -689,20 +1578,18 @@ class TutorialTab(BaseTab):
         scroll.setWidgetResizable(True)
 
         self.layout.addWidget(scroll)
+        self.add_command_preview()
         self.add_output_section()
 
-    def open_tutorial(self):
-        tutorial_text = self.tutorial_combo.currentText()
-        tutorial_name = tutorial_text.split(" - ")[0]
-
-        command = f"uv run marimo tutorial {tutorial_name}"
-        command += f" --port {self.port_input.value()}"
-        command += f" --host {self.host_input.text()}"
+    def build_command(self):
+        tutorial_name = self.tutorial_combo.currentText().split(" - ")[0]
+        command = marimo_command("tutorial", tutorial_name)
+        command.option("--port", self.port_input.value())
+        command.option("--host", self.host_input.text().strip())
+        return command.flag("--headless", self.headless_check.isChecked())
 
-        if self.headless_check.isChecked():
-            command += " --headless"
-
-        self.run_command(command)
+    def open_tutorial(self):
+        self.run_command(self.build_command())
 
 
 class ConfigTab(BaseTab):
@@ -763,7 +1650,7 @@ class ConfigTab(BaseTab):
         runtime_layout.addRow("响应式测试:", self.config_widgets['reactive_tests'])
 
         self.config_widgets['auto_reload'] = QComboBox()
-        self.config_widgets['auto_reload'].addItems(["off", "lazy", "eager"])
+        self.config_widgets['auto_reload'].addItems(["off", "lazy", "autorun"])
         runtime_layout.addRow("自动重载:", self.config_widgets['auto_reload'])
 
         self.config_widgets['output_max_bytes'] = QSpinBox()
@@ -789,6 +1676,57 @@ class ConfigTab(BaseTab):
 
         runtime_group.setLayout(runtime_layout)
 
+        # 性能预设：运行时设置的命名组合，写入项目 pyproject.toml，并在笔记本上比较效果
+        presets_group = QGroupBox("性能预设")
+        presets_layout = QFormLayout()
+
+        self.preset_combo = QComboBox()
+        self.preset_combo.currentIndexChanged.connect(self.show_preset_description)
+        presets_layout.addRow("预设:", self.preset_combo)
+
+        self.preset_description = QLabel()
+        self.preset_description.setWordWrap(True)
+        presets_layout.addRow("", self.preset_description)
+
+        preset_buttons = QHBoxLayout()
+        apply_preset_btn = QPushButton("应用到表单")
+        apply_preset_btn.clicked.connect(self.apply_preset_to_form)
+        write_preset_btn = QPushButton("写入项目 pyproject.toml")
+        write_preset_btn.clicked.connect(self.write_preset_to_project)
+        preset_buttons.addWidget(apply_preset_btn)
+        preset_buttons.addWidget(write_preset_btn)
+        presets_layout.addRow("", preset_buttons)
+
+        save_preset_layout = QHBoxLayout()
+        self.preset_name_input = QLineEdit()
+        self.preset_name_input.setPlaceholderText("新预设名称")
+        save_preset_btn = QPushButton("保存表单为预设")
+        save_preset_btn.clicked.connect(self.save_form_as_preset)
+        save_preset_layout.addWidget(self.preset_name_input)
+        save_preset_layout.addWidget(save_preset_btn)
+        presets_layout.addRow("保存:", save_preset_layout)
+
+        bench_notebook_layout = QHBoxLayout()
+        self.preset_notebook_input = QLineEdit()
+        self.preset_notebook_input.setPlaceholderText("用于基准测试的笔记本")
+        browse_preset_notebook = QPushButton("浏览...")
+        browse_preset_notebook.clicked.connect(self.browse_preset_notebook)
+        bench_notebook_layout.addWidget(self.preset_notebook_input)
+        bench_notebook_layout.addWidget(browse_preset_notebook)
+        presets_layout.addRow("笔记本:", bench_notebook_layout)
+
+        self.preset_reruns_input = QSpinBox()
+        self.preset_reruns_input.setRange(1, 100)
+        self.preset_reruns_input.setValue(5)
+        presets_layout.addRow("重新运行次数:", self.preset_reruns_input)
+
+        bench_preset_btn = QPushButton("比较所有预设")
+        bench_preset_btn.clicked.connect(self.bench_presets)
+        presets_layout.addRow("", bench_preset_btn)
+
+        presets_group.setLayout(presets_layout)
+        self.reload_presets()
+
         # 格式化配置
         formatting_group = QGroupBox("格式化设置")
         formatting_layout = QFormLayout()
@@ -936,6 +1874,7 @@ class ConfigTab(BaseTab):
         scroll_layout.addWidget(actions_group)
         scroll_layout.addWidget(save_group)
         scroll_layout.addWidget(runtime_group)
+        scroll_layout.addWidget(presets_group)
         scroll_layout.addWidget(formatting_group)
         scroll_layout.addWidget(completion_group)
         scroll_layout.addWidget(keymap_group)
@@ -952,13 +1891,87 @@ class ConfigTab(BaseTab):
         self.layout.addWidget(scroll)
         self.add_output_section()
 
+    def reload_presets(self, selected=None):
+        self.presets = load_presets(presets_path(self.working_dir))
+        self.preset_combo.clear()
+        self.preset_combo.addItems(list(self.presets))
+        if selected is not None:
+            self.preset_combo.setCurrentText(selected)
+
+    def selected_preset(self):
+        return self.presets.get(self.preset_combo.currentText())
+
+    def show_preset_description(self, *_args):
+        preset = self.selected_preset()
+        if preset is None:
+            self.preset_description.clear()
+            return
+        settings = ", ".join(f"{key}={value}" for key, value in preset["runtime"].items())
+        self.preset_description.setText(f"{preset.get('description', '')}\n{settings}")
+
+    def apply_preset_to_form(self):
+        preset = self.selected_preset()
+        if preset is None:
+            return
+        for key, value in preset["runtime"].items():
+            widget = self.config_widgets.get(key)
+            if isinstance(widget, QCheckBox):
+                widget.setChecked(bool(value))
+            elif isinstance(widget, QSpinBox):
+                widget.setValue(int(value))
+            elif isinstance(widget, QComboBox):
+                widget.setCurrentText(str(value))
+
+    def form_runtime(self):
+        """表单中与预设相关的运行时设置"""
+        runtime = {}
+        for key in PRESET_KEYS:
+            widget = self.config_widgets[key]
+            if isinstance(widget, QCheckBox):
+                runtime[key] = widget.isChecked()
+            elif isinstance(widget, QSpinBox):
+                runtime[key] = widget.value()
+            else:
+                runtime[key] = widget.currentText()
+        return runtime
+
+    def save_form_as_preset(self):
+        name = self.preset_name_input.text().strip()
+        if not name:
+            QMessageBox.warning(self, "警告", "请输入预设名称")
+            return
+        save_preset(presets_path(self.working_dir), name, self.form_runtime(), "从配置表单保存")
+        self.preset_name_input.clear()
+        self.reload_presets(selected=name)
+
+    def write_preset_to_project(self):
+        """通过项目环境中的脚本写入 [tool.marimo.runtime]，保留 pyproject.toml 的其他内容"""
+        name = self.preset_combo.currentText()
+        command = script_command(CONFIG_PRESETS_SCRIPT).option("--presets-file", presets_path(self.working_dir))
+        self.run_command(command.arg("apply", name).option("--project", self.working_dir))
+
+    def browse_preset_notebook(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择笔记本", str(self.working_dir), "Python Files (*.py);;All Files (*)"
+        )
+        if file_path:
+            self.preset_notebook_input.setText(file_path)
+
+    def bench_presets(self):
+        notebook = self.preset_notebook_input.text().strip()
+        if not notebook:
+            QMessageBox.warning(self, "警告", "请选择用于基准测试的笔记本")
+            return
+        command = script_command(CONFIG_PRESETS_SCRIPT).option("--presets-file", presets_path(self.working_dir))
+        self.run_command(command.arg("bench", notebook).option("--reruns", self.preset_reruns_input.value()))
+
     def load_current_config(self):
         """加载当前marimo配置"""
         self.output_text.clear()
         self.output_text.append("正在加载当前配置...")
 
         self.thread = QThread()
-        self.runner = CommandRunner("uv run marimo config show")
+        self.runner = CommandRunner(marimo_command("config", "show"))
         self.runner.moveToThread(self.thread)
 
         self.thread.started.connect(self.runner.run)
@@ -1109,6 +2122,1093 @@ class ConfigTab(BaseTab):
         self.output_text.append("配置已重置为默认值")
 
 
+def numeric_item(value):
+    """创建按数值排序的表格项"""
+    item = QTableWidgetItem()
+    item.setData(Qt.DisplayRole, value)
+    return item
+
+
+class GraphTab(BaseTab):
+    """依赖图分析标签页"""
+    def __init__(self, working_dir=None):
+        super().__init__(working_dir)
+        self.init_ui()
+
+    def init_ui(self):
+        # 文件选择
+        file_group = QGroupBox("文件设置")
+        file_layout = QFormLayout()
+
+        self.file_input = QLineEdit()
+        self.file_input.setPlaceholderText("选择要分析的marimo笔记本文件")
+        file_browse_btn = QPushButton("浏览...")
+        file_browse_btn.clicked.connect(self.browse_file)
+
+        file_row = QHBoxLayout()
+        file_row.addWidget(self.file_input)
+        file_row.addWidget(file_browse_btn)
+        file_layout.addRow("笔记本文件:", file_row)
+        file_group.setLayout(file_layout)
+
+        # 分析按钮
+        analyze_btn = QPushButton("分析依赖图")
+        analyze_btn.clicked.connect(self.analyze)
+
+        # 分析摘要
+        summary_group = QGroupBox("图摘要")
+        summary_layout = QFormLayout()
+        self.cells_label = QLabel("-")
+        self.edges_label = QLabel("-")
+        self.depth_label = QLabel("-")
+        self.fan_out_label = QLabel("-")
+        self.critical_path_label = QLabel("-")
+        self.critical_path_label.setWordWrap(True)
+        summary_layout.addRow("单元格数:", self.cells_label)
+        summary_layout.addRow("依赖边数:", self.edges_label)
+        summary_layout.addRow("最大深度:", self.depth_label)
+        summary_layout.addRow("最大扇出:", self.fan_out_label)
+        summary_layout.addRow("关键路径:", self.critical_path_label)
+        summary_group.setLayout(summary_layout)
+
+        # 单元格表格
+        self.cell_table = QTableWidget(0, 8)
+        self.cell_table.setHorizontalHeaderLabels(
+            ["单元格", "行号", "引用", "定义", "上游", "扇出", "深度", "关键路径"]
+        )
+        self.cell_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.cell_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.cell_table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.cell_table.horizontalHeader().setStretchLastSection(True)
+        self.cell_table.setSortingEnabled(True)
+
+        self.layout.addWidget(file_group)
+        self.layout.addWidget(analyze_btn)
+        self.layout.addWidget(summary_group)
+        self.layout.addWidget(self.cell_table, 1)
+        self.add_output_section()
+
+    def browse_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择笔记本文件", str(self.working_dir), "Python Files (*.py);;All Files (*)"
+        )
+        if file_path:
+            self.file_input.setText(file_path)
+
+    def analyze(self):
+        if not self.file_input.text().strip():
+            QMessageBox.warning(self, "警告", "请选择要分析的笔记本文件")
+            return
+
+        path = Path(self.file_input.text().strip())
+        if not path.is_absolute():
+            path = Path(self.working_dir) / path
+
+        self.output_text.clear()
+        try:
+            graph = analyze_notebook(path)
+        except (OSError, SyntaxError) as e:
+            self.output_text.append("分析失败:")
+            self.output_text.append(str(e))
+            return
+
+        if not graph.cells:
+            self.output_text.append("未找到marimo单元格（@app.cell）")
+
+        critical = graph.critical_path()
+        critical_set = set(critical)
+
+        self.cells_label.setText(str(len(graph.cells)))
+        self.edges_label.setText(str(graph.edge_count()))
+        self.depth_label.setText(str(max(graph.depth, default=0)))
+        if graph.cells:
+            widest = max(graph.cells, key=lambda cell: graph.fan_out(cell.index))
+            self.fan_out_label.setText(f"{graph.fan_out(widest.index)} ({widest.label})")
+        else:
+            self.fan_out_label.setText("0")
+        self.critical_path_label.setText(" → ".join(graph.cells[i].label for i in critical) or "-")
+
+        self.cell_table.setSortingEnabled(False)
+        self.cell_table.setRowCount(len(graph.cells))
+        for row, cell in enumerate(graph.cells):
+            upstream = ", ".join(graph.cells[i].label for i in sorted(graph.parents[cell.index]))
+            self.cell_table.setItem(row, 0, QTableWidgetItem(cell.label))
+            self.cell_table.setItem(row, 1, numeric_item(cell.lineno))
+            self.cell_table.setItem(row, 2, QTableWidgetItem(", ".join(cell.refs)))
+            self.cell_table.setItem(row, 3, QTableWidgetItem(", ".join(cell.defs)))
+            self.cell_table.setItem(row, 4, QTableWidgetItem(upstream))
+            self.cell_table.setItem(row, 5, numeric_item(graph.fan_out(cell.index)))
+            self.cell_table.setItem(row, 6, numeric_item(graph.depth[cell.index]))
+            self.cell_table.setItem(row, 7, QTableWidgetItem("✓" if cell.index in critical_set else ""))
+        self.cell_table.setSortingEnabled(True)
+        self.cell_table.resizeColumnsToContents()
+
+        self.output_text.append(f"文件: {graph.path}")
+        self.output_text.append(f"内容哈希: {graph.digest[:12]}")
+        for name, indexes in graph.conflicts.items():
+            labels = ", ".join(graph.cells[i].label for i in indexes)
+            self.output_text.append(f"警告: 变量 {name} 被多个单元格定义: {labels}")
+        if graph.cyclic:
+            labels = ", ".join(graph.cells[i].label for i in graph.cyclic)
+            self.output_text.append(f"警告: 存在循环依赖: {labels}")
+
+
+class AdvisorSignals(QObject):
+    """后台分析线程通过此对象把结果送回界面线程"""
+    finished = Signal(object, object, int, float)
+    failed = Signal(str)
+
+
+class AdvisorTab(BaseTab):
+    """性能建议标签页：静态检查笔记本或整个项目中的慢写法，逐单元格给出替代写法"""
+
+    def __init__(self, working_dir=None):
+        super().__init__(working_dir)
+        self.signals = AdvisorSignals()
+        self.signals.finished.connect(self.show_results)
+        self.signals.failed.connect(self.show_error)
+        self.init_ui()
+
+    def init_ui(self):
+        file_group = QGroupBox("检查范围")
+        file_layout = QFormLayout()
+
+        self.file_input = QLineEdit()
+        self.file_input.setPlaceholderText("选择要检查的marimo笔记本文件")
+        file_browse_btn = QPushButton("浏览...")
+        file_browse_btn.clicked.connect(self.browse_file)
+        file_row = QHBoxLayout()
+        file_row.addWidget(self.file_input)
+        file_row.addWidget(file_browse_btn)
+        file_layout.addRow("笔记本文件:", file_row)
+
+        self.workers_input = QSpinBox()
+        self.workers_input.setRange(1, 256)
+        self.workers_input.setValue(os.cpu_count() or 1)
+        file_layout.addRow("并行进程数:", self.workers_input)
+
+        self.use_cache_check = QCheckBox("跳过内容未变化的文件（按内容哈希缓存）")
+        self.use_cache_check.setChecked(True)
+        file_layout.addRow("缓存:", self.use_cache_check)
+        file_group.setLayout(file_layout)
+
+        buttons_row = QHBoxLayout()
+        self.notebook_btn = QPushButton("检查笔记本")
+        self.notebook_btn.clicked.connect(self.analyze_notebook)
+        self.project_btn = QPushButton("检查整个项目")
+        self.project_btn.clicked.connect(lambda: self.analyze([str(self.working_dir)]))
+        buttons_row.addWidget(self.notebook_btn)
+        buttons_row.addWidget(self.project_btn)
+        buttons_row.addStretch()
+
+        self.summary_label = QLabel("-")
+
+        self.findings_table = QTableWidget(0, 6)
+        self.findings_table.setHorizontalHeaderLabels(["笔记本", "行号", "单元格", "位置", "问题", "建议"])
+        self.findings_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.findings_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.findings_table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.findings_table.horizontalHeader().setStretchLastSection(True)
+        self.findings_table.setSortingEnabled(True)
+
+        self.layout.addWidget(file_group)
+        self.layout.addLayout(buttons_row)
+        self.layout.addWidget(self.summary_label)
+        self.layout.addWidget(self.findings_table, 1)
+        self.add_output_section()
+
+    def browse_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择笔记本文件", str(self.working_dir), "Python Files (*.py);;All Files (*)"
+        )
+        if file_path:
+            self.file_input.setText(file_path)
+
+    def notebook_path(self):
+        path = Path(self.file_input.text().strip())
+        return str(path if path.is_absolute() else Path(self.working_dir) / path)
+
+    def analyze_notebook(self):
+        if not self.file_input.text().strip():
+            QMessageBox.warning(self, "警告", "请选择要检查的笔记本文件")
+            return
+        self.analyze([self.notebook_path()])
+
+    def analyze(self, paths):
+        self.notebook_btn.setEnabled(False)
+        self.project_btn.setEnabled(False)
+        self.summary_label.setText("正在检查...")
+        cache_path = default_cache_path(self.working_dir) if self.use_cache_check.isChecked() else None
+        workers = self.workers_input.value()
+
+        def work():
+            try:
+                started = time.perf_counter()
+                files = collect(paths)
+                # 界面进程有多个线程，进程池不能用 fork；没有 forkserver 的平台（Windows）用 spawn
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                results, errors, hits = advise_many(
+                    files, cache_path, workers, mp_context=multiprocessing.get_context(method)
+                )
+                self.signals.finished.emit(results, errors, hits, time.perf_counter() - started)
+            except Exception as e:
+                self.signals.failed.emit(str(e))
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def show_results(self, results, errors, hits, seconds):
+        self.notebook_btn.setEnabled(True)
+        self.project_btn.setEnabled(True)
+        rows = [(path, finding) for path, findings in results.items() for finding in findings]
+        self.findings_table.setSortingEnabled(False)
+        self.findings_table.setRowCount(len(rows))
+        for row, (path, finding) in enumerate(rows):
+            try:
+                name = str(Path(path).relative_to(self.working_dir))
+            except ValueError:
+                name = path
+            message = QTableWidgetItem(finding["message"])
+            message.setToolTip(RULES[finding["rule"]][0])
+            suggestion = QTableWidgetItem(finding["suggestion"])
+            suggestion.setToolTip(finding["suggestion"])
+            self.findings_table.setItem(row, 0, QTableWidgetItem(name))
+            self.findings_table.setItem(row, 1, numeric_item(finding["line"]))
+            self.findings_table.setItem(row, 2, QTableWidgetItem(finding["cell"]))
+            self.findings_table.setItem(row, 3, QTableWidgetItem(finding["where"]))
+            self.findings_table.setItem(row, 4, message)
+            self.findings_table.setItem(row, 5, suggestion)
+        self.findings_table.setSortingEnabled(True)
+        self.findings_table.resizeColumnsToContents()
+
+        affected = sum(1 for findings in results.values() if findings)
+        self.summary_label.setText(
+            f"检查 {len(results) + len(errors)} 个文件（缓存命中 {hits}），{affected} 个文件共 {len(rows)} 条建议，"
+            f"用时 {seconds:.2f} 秒"
+        )
+        self.output_text.clear()
+        for path, error in errors.items():
+            self.output_text.append(f"{path}: 解析失败 - {error}")
+
+    def show_error(self, message):
+        self.notebook_btn.setEnabled(True)
+        self.project_btn.setEnabled(True)
+        self.summary_label.setText(f"检查失败: {message}")
+
+
+class BatchTab(BaseTab):
+    """批量运行标签页"""
+    def __init__(self, working_dir=None):
+        super().__init__(working_dir)
+        self.init_ui()
+
+    def init_ui(self):
+        # 笔记本列表
+        notebooks_group = QGroupBox("笔记本列表")
+        notebooks_layout = QVBoxLayout()
+
+        self.notebook_list = QListWidget()
+        self.notebook_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        notebooks_layout.addWidget(self.notebook_list)
+
+        buttons_row = QHBoxLayout()
+        add_btn = QPushButton("添加...")
+        add_btn.clicked.connect(self.add_notebooks)
+        remove_btn = QPushButton("移除选中")
+        remove_btn.clicked.connect(self.remove_selected)
+        clear_btn = QPushButton("清空")
+        clear_btn.clicked.connect(self.notebook_list.clear)
+        buttons_row.addWidget(add_btn)
+        buttons_row.addWidget(remove_btn)
+        buttons_row.addWidget(clear_btn)
+        buttons_row.addStretch()
+        notebooks_layout.addLayout(buttons_row)
+        notebooks_group.setLayout(notebooks_layout)
+
+        # 调度设置
+        schedule_group = QGroupBox("并行调度设置")
+        schedule_layout = QFormLayout()
+
+        self.workers_input = QSpinBox()
+        self.workers_input.setRange(1, 256)
+        self.workers_input.setValue(os.cpu_count() or 1)
+        schedule_layout.addRow("工作进程数:", self.workers_input)
+
+        self.min_cost_input = QSpinBox()
+        self.min_cost_input.setRange(0, 60000)
+        self.min_cost_input.setValue(50)
+        self.min_cost_input.setSuffix(" ms")
+        schedule_layout.addRow("提交进程池的最小耗时:", self.min_cost_input)
+
+        schedule_group.setLayout(schedule_layout)
+
+        # 单元格缓存
+        cache_group = QGroupBox("单元格缓存")
+        cache_layout = QFormLayout()
+
+        self.cache_check = QCheckBox("跳过代码和输入都未变化的单元格")
+        self.cache_check.setChecked(True)
+        cache_layout.addRow("启用缓存:", self.cache_check)
+
+        self.cache_size_input = QSpinBox()
+        self.cache_size_input.setRange(64, 1024 * 1024)
+        self.cache_size_input.setValue(2048)
+        self.cache_size_input.setSuffix(" MB")
+        cache_layout.addRow("容量上限:", self.cache_size_input)
+
+        self.cache_stats_label = QLabel("-")
+        cache_buttons = QHBoxLayout()
+        refresh_cache_btn = QPushButton("刷新")
+        refresh_cache_btn.clicked.connect(self.refresh_cache_stats)
+        clear_cache_btn = QPushButton("清空缓存")
+        clear_cache_btn.clicked.connect(self.clear_cache)
+        cache_buttons.addWidget(self.cache_stats_label, 1)
+        cache_buttons.addWidget(refresh_cache_btn)
+        cache_buttons.addWidget(clear_cache_btn)
+        cache_layout.addRow("当前项目:", cache_buttons)
+
+        cache_group.setLayout(cache_layout)
+
+        # 运行按钮
+        buttons_row = QHBoxLayout()
+        run_btn = QPushButton("批量运行")
+        run_btn.clicked.connect(self.run_batch)
+        bench_btn = QPushButton("并行与顺序执行对比")
+        bench_btn.clicked.connect(self.run_bench)
+        buttons_row.addWidget(run_btn)
+        buttons_row.addWidget(bench_btn)
+
+        self.layout.addWidget(notebooks_group)
+        self.layout.addWidget(schedule_group)
+        self.layout.addWidget(cache_group)
+        self.layout.addLayout(buttons_row)
+        self.add_command_preview()
+        self.add_output_section()
+        self.refresh_cache_stats()
+
+    def cache(self):
+        return CellCache(
+            Path(self.working_dir) / ".marimo_ui" / "cache", self.cache_size_input.value() * 1024 ** 2
+        )
+
+    def refresh_cache_stats(self, _output=None):
+        stats = self.cache().stats()
+        ratio = f"{stats['hit_ratio'] * 100:.1f}%" if stats["hit_ratio"] is not None else "-"
+        self.cache_stats_label.setText(
+            f"{stats['entries']} 个条目, {stats['size'] / 1024 ** 2:.1f} MB, "
+            f"命中 {stats['hits']} / 未命中 {stats['misses']}, 命中率 {ratio}"
+        )
+
+    def clear_cache(self):
+        reply = QMessageBox.question(
+            self, "确认", "确定要清空当前项目的单元格缓存吗？", QMessageBox.Yes | QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            self.cache().clear()
+            self.refresh_cache_stats()
+
+    def add_notebooks(self):
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, "选择笔记本文件", str(self.working_dir), "Python Files (*.py);;All Files (*)"
+        )
+        existing = {self.notebook_list.item(i).text() for i in range(self.notebook_list.count())}
+        for file_path in file_paths:
+            if file_path not in existing:
+                self.notebook_list.addItem(file_path)
+
+    def remove_selected(self):
+        for item in self.notebook_list.selectedItems():
+            self.notebook_list.takeItem(self.notebook_list.row(item))
+
+    def notebooks(self):
+        return [self.notebook_list.item(i).text() for i in range(self.notebook_list.count())]
+
+    def run_batch(self):
+        """按依赖图并行运行每个笔记本，可复用单元格缓存"""
+        notebooks = self.notebooks()
+        if not notebooks:
+            QMessageBox.warning(self, "警告", "请先添加要运行的笔记本")
+            return
+
+        self.run_command(self.build_command(), on_finished=self.refresh_cache_stats)
+
+    def build_command(self, mode="batch"):
+        command = script_command(SCHEDULER_SCRIPT, mode).arg(*self.notebooks())
+        command.option("--workers", self.workers_input.value())
+        command.option("--min-cost", self.min_cost_input.value())
+        if mode == "batch":
+            command.option("--profiles", Path(self.working_dir) / ".marimo_ui" / "profiles")
+            if self.cache_check.isChecked():
+                command.option("--cache", self.cache().root)
+                command.option("--cache-size", self.cache_size_input.value())
+        return command
+
+    def run_bench(self):
+        """分别顺序和并行运行，报告加速比（不使用缓存）"""
+        notebooks = self.notebooks()
+        if not notebooks:
+            QMessageBox.warning(self, "警告", "请先添加要运行的笔记本")
+            return
+
+        self.run_command(self.build_command("bench"))
+
+
+class AppsTab(BaseTab):
+    """多应用标签页：通过一个反向代理端口提供多个 marimo 应用"""
+    def __init__(self, working_dir=None):
+        super().__init__(working_dir)
+        self.proxy = ProxyProcess(Path(self.working_dir) / ".marimo_ui" / "proxy.log")
+        self.init_ui()
+        QApplication.instance().aboutToQuit.connect(self.stop_proxy)
+
+    def init_ui(self):
+        # 应用列表
+        notebooks_group = QGroupBox("应用列表 (访问地址为 /apps/<名称>/)")
+        notebooks_layout = QVBoxLayout()
+
+        self.notebook_list = QListWidget()
+        self.notebook_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        notebooks_layout.addWidget(self.notebook_list)
+
+        buttons_row = QHBoxLayout()
+        add_btn = QPushButton("添加...")
+        add_btn.clicked.connect(self.add_notebooks)
+        remove_btn = QPushButton("移除选中")
+        remove_btn.clicked.connect(self.remove_selected)
+        clear_btn = QPushButton("清空")
+        clear_btn.clicked.connect(self.notebook_list.clear)
+        buttons_row.addWidget(add_btn)
+        buttons_row.addWidget(remove_btn)
+        buttons_row.addWidget(clear_btn)
+        buttons_row.addStretch()
+        notebooks_layout.addLayout(buttons_row)
+        notebooks_group.setLayout(notebooks_layout)
+
+        # 代理设置
+        proxy_group = QGroupBox("代理设置")
+        proxy_layout = QFormLayout()
+
+        self.port_input = QSpinBox()
+        self.port_input.setRange(1000, 65535)
+        self.port_input.setValue(8000)
+        proxy_layout.addRow("代理端口:", self.port_input)
+
+        self.host_input = QLineEdit("127.0.0.1")
+        proxy_layout.addRow("主机:", self.host_input)
+
+        self.session_ttl_input = QSpinBox()
+        self.session_ttl_input.setRange(1, 3600)
+        self.session_ttl_input.setValue(120)
+        proxy_layout.addRow("会话超时(秒):", self.session_ttl_input)
+
+        self.include_code_check = QCheckBox("包含代码")
+        proxy_layout.addRow("选项:", self.include_code_check)
+
+        proxy_group.setLayout(proxy_layout)
+
+        buttons_row = QHBoxLayout()
+        self.start_btn = QPushButton("启动代理")
+        self.start_btn.clicked.connect(self.start_proxy)
+        self.stop_btn = QPushButton("停止代理")
+        self.stop_btn.clicked.connect(self.stop_proxy)
+        self.stop_btn.setEnabled(False)
+        buttons_row.addWidget(self.start_btn)
+        buttons_row.addWidget(self.stop_btn)
+
+        # 逐应用延迟
+        stats_group = QGroupBox("逐应用统计")
+        stats_layout = QVBoxLayout()
+        self.status_label = QLabel("代理未运行")
+        self.stats_table = QTableWidget(0, 8)
+        self.stats_table.setHorizontalHeaderLabels(
+            ["应用", "请求数", "错误", "WebSocket", "平均(ms)", "p50(ms)", "p95(ms)", "连接复用"]
+        )
+        self.stats_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.stats_table.horizontalHeader().setStretchLastSection(True)
+        self.stats_table.setSortingEnabled(True)
+        stats_layout.addWidget(self.status_label)
+        stats_layout.addWidget(self.stats_table)
+        stats_group.setLayout(stats_layout)
+
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(2000)
+        self.stats_timer.timeout.connect(self.refresh_stats)
+
+        self.layout.addWidget(notebooks_group)
+        self.layout.addWidget(proxy_group)
+        self.layout.addLayout(buttons_row)
+        self.layout.addWidget(stats_group)
+        self.add_output_section()
+
+    def add_notebooks(self):
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, "选择笔记本文件", str(self.working_dir), "Python Files (*.py);;All Files (*)"
+        )
+        existing = {self.notebook_list.item(i).text() for i in range(self.notebook_list.count())}
+        for file_path in file_paths:
+            if file_path not in existing:
+                self.notebook_list.addItem(file_path)
+
+    def remove_selected(self):
+        for item in self.notebook_list.selectedItems():
+            self.notebook_list.takeItem(self.notebook_list.row(item))
+
+    def proxy_url(self):
+        return f"http://{self.host_input.text().strip()}:{self.port_input.value()}"
+
+    def start_proxy(self):
+        notebooks = [self.notebook_list.item(i).text() for i in range(self.notebook_list.count())]
+        if not notebooks:
+            QMessageBox.warning(self, "警告", "请先添加要提供的笔记本")
+            return
+        if self.proxy.running:
+            return
+
+        command = script_command(PROXY_SCRIPT, "serve").arg(*notebooks)
+        command.option("--host", self.host_input.text().strip()).option("--port", self.port_input.value())
+        command.option("--session-ttl", self.session_ttl_input.value())
+        command.flag("--include-code", self.include_code_check.isChecked())
+
+        self.output_text.clear()
+        self.output_text.append(f"工作目录: {self.working_dir}")
+        self.output_text.append(f"执行命令: {command.preview()}")
+        self.output_text.append(f"日志文件: {self.proxy.log_path}\n")
+        self.proxy.start(command, self.working_dir)
+        self.start_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
+        self.status_label.setText(f"正在启动: {self.proxy_url()}/")
+        self.stats_timer.start()
+
+    def stop_proxy(self):
+        self.stats_timer.stop()
+        self.proxy.stop()
+        self.start_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        self.status_label.setText("代理未运行")
+
+    def refresh_stats(self):
+        if self.proxy.process is None:
+            return
+        if not self.proxy.running:
+            self.output_text.append(f"代理已退出，返回码 {self.proxy.returncode}")
+            self.output_text.append(self.proxy.log())
+            self.stop_proxy()
+            return
+        stats = fetch_proxy_stats(self.proxy_url())
+        if stats is None:
+            return
+
+        self.status_label.setText(f"运行中: {self.proxy_url()}/  已运行 {stats['uptime']:.0f} 秒")
+        self.stats_table.setSortingEnabled(False)
+        self.stats_table.setRowCount(len(stats["routes"]))
+        for row, (name, route) in enumerate(sorted(stats["routes"].items())):
+            ms = lambda value: round(value, 1) if value is not None else "-"
+            websockets = f"{route['active_websockets']} / {route['websockets']}"
+            values = [name, route["requests"], route["errors"], websockets, ms(route["mean_ms"]),
+                      ms(route["p50_ms"]), ms(route["p95_ms"]), route["pool"]["reused"]]
+            for column, value in enumerate(values):
+                item = numeric_item(value) if isinstance(value, (int, float)) else QTableWidgetItem(str(value))
+                if column == 0 and not route["running"]:
+                    item.setText(f"{name} (已退出)")
+                self.stats_table.setItem(row, column, item)
+        self.stats_table.setSortingEnabled(True)
+
+
+class MonitorTab(BaseTab):
+    """资源监控标签页：采样GUI启动的每个进程树的CPU、内存、线程和文件描述符"""
+    def __init__(self, working_dir=None):
+        super().__init__(working_dir)
+        self.init_ui()
+
+    def init_ui(self):
+        settings_group = QGroupBox("采样设置")
+        settings_layout = QHBoxLayout()
+
+        self.interval_input = QSpinBox()
+        self.interval_input.setRange(1, 60)
+        self.interval_input.setValue(1)
+        self.interval_input.setSuffix(" 秒")
+        self.interval_input.valueChanged.connect(lambda value: self.timer.setInterval(value * 1000))
+
+        export_btn = QPushButton("导出CSV...")
+        export_btn.clicked.connect(self.export_csv)
+        clear_btn = QPushButton("清除已退出")
+        clear_btn.clicked.connect(self.clear_exited)
+
+        settings_layout.addWidget(QLabel("采样间隔:"))
+        settings_layout.addWidget(self.interval_input)
+        settings_layout.addStretch()
+        settings_layout.addWidget(export_btn)
+        settings_layout.addWidget(clear_btn)
+        settings_group.setLayout(settings_layout)
+
+        processes_group = QGroupBox("进程")
+        processes_layout = QVBoxLayout()
+        self.overhead_label = QLabel("-")
+        self.process_table = QTableWidget(0, 9)
+        self.process_table.setHorizontalHeaderLabels(
+            ["命令", "PID", "进程数", "CPU%", "RSS(MB)", "线程", "文件描述符", "CPU 趋势", "RSS 趋势"]
+        )
+        self.process_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.process_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.process_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.process_table.setMinimumHeight(360)
+        processes_layout.addWidget(self.overhead_label)
+        processes_layout.addWidget(self.process_table)
+        processes_group.setLayout(processes_layout)
+
+        self.layout.addWidget(settings_group)
+        self.layout.addWidget(processes_group)
+
+        # 不可见时也持续采样，以保留完整的时间序列；没有 /proc 时定时器不启动
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.interval_input.value() * 1000)
+        self.timer.timeout.connect(self.sample)
+        if not ProcessMonitor.available():
+            self.overhead_label.setText("当前系统没有 /proc，无法采样")
+            self.interval_input.setEnabled(False)
+            return
+        self.timer.start()
+
+    def sample(self):
+        PROCESS_MONITOR.sample()
+        if self.isVisible():
+            self.refresh_table()
+
+    def refresh_table(self):
+        processes = PROCESS_MONITOR.tracked()
+        interval = self.interval_input.value()
+        self.overhead_label.setText(
+            f"{len(processes)} 个进程树，采样开销约 {PROCESS_MONITOR.overhead(interval):.3f}% CPU"
+        )
+        self.process_table.setRowCount(len(processes))
+        for row, process in enumerate(processes):
+            latest = process.latest
+            cpu = round(latest.cpu, 1) if latest is not None and latest.cpu is not None else "-"
+            rss = round(latest.rss / 1024 ** 2, 1) if latest is not None else "-"
+            values = [
+                process.label if not process.exited else f"(已退出) {process.label}",
+                process.pid, len(process.tree), cpu, rss,
+                latest.threads if latest is not None else "-",
+                latest.fds if latest is not None else "-",
+                sparkline(process.series("cpu")), sparkline(process.series("rss")),
+            ]
+            for column, value in enumerate(values):
+                item = numeric_item(value) if isinstance(value, (int, float)) else QTableWidgetItem(str(value))
+                if column == 0:
+                    item.setToolTip(process.label)
+                self.process_table.setItem(row, column, item)
+
+    def clear_exited(self):
+        PROCESS_MONITOR.clear_exited()
+        self.refresh_table()
+
+    def export_csv(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "导出CSV", str(Path(self.working_dir) / "resource_usage.csv"), "CSV Files (*.csv)"
+        )
+        if file_path:
+            PROCESS_MONITOR.export_csv(file_path)
+            QMessageBox.information(self, "完成", f"已导出到 {file_path}")
+
+
+class LogSearchSignals(QObject):
+    """后台搜索线程通过此对象把结果送回界面线程"""
+    finished = Signal(object, object)
+    failed = Signal(str)
+
+
+class LogsTab(BaseTab):
+    """日志标签页：浏览每个命令的持久化日志，按页加载，支持基于索引的正则搜索"""
+
+    PAGE_LINES = 1000
+    INDEX_INTERVAL = 30
+
+    def __init__(self, working_dir=None):
+        super().__init__(working_dir)
+        self.store = LogStore(command_log_dir(self.working_dir))
+        self.segments = []
+        self.segment_index = 0
+        self.page_start = 0
+        self.index_status = "尚未索引"
+        self.search_signals = LogSearchSignals()
+        self.search_signals.finished.connect(self.show_search_results)
+        self.search_signals.failed.connect(self.show_search_error)
+        self.init_ui()
+
+        # 后台线程定期为已关闭的日志段建立索引
+        self.index_requested = threading.Event()
+        self.index_thread = threading.Thread(target=self.index_loop, daemon=True)
+        self.index_thread.start()
+
+    def init_ui(self):
+        settings = load_settings(self.store.root)
+        settings_group = QGroupBox("日志设置")
+        settings_layout = QHBoxLayout()
+        self.compress_check = QCheckBox("压缩轮转后的日志段 (gzip)")
+        self.compress_check.setChecked(settings["compress"])
+        self.segment_input = QSpinBox()
+        self.segment_input.setRange(1, 1024)
+        self.segment_input.setSuffix(" MB")
+        self.segment_input.setValue(max(1, settings["segment_bytes"] // 1024 ** 2))
+        self.total_input = QSpinBox()
+        self.total_input.setRange(1, 1024)
+        self.total_input.setSuffix(" GB")
+        self.total_input.setValue(max(1, settings["max_total_bytes"] // 1024 ** 3))
+        for widget in (self.segment_input, self.total_input):
+            widget.valueChanged.connect(self.save_log_settings)
+        self.compress_check.toggled.connect(self.save_log_settings)
+
+        index_btn = QPushButton("立即索引")
+        index_btn.clicked.connect(lambda: self.index_requested.set())
+        self.index_label = QLabel(self.index_status)
+
+        settings_layout.addWidget(self.compress_check)
+        settings_layout.addWidget(QLabel("单段大小:"))
+        settings_layout.addWidget(self.segment_input)
+        settings_layout.addWidget(QLabel("总容量:"))
+        settings_layout.addWidget(self.total_input)
+        settings_layout.addStretch()
+        settings_layout.addWidget(self.index_label)
+        settings_layout.addWidget(index_btn)
+        settings_group.setLayout(settings_layout)
+
+        runs_group = QGroupBox("运行记录")
+        runs_layout = QVBoxLayout()
+        self.runs_list = QListWidget()
+        self.runs_list.currentItemChanged.connect(lambda item, _: item and self.open_run(item.data(Qt.UserRole)))
+        refresh_btn = QPushButton("刷新")
+        refresh_btn.clicked.connect(self.refresh_runs)
+        runs_layout.addWidget(self.runs_list)
+        runs_layout.addWidget(refresh_btn)
+        runs_group.setLayout(runs_layout)
+
+        viewer_group = QGroupBox("日志内容")
+        viewer_layout = QVBoxLayout()
+        self.log_view = QPlainTextEdit()
+        self.log_view.setReadOnly(True)
+        self.log_view.setFont(QFont("Consolas", 9))
+        self.log_view.setLineWrapMode(QPlainTextEdit.NoWrap)
+        page_layout = QHBoxLayout()
+        self.prev_btn = QPushButton("上一页")
+        self.prev_btn.clicked.connect(lambda: self.move_page(-1))
+        self.next_btn = QPushButton("下一页")
+        self.next_btn.clicked.connect(lambda: self.move_page(1))
+        self.page_label = QLabel("-")
+        page_layout.addWidget(self.prev_btn)
+        page_layout.addWidget(self.next_btn)
+        page_layout.addWidget(self.page_label)
+        page_layout.addStretch()
+        viewer_layout.addWidget(self.log_view)
+        viewer_layout.addLayout(page_layout)
+        viewer_group.setLayout(viewer_layout)
+
+        browse_layout = QHBoxLayout()
+        browse_layout.addWidget(runs_group, 1)
+        browse_layout.addWidget(viewer_group, 3)
+
+        search_group = QGroupBox("正则搜索")
+        search_layout = QVBoxLayout()
+        query_layout = QHBoxLayout()
+        self.pattern_input = QLineEdit()
+        self.pattern_input.setPlaceholderText("例如: Traceback|Error \\d+")
+        self.pattern_input.returnPressed.connect(self.search)
+        self.ignore_case_check = QCheckBox("忽略大小写")
+        self.current_run_check = QCheckBox("仅当前运行")
+        self.search_btn = QPushButton("搜索")
+        self.search_btn.clicked.connect(self.search)
+        query_layout.addWidget(self.pattern_input)
+        query_layout.addWidget(self.ignore_case_check)
+        query_layout.addWidget(self.current_run_check)
+        query_layout.addWidget(self.search_btn)
+        self.search_label = QLabel("")
+        self.results_list = QListWidget()
+        self.results_list.setMaximumHeight(200)
+        self.results_list.itemActivated.connect(self.open_result)
+        self.results_list.itemClicked.connect(self.open_result)
+        search_layout.addLayout(query_layout)
+        search_layout.addWidget(self.search_label)
+        search_layout.addWidget(self.results_list)
+        search_group.setLayout(search_layout)
+
+        self.layout.addWidget(settings_group)
+        self.layout.addLayout(browse_layout)
+        self.layout.addWidget(search_group)
+
+        self.status_timer = QTimer(self)
+        self.status_timer.setInterval(1000)
+        self.status_timer.timeout.connect(lambda: self.index_label.setText(self.index_status))
+        self.status_timer.start()
+        self.refresh_runs()
+
+    def save_log_settings(self):
+        save_settings(self.store.root, {
+            "compress": self.compress_check.isChecked(),
+            "segment_bytes": self.segment_input.value() * 1024 ** 2,
+            "max_total_bytes": self.total_input.value() * 1024 ** 3,
+        })
+
+    def index_loop(self):
+        # SQLite 连接只能在创建它的线程中使用
+        index = None
+        while True:
+            try:
+                if index is None:
+                    index = LogIndex(self.store.root)
+                count = index.index_pending()
+                self.index_status = f"索引已更新（新增 {count} 段）" if count else "索引已是最新"
+            except Exception as e:
+                self.index_status = f"索引失败: {e}"
+            self.index_requested.wait(self.INDEX_INTERVAL)
+            self.index_requested.clear()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh_runs()
+
+    def refresh_runs(self):
+        current = self.runs_list.currentItem()
+        selected = current.data(Qt.UserRole) if current is not None else None
+        self.runs_list.blockSignals(True)
+        self.runs_list.clear()
+        for meta in self.store.runs():
+            start = datetime.fromtimestamp(meta["start"]).strftime("%m-%d %H:%M:%S")
+            status = "运行中" if self.store.is_active(meta) else f"返回码 {meta.get('returncode', '-')}"
+            item = QListWidgetItem(f"{start}  [{status}]  {' '.join(meta['command'].split())}")
+            item.setToolTip(f"{meta['command']}\n{meta['cwd']}")
+            item.setData(Qt.UserRole, meta["id"])
+            self.runs_list.addItem(item)
+            if meta["id"] == selected:
+                self.runs_list.setCurrentItem(item)
+        self.runs_list.blockSignals(False)
+
+    def open_run(self, run_id, segment_index=0, line=0):
+        self.current_run = run_id
+        self.segments = self.store.segments(run_id)
+        self.segment_index = min(segment_index, max(0, len(self.segments) - 1))
+        self.page_start = line - line % self.PAGE_LINES
+        self.show_page()
+
+    def show_page(self):
+        if not self.segments:
+            self.log_view.setPlainText("（没有输出）")
+            self.page_label.setText("-")
+            return
+        # 只读取当前页：段的行偏移索引建立一次后，翻页只读这一页的字节
+        segment = self.segments[self.segment_index]
+        total = self.store.line_count(segment)
+        self.page_start = max(0, min(self.page_start, max(0, total - 1)))
+        page = self.store.read_page(segment, self.page_start, self.PAGE_LINES)
+        self.log_view.setPlainText("\n".join(page))
+        self.page_label.setText(
+            f"第 {self.segment_index + 1}/{len(self.segments)} 段，"
+            f"行 {self.page_start + 1}-{self.page_start + len(page)} / {total}"
+        )
+        self.prev_btn.setEnabled(self.segment_index > 0 or self.page_start > 0)
+        self.next_btn.setEnabled(
+            self.segment_index < len(self.segments) - 1 or self.page_start + self.PAGE_LINES < total
+        )
+
+    def move_page(self, step):
+        total = self.store.line_count(self.segments[self.segment_index])
+        start = self.page_start + step * self.PAGE_LINES
+        if start < 0:
+            if self.segment_index == 0:
+                return
+            self.segment_index -= 1
+            previous = self.store.line_count(self.segments[self.segment_index])
+            start = max(0, (previous - 1) // self.PAGE_LINES * self.PAGE_LINES)
+        elif start >= total:
+            if self.segment_index >= len(self.segments) - 1:
+                return
+            self.segment_index += 1
+            start = 0
+        self.page_start = start
+        self.show_page()
+
+    def search(self):
+        pattern = self.pattern_input.text()
+        if not pattern:
+            return
+        run_id = getattr(self, "current_run", None) if self.current_run_check.isChecked() else None
+        ignore_case = self.ignore_case_check.isChecked()
+        self.search_btn.setEnabled(False)
+        self.search_label.setText("搜索中...")
+        self.results_list.clear()
+
+        def work():
+            try:
+                started = time.perf_counter()
+                index = LogIndex(self.store.root)
+                try:
+                    results, stats = index.search(pattern, ignore_case, run_id=run_id)
+                finally:
+                    index.close()
+                stats["seconds"] = time.perf_counter() - started
+                self.search_signals.finished.emit(results, stats)
+            except Exception as e:
+                self.search_signals.failed.emit(str(e))
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def show_search_results(self, results, stats):
+        self.search_btn.setEnabled(True)
+        self.search_label.setText(
+            f"{len(results)} 条结果；{stats['segments']} 个日志段中通过索引跳过 {stats['skipped']} 个，"
+            f"扫描 {stats['scanned_bytes'] / 1024 ** 2:.1f} MB，用时 {stats['seconds']:.2f} 秒"
+        )
+        for run_id, segment, line_number, line in results:
+            item = QListWidgetItem(f"{run_id}  {segment}:{line_number + 1}  {line}")
+            item.setData(Qt.UserRole, (run_id, segment, line_number))
+            self.results_list.addItem(item)
+
+    def show_search_error(self, message):
+        self.search_btn.setEnabled(True)
+        self.search_label.setText(f"搜索失败: {message}")
+
+    def open_result(self, item):
+        run_id, segment, line_number = item.data(Qt.UserRole)
+        names = [path.name for path in self.store.segments(run_id)]
+        segment_index = names.index(segment) if segment in names else 0
+        self.open_run(run_id, segment_index, line_number)
+        cursor = self.log_view.textCursor()
+        cursor.movePosition(cursor.MoveOperation.Start)
+        cursor.movePosition(cursor.MoveOperation.Down, n=line_number - self.page_start)
+        cursor.select(cursor.SelectionType.LineUnderCursor)
+        self.log_view.setTextCursor(cursor)
+        self.log_view.centerCursor()
+
+
+class HistoryTab(BaseTab):
+    """历史标签页：列出界面运行过的命令，一键重新运行，并按笔记本或开关统计启动耗时"""
+
+    GROUP_LABELS = {"notebook": "按笔记本", "options": "按开关组合", "flags": "单个开关有/无对比"}
+
+    def __init__(self, working_dir=None):
+        super().__init__(working_dir)
+        self.history = LaunchHistory(launch_history_path(self.working_dir))
+        self.init_ui()
+
+    def init_ui(self):
+        filter_group = QGroupBox("筛选")
+        filter_layout = QHBoxLayout()
+        self.program_combo = QComboBox()
+        self.program_combo.currentIndexChanged.connect(lambda _index: self.refresh())
+        self.group_combo = QComboBox()
+        for group in GROUPS:
+            self.group_combo.addItem(self.GROUP_LABELS[group], group)
+        self.group_combo.currentIndexChanged.connect(lambda _index: self.refresh_stats())
+        refresh_btn = QPushButton("刷新")
+        refresh_btn.clicked.connect(self.refresh)
+        filter_layout.addWidget(QLabel("程序:"))
+        filter_layout.addWidget(self.program_combo, 1)
+        filter_layout.addWidget(QLabel("统计方式:"))
+        filter_layout.addWidget(self.group_combo)
+        filter_layout.addWidget(refresh_btn)
+        filter_group.setLayout(filter_layout)
+
+        launches_group = QGroupBox("启动记录 (双击重新运行)")
+        launches_layout = QVBoxLayout()
+        self.launch_table = QTableWidget(0, 9)
+        self.launch_table.setHorizontalHeaderLabels(
+            ["#", "开始时间", "程序", "笔记本", "开关", "首次输出(ms)", "就绪(ms)", "返回码", "时长(s)"]
+        )
+        self.launch_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.launch_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.launch_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.launch_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+        self.launch_table.cellDoubleClicked.connect(lambda row, _column: self.relaunch())
+        relaunch_btn = QPushButton("重新运行所选命令")
+        relaunch_btn.clicked.connect(self.relaunch)
+        launches_layout.addWidget(self.launch_table)
+        launches_layout.addWidget(relaunch_btn)
+        launches_group.setLayout(launches_layout)
+
+        stats_group = QGroupBox("启动耗时统计")
+        stats_layout = QVBoxLayout()
+        self.stats_table = QTableWidget(0, 6)
+        self.stats_table.setHorizontalHeaderLabels(
+            ["分组", "次数", "就绪 p50(ms)", "就绪 p95(ms)", "首次输出 p50(ms)", "失败"]
+        )
+        self.stats_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.stats_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.stats_table.setSortingEnabled(True)
+        stats_layout.addWidget(self.stats_table)
+        stats_group.setLayout(stats_layout)
+
+        self.layout.addWidget(filter_group)
+        self.layout.addWidget(launches_group, 3)
+        self.layout.addWidget(stats_group, 2)
+        self.add_output_section()
+        self.refresh()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+
+    def program(self):
+        return self.program_combo.currentData()
+
+    def refresh(self, _output=None):
+        # 更新程序列表时保留当前选择，且不触发重复刷新
+        current = self.program()
+        self.program_combo.blockSignals(True)
+        self.program_combo.clear()
+        self.program_combo.addItem("全部", None)
+        for program in self.history.programs():
+            self.program_combo.addItem(program, program)
+        index = self.program_combo.findData(current)
+        self.program_combo.setCurrentIndex(max(0, index))
+        self.program_combo.blockSignals(False)
+
+        records = self.history.recent(program=self.program())
+        self.launch_table.setSortingEnabled(False)
+        self.launch_table.setRowCount(len(records))
+        for row, record in enumerate(records):
+            ms = lambda value: round(value * 1000) if value is not None else "-"
+            values = [
+                record["id"], datetime.fromtimestamp(record["started"]).strftime("%m-%d %H:%M:%S"),
+                record["program"], record["notebook"] or "", record["options"],
+                ms(record["first_output"]), ms(record["ready"]),
+                record["exit_code"] if record["exit_code"] is not None else "运行中",
+                round(record["duration"], 1) if record["duration"] is not None else "-",
+            ]
+            for column, value in enumerate(values):
+                item = numeric_item(value) if isinstance(value, (int, float)) else QTableWidgetItem(str(value))
+                if column == 2:
+                    item.setToolTip(shlex.join(record["argv"]))
+                self.launch_table.setItem(row, column, item)
+        self.launch_table.setSortingEnabled(True)
+        self.refresh_stats()
+
+    def refresh_stats(self):
+        rows = self.history.stats(self.group_combo.currentData(), self.program())
+        self.stats_table.setSortingEnabled(False)
+        self.stats_table.setRowCount(len(rows))
+        for row, stats in enumerate(rows):
+            ms = lambda value: round(value) if value is not None else "-"
+            values = [stats["key"], stats["launches"], ms(stats["ready_p50_ms"]), ms(stats["ready_p95_ms"]),
+                      ms(stats["first_output_p50_ms"]), stats["failures"]]
+            for column, value in enumerate(values):
+                item = numeric_item(value) if isinstance(value, (int, float)) else QTableWidgetItem(str(value))
+                self.stats_table.setItem(row, column, item)
+        self.stats_table.setSortingEnabled(True)
+
+    def relaunch(self):
+        row = self.launch_table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "警告", "请先选择一条启动记录")
+            return
+        record = self.history.get(int(self.launch_table.item(row, 0).text()))
+        if record is None:
+            return
+        if has_secrets(record["argv"]):
+            QMessageBox.warning(self, "警告", "该命令包含已隐藏的密码，请在原来的标签页中重新运行")
+            return
+        self.run_command(Command(*record["argv"]), on_finished=self.refresh, working_dir=record["cwd"])
+        # 新记录在进程启动后立即写入
+        QTimer.singleShot(500, self.refresh)
+
+
 class MarimoGUI(QMainWindow):
     """主窗口"""
     def __init__(self, working_dir=None, project_name=None):
@@ -1137,6 +3237,13 @@ class MarimoGUI(QMainWindow):
         export_tab = ExportTab(self.working_dir)
         tutorial_tab = TutorialTab(self.working_dir)
         config_tab = ConfigTab(self.working_dir)
+        graph_tab = GraphTab(self.working_dir)
+        advisor_tab = AdvisorTab(self.working_dir)
+        batch_tab = BatchTab(self.working_dir)
+        apps_tab = AppsTab(self.working_dir)
+        monitor_tab = MonitorTab(self.working_dir)
+        logs_tab = LogsTab(self.working_dir)
+        history_tab = HistoryTab(self.working_dir)
 
 
 
@@ -1147,6 +3254,13 @@ class MarimoGUI(QMainWindow):
         tab_widget.addTab(export_tab, "导出 (Export)")
         tab_widget.addTab(tutorial_tab, "教程 (Tutorial)")
         tab_widget.addTab(config_tab, "配置 (Config)")
+        tab_widget.addTab(graph_tab, "依赖图 (Graph)")
+        tab_widget.addTab(advisor_tab, "性能建议 (Advisor)")
+        tab_widget.addTab(batch_tab, "批量 (Batch)")
+        tab_widget.addTab(apps_tab, "多应用 (Apps)")
+        tab_widget.addTab(monitor_tab, "监控 (Monitor)")
+        tab_widget.addTab(logs_tab, "日志 (Logs)")
+        tab_widget.addTab(history_tab, "历史 (History)")
 
         main_layout.addWidget(tab_widget)
 
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+marimo 内部接口兼容性 - 导出、资源存储、性能预设和图形泄漏检测直接使用 marimo 的私有模块和属性，
+这些接口在小版本之间可能改名或改签名；pyproject.toml 把 marimo 限制在已测试的版本范围内，
+环境中装了其他版本时，这里把晦涩的 ImportError/AttributeError/TypeError 换成明确的版本提示
+"""
+
+import argparse
+import contextlib
+import sys
+
+# 与 pyproject.toml 中 marimo 的版本约束保持一致
+TESTED_RANGE = ((0, 15), (0, 16))
+TESTED_SPEC = ">=0.15.0,<0.16"
+
+
+def marimo_version():
+    import marimo
+
+    return marimo.__version__
+
+
+def is_tested(version):
+    try:
+        major, minor = (int(part) for part in version.split(".")[:2])
+    except ValueError:
+        return False
+    return TESTED_RANGE[0] <= (major, minor) < TESTED_RANGE[1]
+
+
+@contextlib.contextmanager
+def marimo_internals(feature):
+    """
+    包住对 marimo 私有接口的导入和调用：私有模块无法导入时，或在未测试的 marimo 版本上出现
+    属性和参数不匹配时，抛出带版本信息的 RuntimeError；已测试版本上的其他错误原样抛出
+    """
+    try:
+        yield
+    except (ImportError, AttributeError, TypeError) as e:
+        version = marimo_version()
+        if isinstance(e, ImportError) or not is_tested(version):
+            raise RuntimeError(
+                f"{feature}依赖 marimo 的内部接口，当前 marimo {version} 不兼容"
+                f"（已测试 marimo{TESTED_SPEC}，请安装该范围内的版本）: {type(e).__name__}: {e}"
+            ) from e
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查当前 marimo 版本是否在已测试的范围内")
+    parser.parse_args()
+    version = marimo_version()
+    tested = is_tested(version)
+    print(f"marimo {version}：{'在' if tested else '不在'}已测试的范围 {TESTED_SPEC} 内")
+    return 0 if tested else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+多格式导出 - 在一个进程中只加载一次笔记本、最多执行一次，
+用同一个会话结果写出 html、ipynb、md、script、html-wasm 等所有选中的格式，
+代替每种格式各启动一次 marimo export；html-wasm 的静态资源可以从共享存储硬链接或引用
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from asset_store import ASSET_MODES, AssetStore, atomic_write, point_to_shared
+from export_postprocess import TEXT_SUFFIXES, postprocess, print_report
+from marimo_internals import marimo_internals
+
+
+FORMATS = ("html", "html-wasm", "ipynb", "md", "script")
+
+# 每种格式写出的文件名；html-wasm 与 marimo export 一致，写成目录下的 index.html 加静态资源
+OUTPUT_NAMES = {
+    "html": "{stem}.html",
+    "html-wasm": "{stem}_wasm/index.html",
+    "ipynb": "{stem}.ipynb",
+    "md": "{stem}.md",
+    "script": "{stem}.script.py",
+}
+
+
+def output_path(notebook, output_dir, export_format):
+    return Path(output_dir) / OUTPUT_NAMES[export_format].format(stem=Path(notebook).stem)
+
+
+@marimo_internals("导出")
+def load_notebook(notebook):
+    """解析笔记本一次，返回 marimo 的文件管理器"""
+    from marimo._server.file_router import AppFileRouter
+    from marimo._utils.marimo_path import MarimoPath
+
+    file_router = AppFileRouter.from_filename(MarimoPath(str(Path(notebook).resolve())))
+    file_manager = file_router.get_file_manager(file_router.get_unique_file_key())
+    # 与 marimo export html 相同：把布局文件内联到应用配置中
+    file_manager.app.inline_layout_file()
+    return file_manager
+
+
+@marimo_internals("导出")
+def run_once(file_manager):
+    """执行笔记本直到全部单元格完成，返回 (会话视图, 是否有单元格出错)"""
+    from marimo._output.hypertext import patch_html_for_non_interactive_output
+    from marimo._server.export import run_app_until_completion
+
+    with patch_html_for_non_interactive_output():
+        return asyncio.run(run_app_until_completion(file_manager, cli_args={}, argv=[]))
+
+
+def export_all(notebook, formats, output_dir, include_code=True, ipynb_outputs=False, sort_mode="top-down",
+               wasm_assets="copy", asset_store=None, assets_root=None):
+    """
+    返回 {"files": {格式: 路径}, "errors": {格式: 信息}, "timings": {阶段: 秒}, "did_error": bool}；
+    只有 html 或带输出的 ipynb 需要执行笔记本，两者共用同一次执行结果；某种格式失败不影响其他格式。
+    wasm_assets 为 copy 时与 marimo export 相同，每个导出复制一份静态资源；link 从 asset_store
+    硬链接到导出目录；shared 只在 assets_root（默认为输出目录）下建立一份共享资源，导出的 index.html 用相对地址引用它
+    """
+    with marimo_internals("导出"):
+        from marimo._config.manager import get_default_config_manager
+        from marimo._server.export.exporter import Exporter
+
+    timings = {}
+    started = time.perf_counter()
+    file_manager = load_notebook(notebook)
+    with marimo_internals("导出"):
+        display_config = get_default_config_manager(current_path=file_manager.path).get_config()["display"]
+    timings["load"] = time.perf_counter() - started
+
+    session_view, did_error = None, False
+    if "html" in formats or ("ipynb" in formats and ipynb_outputs):
+        started = time.perf_counter()
+        session_view, did_error = run_once(file_manager)
+        timings["run"] = time.perf_counter() - started
+
+    exporter = Exporter()
+    files, errors = {}, {}
+    for export_format in formats:
+        started = time.perf_counter()
+        path = output_path(notebook, output_dir, export_format)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            contents = export_contents(exporter, file_manager, export_format, path, notebook, session_view,
+                                       display_config, include_code, ipynb_outputs, sort_mode)
+            if export_format == "html-wasm":
+                contents = write_wasm_assets(exporter, contents, path, assets_root or output_dir, wasm_assets,
+                                             asset_store)
+        except Exception as e:
+            errors[export_format] = f"{type(e).__name__}: {e}"
+            continue
+        # 先写临时文件再改名：导出被取消时保留上一次完整的输出，不会留下截断的文件
+        atomic_write(path, lambda temp_path: Path(temp_path).write_text(contents, encoding="utf-8"))
+        files[export_format] = path
+        timings[export_format] = time.perf_counter() - started
+    return {"files": files, "errors": errors, "timings": timings, "did_error": did_error}
+
+
+@marimo_internals("导出")
+def export_contents(exporter, file_manager, export_format, path, notebook, session_view,
+                    display_config, include_code, ipynb_outputs, sort_mode):
+    from marimo._server.models.export import ExportAsHTMLRequest
+
+    if export_format == "html":
+        contents, _ = exporter.export_as_html(
+            filename=file_manager.filename,
+            app=file_manager.app,
+            session_view=session_view,
+            display_config=display_config,
+            request=ExportAsHTMLRequest(include_code=include_code, download=False, files=[]),
+        )
+    elif export_format == "ipynb":
+        contents, _ = exporter.export_as_ipynb(
+            filename=file_manager.filename,
+            app=file_manager.app,
+            sort_mode=sort_mode,
+            session_view=session_view if ipynb_outputs else None,
+        )
+    elif export_format == "md":
+        # 与 marimo export md -o 相同，标题取自输出文件名
+        contents, _ = exporter.export_as_md(
+            notebook=file_manager.app.to_ir(), filename=str(path), previous=Path(notebook)
+        )
+    elif export_format == "script":
+        contents, _ = exporter.export_as_script(filename=file_manager.filename, app=file_manager.app)
+    else:
+        contents, _ = exporter.export_as_wasm(
+            filename=file_manager.filename,
+            app=file_manager.app,
+            display_config=display_config,
+            mode="run",
+            code=file_manager.to_code(),
+            show_code=include_code,
+        )
+    return contents
+
+
+@marimo_internals("导出 html-wasm 资源")
+def write_wasm_assets(exporter, contents, path, output_dir, wasm_assets, asset_store):
+    """按资源方式写出 html-wasm 导出目录中的静态资源，返回（可能改写过的）index.html 内容"""
+    if wasm_assets == "copy":
+        exporter.export_assets(path.parent, ignore_index_html=True)
+    else:
+        store = AssetStore(asset_store or Path(output_dir) / ".marimo_assets")
+        manifest = store.marimo_bundle()
+        if wasm_assets == "link":
+            store.materialize(manifest, path.parent)
+        else:
+            shared = store.shared_dir(manifest, output_dir)
+            relative_url = Path(os.path.relpath(shared, path.parent)).as_posix()
+            contents = point_to_shared(contents.replace('="./assets/', f'="{relative_url}/assets/'),
+                                       manifest, relative_url)
+    (path.parent / ".nojekyll").touch()
+    return contents
+
+
+def separate_commands(notebook, formats, output_dir, include_code=True, ipynb_outputs=False):
+    """逐格式导出时等价的 marimo export 命令"""
+    commands = []
+    for export_format in formats:
+        command = [sys.executable, "-m", "marimo", "export", export_format, str(notebook),
+                   "-o", str(output_path(notebook, output_dir, export_format)), "-f"]
+        if export_format == "html" and not include_code:
+            command.append("--no-include-code")
+        if export_format == "html-wasm":
+            command.extend(["--mode", "run"])
+            if include_code:
+                command.append("--show-code")
+        if export_format == "ipynb" and ipynb_outputs:
+            command.append("--include-outputs")
+        if export_format in ("html", "html-wasm", "ipynb"):
+            command.append("--no-sandbox")
+        commands.append(command)
+    return commands
+
+
+def timed_run(command):
+    started = time.perf_counter()
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"命令失败（返回码 {result.returncode}）: {result.stderr.strip()[-500:]}")
+    return time.perf_counter() - started
+
+
+def bench(notebook, formats, include_code=True, ipynb_outputs=False, runs=3):
+    """分别用逐格式的 marimo export 子进程和一次多格式导出写出相同的文件，比较墙钟时间"""
+    separate, combined = [], []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for _ in range(runs):
+            separate.append(sum(
+                timed_run(command)
+                for command in separate_commands(notebook, formats, Path(temp_dir) / "separate", include_code, ipynb_outputs)
+            ))
+            command = [sys.executable, str(Path(__file__).resolve()), str(notebook), "--formats", *formats,
+                       "--output-dir", str(Path(temp_dir) / "combined")]
+            if not include_code:
+                command.append("--no-include-code")
+            if ipynb_outputs:
+                command.append("--ipynb-outputs")
+            combined.append(timed_run(command))
+    separate_time, combined_time = min(separate), min(combined)
+    print(f"{Path(notebook).name}: {len(formats)} 种格式 ({', '.join(formats)})，取 {runs} 次中的最小值")
+    print(f"  逐格式导出 {separate_time:7.2f} s（{len(formats)} 个进程）")
+    print(f"  一次导出   {combined_time:7.2f} s（1 个进程）")
+    print(f"  加速比     {separate_time / combined_time:7.2f}x")
+    return {"formats": list(formats), "separate_s": separate_time, "combined_s": combined_time,
+            "speedup": separate_time / combined_time}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="一次执行导出多种格式")
+    parser.add_argument("notebooks", nargs="+", help="一个或多个笔记本，在同一进程中依次导出")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=["html", "ipynb", "md"])
+    parser.add_argument("--output-dir", default=None, help="输出目录，默认与笔记本相同")
+    parser.add_argument("--no-include-code", action="store_true", help="HTML/WASM 中不包含代码")
+    parser.add_argument("--ipynb-outputs", action="store_true", help="ipynb 中包含单元格输出（复用同一次执行）")
+    parser.add_argument("--sort", choices=("top-down", "topological"), default="top-down", help="ipynb 单元格顺序")
+    parser.add_argument("--wasm-assets", choices=ASSET_MODES, default="copy",
+                        help="html-wasm 静态资源：copy 每个导出复制一份，link 从存储硬链接，shared 共用一个目录")
+    parser.add_argument("--asset-store", help="内容寻址的资源存储目录，默认是输出目录下的 .marimo_assets")
+    parser.add_argument("--postprocess", action="store_true",
+                        help="导出后压缩 HTML、提取重复图片并生成 .gz/.br（见 export_postprocess.py）")
+    parser.add_argument("--bench", action="store_true", help="与逐格式的 marimo export 比较耗时")
+    parser.add_argument("--output", help="基准测试结果写入JSON文件")
+    args = parser.parse_args()
+    # 导出监视器用 SIGTERM 取消过时的导出；转换为 SystemExit，让 atomic_write 删除写到一半的临时文件
+    signal.signal(signal.SIGTERM, lambda *_args: sys.exit(128 + signal.SIGTERM))
+
+    formats = list(dict.fromkeys(args.formats))
+    if args.bench:
+        if len(args.notebooks) > 1:
+            parser.error("--bench 只接受一个笔记本")
+        results = bench(args.notebooks[0], formats, not args.no_include_code, args.ipynb_outputs)
+        if args.output:
+            Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        return
+
+    failed = False
+    written = []
+    for notebook in args.notebooks:
+        output_dir = Path(args.output_dir) if args.output_dir else Path(notebook).resolve().parent
+        result = export_all(notebook, formats, output_dir, not args.no_include_code, args.ipynb_outputs, args.sort,
+                            args.wasm_assets, args.asset_store)
+        if len(args.notebooks) > 1:
+            print(f"== {notebook}")
+        for export_format, path in result["files"].items():
+            print(f"{export_format:<10} -> {path}")
+        for export_format, message in result["errors"].items():
+            print(f"{export_format:<10} 失败: {message}", file=sys.stderr)
+        print("耗时: " + "，".join(f"{stage} {seconds:.2f}s" for stage, seconds in result["timings"].items()))
+        if result["did_error"]:
+            print("警告: 部分单元格执行出错，导出结果中包含错误输出", file=sys.stderr)
+        failed = failed or bool(result["errors"]) or result["did_error"]
+        written.extend(path for path in result["files"].values() if path.suffix in TEXT_SUFFIXES)
+    if args.postprocess and written:
+        started = time.perf_counter()
+        print_report(postprocess(written))
+        print(f"后处理耗时 {time.perf_counter() - started:.2f}s")
+    if failed:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
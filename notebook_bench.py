@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+示例笔记本基准测试 - 多次无头运行每个marimo笔记本及对应的Jupyter版本，输出JSON/Markdown报告
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+RUNNER_SCRIPT = Path(__file__).resolve().parent / "notebook_runner.py"
+
+
+def find_pairs(directory):
+    """查找 *_marimo.py 及其对应的 *_jupyter.ipynb"""
+    pairs = []
+    for marimo_path in sorted(Path(directory).glob("*_marimo.py")):
+        jupyter_path = marimo_path.with_name(marimo_path.name[: -len("_marimo.py")] + "_jupyter.ipynb")
+        pairs.append((marimo_path, jupyter_path if jupyter_path.exists() else None))
+    return pairs
+
+
+def run_once(notebook):
+    """在独立进程中运行一次笔记本，返回运行器报告和进程耗时"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output = Path(temp_dir) / "report.json"
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, str(RUNNER_SCRIPT), "profile", str(notebook), "--no-memory", "--output", str(output)],
+            cwd=notebook.parent,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        process_time = time.perf_counter() - started
+        if result.returncode != 0 or not output.exists():
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "运行失败")
+        report = json.loads(output.read_text(encoding="utf-8"))
+    report["process_time"] = process_time
+    return report
+
+
+def summarize(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {
+        "median": statistics.median(values),
+        "mean": statistics.fmean(values),
+        "min": min(values),
+        "max": max(values),
+        "stdev": statistics.stdev(values) if len(values) > 1 else 0.0,
+    }
+
+
+def benchmark(notebook, runs, warmup):
+    """预热后重复运行，汇总总耗时、逐单元格耗时和峰值RSS"""
+    for _ in range(warmup):
+        run_once(notebook)
+    reports = [run_once(notebook) for _ in range(runs)]
+
+    cells = []
+    for position, cell in enumerate(reports[0]["cells"]):
+        times = [report["cells"][position]["wall_time"] for report in reports]
+        cells.append({
+            "label": cell["label"],
+            "lineno": cell["lineno"],
+            "status": cell["status"],
+            "wall_time": summarize(times),
+        })
+
+    return {
+        "notebook": str(notebook),
+        "runs": runs,
+        "warmup": warmup,
+        "total_time": summarize([report["total_time"] for report in reports]),
+        "process_time": summarize([report["process_time"] for report in reports]),
+        "peak_rss": summarize([report["peak_rss"] for report in reports]),
+        # 被 mo.stop() 停止的单元格（例如等待按钮的基准测试）及其下游不算错误
+        "errors": sum(1 for cell in reports[0]["cells"] if cell["status"] == "error"),
+        "cells": cells,
+    }
+
+
+def format_ms(summary):
+    return f"{summary['median'] * 1000:.1f}" if summary else "-"
+
+
+def format_mb(summary):
+    return f"{summary['median'] / 1024 / 1024:.1f}" if summary else "-"
+
+
+def render_markdown(report):
+    lines = [
+        "# 示例笔记本基准测试",
+        "",
+        f"- 时间: {report['timestamp']}",
+        f"- Python: {report['python']}",
+        f"- 每个笔记本运行 {report['runs']} 次（预热 {report['warmup']} 次），表中为中位数",
+        "",
+        "| 笔记本 | marimo 单元格(ms) | marimo 进程(ms) | marimo 峰值RSS(MB) "
+        "| Jupyter 单元格(ms) | Jupyter 进程(ms) | Jupyter 峰值RSS(MB) | 耗时比 (marimo/Jupyter) |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    for entry in report["notebooks"]:
+        marimo = entry["marimo"]
+        jupyter = entry.get("jupyter")
+        ratio = "-"
+        if "total_time" in marimo and jupyter and jupyter.get("total_time"):
+            ratio = f"{marimo['total_time']['median'] / jupyter['total_time']['median']:.2f}"
+        lines.append(
+            f"| {entry['name']} "
+            f"| {format_ms(marimo.get('total_time'))} | {format_ms(marimo.get('process_time'))} "
+            f"| {format_mb(marimo.get('peak_rss'))} "
+            f"| {format_ms(jupyter.get('total_time')) if jupyter else '-'} "
+            f"| {format_ms(jupyter.get('process_time')) if jupyter else '-'} "
+            f"| {format_mb(jupyter.get('peak_rss')) if jupyter else '-'} | {ratio} |"
+        )
+
+    for entry in report["notebooks"]:
+        marimo = entry["marimo"]
+        lines += ["", f"## {entry['name']}", ""]
+        if "error" in marimo:
+            lines.append(f"marimo 运行失败: {marimo['error']}")
+            continue
+        lines += ["| 单元格 | 行号 | 中位数(ms) | 最小(ms) | 最大(ms) | 状态 |", "|---|---|---|---|---|---|"]
+        for cell in sorted(marimo["cells"], key=lambda c: c["wall_time"]["median"], reverse=True):
+            timing = cell["wall_time"]
+            lines.append(
+                f"| {cell['label']} | {cell['lineno']} | {timing['median'] * 1000:.2f} "
+                f"| {timing['min'] * 1000:.2f} | {timing['max'] * 1000:.2f} | {cell['status']} |"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="示例笔记本基准测试")
+    parser.add_argument("directory", nargs="?", default=Path(__file__).resolve().parent / "examples",
+                        help="包含 *_marimo.py 的目录（默认 examples/）")
+    parser.add_argument("--runs", type=int, default=5, help="计时运行次数")
+    parser.add_argument("--warmup", type=int, default=1, help="预热运行次数")
+    parser.add_argument("--output-dir", default="bench_results", help="报告输出目录")
+    parser.add_argument("--no-jupyter", action="store_true", help="不运行对应的Jupyter版本")
+    args = parser.parse_args()
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "warmup": args.warmup,
+        "notebooks": [],
+    }
+
+    for marimo_path, jupyter_path in find_pairs(args.directory):
+        name = marimo_path.name[: -len("_marimo.py")]
+        print(f"基准测试: {name}")
+        entry = {"name": name}
+        for key, path in (("marimo", marimo_path), ("jupyter", None if args.no_jupyter else jupyter_path)):
+            if path is None:
+                continue
+            try:
+                entry[key] = benchmark(path, args.runs, args.warmup)
+                print(f"  {key}: {format_ms(entry[key]['total_time'])} ms")
+            except RuntimeError as e:
+                entry[key] = {"notebook": str(path), "error": str(e)}
+                print(f"  {key}: 运行失败 - {e}")
+        report["notebooks"].append(entry)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / "report.json").write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    (output_dir / "report.md").write_text(render_markdown(report), encoding="utf-8")
+    print(f"报告已写入 {output_dir / 'report.json'} 和 {output_dir / 'report.md'}")
+
+
+if __name__ == "__main__":
+    main()
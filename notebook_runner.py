@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+无头笔记本运行器 - 以脚本方式按依赖顺序执行marimo单元格，并记录每个单元格的耗时与内存
+"""
+
+import argparse
+import ast
+import builtins
+import copy
+import hashlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+import traceback
+from datetime import datetime
+from pathlib import Path
+
+from cell_cache import NO_CACHE_MARKER, CellCache, cell_code_hash, definition_hashes, is_deterministic, value_hash
+from notebook_graph import analyze_notebook
+
+
+# 这些状态的单元格没有产生输出，与 marimo 相同，其下游单元格不再运行
+HALTING_STATUSES = ("error", "stopped")
+
+
+def peak_rss():
+    """当前进程的峰值常驻内存（字节），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+class CellResult:
+    """单个单元格的执行结果"""
+
+    def __init__(self, index, label, lineno):
+        self.index = index
+        self.label = label
+        self.lineno = lineno
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_memory = 0
+        self.status = "pending"  # ok / error / stopped / skipped
+        self.error = None
+        self.output = None  # mo.stop() 给出的输出
+        self.cache = None  # hit / miss，未使用缓存时为None
+
+    def to_dict(self):
+        return {
+            "index": self.index,
+            "label": self.label,
+            "lineno": self.lineno,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "peak_memory": self.peak_memory,
+            "status": self.status,
+            "error": self.error,
+            "output": self.output,
+            "cache": self.cache,
+        }
+
+
+def compile_cell(cell, path, namespace):
+    """把单元格的函数定义（去掉装饰器）编译进命名空间并返回函数对象"""
+    node = copy.copy(cell.node)
+    node.decorator_list = []
+    module = ast.Module(body=[node], type_ignores=[])
+    ast.fix_missing_locations(module)
+    exec(compile(module, str(path), "exec"), namespace)
+    return namespace[cell.node.name]
+
+
+def unpack_outputs(cell, result):
+    """把单元格返回值映射为 {变量名: 值}"""
+    if not cell.defs:
+        return {}
+    if len(cell.defs) == 1 and not (isinstance(result, tuple) and len(result) == 1):
+        return {cell.defs[0]: result}
+    return dict(zip(cell.defs, result))
+
+
+def is_marimo_stop(error):
+    """是否为 mo.stop() 抛出的 MarimoStopError；调用过 mo.stop() 说明 marimo 已经导入"""
+    marimo = sys.modules.get("marimo")
+    return marimo is not None and isinstance(error, marimo.MarimoStopError)
+
+
+def stop_output(output):
+    """mo.stop() 输出的文本形式：mo.md 等 Html 对象取其 HTML，其他对象取 repr"""
+    if output is None:
+        return None
+    text = getattr(output, "text", None)
+    return text if isinstance(text, str) else repr(output)
+
+
+def measure(result, action, profile_memory):
+    """执行action并把耗时、CPU时间和峰值分配写入result"""
+    if profile_memory:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        action()
+        result.status = "ok"
+    except Exception as e:
+        result.status = "error"
+        result.error = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    except BaseException as e:
+        # MarimoStopError 继承 BaseException，不会被上面的 except Exception 捕获
+        if not is_marimo_stop(e):
+            raise
+        result.status = "stopped"
+        result.output = stop_output(e.output)
+    result.wall_time = time.perf_counter() - wall_start
+    result.cpu_time = time.process_time() - cpu_start
+    if profile_memory:
+        result.peak_memory = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+    return result
+
+
+class NotebookRunner:
+    """按拓扑顺序逐个执行单元格"""
+
+    def __init__(self, path, profile_memory=True, cache=None):
+        self.path = Path(path).resolve()
+        self.graph = analyze_notebook(self.path)
+        self.profile_memory = profile_memory
+        self.cache = cache
+        self.namespace = {"__name__": "__marimo_ui__", "__file__": str(self.path)}
+        self.values = {}
+        self.value_hashes = {}
+        self.functions = {}
+        self.results = [CellResult(cell.index, cell.label, cell.lineno) for cell in self.graph.cells]
+
+    def resolve_inputs(self, cell):
+        """收集单元格参数，缺失时尝试内置名称"""
+        args = []
+        for name in cell.refs:
+            if name in self.values:
+                args.append(self.values[name])
+            elif hasattr(builtins, name):
+                args.append(getattr(builtins, name))
+            else:
+                raise NameError(f"变量 {name} 未定义")
+        return args
+
+    def execute_cell(self, cell):
+        """执行单个单元格，返回其定义的变量"""
+        if cell.kind in ("function", "class_definition"):
+            compile_cell(cell, self.path, self.namespace)
+            return {cell.defs[0]: self.namespace[cell.node.name]}
+
+        key = self.cache_key(cell)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                outputs, hashes = cached
+                self.value_hashes.update(hashes)
+                self.results[cell.index].cache = "hit"
+                return outputs
+            self.results[cell.index].cache = "miss"
+
+        function = self.functions.get(cell.index)
+        if function is None:
+            function = compile_cell(cell, self.path, self.namespace)
+            self.functions[cell.index] = function
+        started = time.perf_counter()
+        outputs = unpack_outputs(cell, function(*self.resolve_inputs(cell)))
+        if key is not None and not self.store(key, outputs, time.perf_counter() - started):
+            # 输出无法缓存（函数、类、模块等），不计入命中统计
+            self.results[cell.index].cache = None
+        return outputs
+
+    def input_hash(self, name):
+        if name not in self.value_hashes:
+            self.value_hashes[name] = value_hash(self.values[name]) if name in self.values else None
+        return self.value_hashes[name]
+
+    def cache_key(self, cell):
+        """单元格代码、输入值和用到的顶层函数与类共同决定的缓存键，不可缓存时返回None"""
+        if self.cache is None or not cell.defs or not is_deterministic(cell):
+            return None
+        if any(NO_CACHE_MARKER in line for line in self.source_lines(cell)):
+            return None
+        hashes = {}
+        for name in cell.refs:
+            digest = self.input_hash(name)
+            if digest is None:
+                return None
+            hashes[name] = digest
+        # 用到的顶层函数和类按代码参与缓存键，加 @ 前缀避免与输入变量同名
+        for name, digest in definition_hashes(self.graph, cell).items():
+            hashes[f"@{name}"] = digest
+        return CellCache.make_key(cell_code_hash(cell), hashes)
+
+    def source_lines(self, cell):
+        if not hasattr(self, "_source_lines"):
+            self._source_lines = self.path.read_text(encoding="utf-8").splitlines()
+        return self._source_lines[cell.lineno - 1:cell.end_lineno]
+
+    def store(self, key, outputs, elapsed):
+        """只缓存全部输出都能计算哈希的单元格（模块、函数和类会被跳过）"""
+        hashes = {}
+        for name, value in outputs.items():
+            if isinstance(value, (type(sys), type)) or callable(value):
+                return False
+            digest = value_hash(value)
+            if digest is None:
+                return False
+            hashes[name] = digest
+        if not self.cache.put(key, outputs, hashes, elapsed):
+            return False
+        self.value_hashes.update(hashes)
+        return True
+
+    def run_cell(self, cell):
+        """执行并测量单个单元格"""
+        return measure(
+            self.results[cell.index],
+            lambda: self.values.update(self.execute_cell(cell)),
+            self.profile_memory,
+        )
+
+    def run(self):
+        """运行整个笔记本，出错或被 mo.stop() 停止的单元格的下游会被跳过"""
+        order = self.graph.topological_order()
+        sys.path.insert(0, str(self.path.parent))
+        if self.profile_memory:
+            tracemalloc.start()
+        failed = set()
+        started = time.perf_counter()
+        try:
+            for index in order:
+                cell = self.graph.cells[index]
+                if self.graph.parents[index] & failed:
+                    self.results[index].status = "skipped"
+                    failed.add(index)
+                    continue
+                if self.run_cell(cell).status in HALTING_STATUSES:
+                    failed.add(index)
+        finally:
+            if self.profile_memory:
+                tracemalloc.stop()
+            sys.path.remove(str(self.path.parent))
+            record_cache_stats(self.cache, self.results)
+        return self.report(time.perf_counter() - started)
+
+    def report(self, total_time):
+        return build_report(self.path, self.graph.digest, total_time, self.results)
+
+
+def record_cache_stats(cache, results):
+    if cache is not None:
+        cache.record(
+            sum(1 for result in results if result.cache == "hit"),
+            sum(1 for result in results if result.cache == "miss"),
+        )
+
+
+def build_report(path, digest, total_time, results):
+    return {
+        "notebook": str(path),
+        "digest": digest,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "total_time": total_time,
+        "peak_rss": peak_rss(),
+        "cells": [result.to_dict() for result in results],
+    }
+
+
+class IpynbRunner:
+    """按顺序执行Jupyter笔记本的代码单元格，用于与marimo版本对比"""
+
+    def __init__(self, path, profile_memory=True):
+        self.path = Path(path).resolve()
+        data = self.path.read_bytes()
+        self.digest = hashlib.sha256(data).hexdigest()
+        notebook = json.loads(data)
+        self.sources = []
+        for cell in notebook.get("cells", []):
+            if cell.get("cell_type") != "code":
+                continue
+            source = cell.get("source", "")
+            self.sources.append("".join(source) if isinstance(source, list) else source)
+        self.profile_memory = profile_memory
+        self.results = [
+            CellResult(index, f"In [{index + 1}]", index + 1) for index in range(len(self.sources))
+        ]
+
+    def make_executor(self):
+        """优先使用IPython内核语义（支持魔法命令和display），否则退化为exec"""
+        try:
+            from IPython.core.interactiveshell import InteractiveShell
+        except ImportError:
+            namespace = {"__name__": "__main__", "display": print}
+
+            def execute(source):
+                exec(compile(source, str(self.path), "exec"), namespace)
+            return execute
+
+        shell = InteractiveShell.instance(colors="nocolor")
+
+        def execute(source):
+            outcome = shell.run_cell(source, store_history=False)
+            if not outcome.success:
+                raise outcome.error_in_exec or outcome.error_before_exec
+        return execute
+
+    def run(self):
+        sys.path.insert(0, str(self.path.parent))
+        execute = self.make_executor()
+        if self.profile_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            # Jupyter 没有依赖关系，出错后继续执行后面的单元格
+            for index, source in enumerate(self.sources):
+                measure(self.results[index], lambda: execute(source), self.profile_memory)
+        finally:
+            if self.profile_memory:
+                tracemalloc.stop()
+            sys.path.remove(str(self.path.parent))
+        return build_report(self.path, self.digest, time.perf_counter() - started, self.results)
+
+
+class ProfileStore:
+    """按笔记本保存每次性能分析结果，便于对比不同版本"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def notebook_dir(self, notebook):
+        notebook = Path(notebook).resolve()
+        key = hashlib.sha1(str(notebook).encode("utf-8")).hexdigest()[:8]
+        return self.root / f"{notebook.stem}-{key}"
+
+    def save(self, report):
+        directory = self.notebook_dir(report["notebook"])
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = directory / f"{stamp}.json"
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+    def history(self, notebook):
+        """按时间顺序返回该笔记本的所有分析结果文件"""
+        directory = self.notebook_dir(notebook)
+        if not directory.exists():
+            return []
+        return sorted(directory.glob("*.json"))
+
+    def load(self, path):
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+
+    def latest(self, notebook, count=2):
+        """最近的若干次结果，最新的在前"""
+        return [self.load(path) for path in reversed(self.history(notebook)[-count:])]
+
+
+def profile_command(args):
+    if Path(args.notebook).suffix == ".ipynb":
+        runner = IpynbRunner(args.notebook, profile_memory=not args.no_memory)
+    else:
+        cache = CellCache(args.cache, args.cache_size * 1024 ** 2) if args.cache else None
+        runner = NotebookRunner(args.notebook, profile_memory=not args.no_memory, cache=cache)
+    report = runner.run()
+    if args.store:
+        saved = ProfileStore(args.store).save(report)
+        print(f"性能分析结果已保存: {saved}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print(f"总耗时: {report['total_time'] * 1000:.1f} ms")
+    for cell in sorted(report["cells"], key=lambda c: c["wall_time"], reverse=True):
+        print(f"{cell['label']:<40} {cell['wall_time'] * 1000:>10.1f} ms "
+              f"{cell['cpu_time'] * 1000:>10.1f} ms {cell['peak_memory'] / 1024:>10.1f} KB  "
+              f"{cell['status']}{' (缓存命中)' if cell['cache'] == 'hit' else ''}")
+    return 0
+
+
+def main():
+    # 无头运行时不弹出图形窗口
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+    parser = argparse.ArgumentParser(description="无头运行marimo笔记本")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    profile_parser = subparsers.add_parser("profile", help="逐单元格记录耗时与内存")
+    profile_parser.add_argument("notebook", help="marimo笔记本文件（.ipynb 按Jupyter顺序执行）")
+    profile_parser.add_argument("--store", help="保存历史结果的目录")
+    profile_parser.add_argument("--output", help="把结果写入JSON文件")
+    profile_parser.add_argument("--no-memory", action="store_true", help="不使用tracemalloc统计内存（开销更低）")
+    profile_parser.add_argument("--cache", help="单元格结果缓存目录")
+    profile_parser.add_argument("--cache-size", type=int, default=2048, help="缓存容量上限（MB）")
+    profile_parser.set_defaults(handler=profile_command)
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
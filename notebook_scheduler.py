@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+并行DAG调度器 - 在进程池中并发执行互不依赖的marimo单元格，并与顺序执行对比加速比
+"""
+
+import argparse
+import ast
+import copyreg
+import importlib
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from cell_cache import DEFAULT_MAX_BYTES, CellCache
+from notebook_runner import NotebookRunner, ProfileStore, build_report, record_cache_stats
+
+
+RUNNER_SCRIPT = Path(__file__).resolve().parent / "notebook_runner.py"
+
+
+def _reduce_module(module):
+    """模块按名称序列化，在目标进程中重新导入"""
+    return importlib.import_module, (module.__name__,)
+
+
+copyreg.pickle(types.ModuleType, _reduce_module)
+
+
+def imported_modules(graph):
+    """单元格中导入的绝对模块名"""
+    modules = []
+    for cell in graph.cells:
+        for node in ast.walk(cell.node):
+            if isinstance(node, ast.Import):
+                modules.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def preload_modules(graph):
+    """
+    预先导入笔记本用到的模块：fork 出的工作进程直接继承，
+    避免每个进程在执行单元格时重复导入
+    """
+    for name in imported_modules(graph):
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+
+# 工作进程内的运行器，由 _init_worker 创建
+_worker_runner = None
+
+
+def _init_worker(path, cache_root, cache_size):
+    global _worker_runner
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    cache = CellCache(cache_root, cache_size) if cache_root else None
+    _worker_runner = NotebookRunner(path, profile_memory=False, cache=cache)
+    sys.path.insert(0, str(_worker_runner.path.parent))
+    preload_modules(_worker_runner.graph)
+
+
+def _run_in_worker(index, payloads, hashes):
+    """
+    在工作进程中执行单元格，返回可序列化的输出或无法序列化的变量名；
+    出错或被 mo.stop() 停止时 run_cell 把它记录在结果中，不会把异常带回主进程
+    """
+    runner = _worker_runner
+    cell = runner.graph.cells[index]
+    runner.values = {name: pickle.loads(data) for name, data in payloads.items()}
+    runner.value_hashes = dict(hashes)
+    result = runner.run_cell(cell)
+    output_hashes = {name: runner.value_hashes[name] for name in cell.defs if name in runner.value_hashes}
+
+    outputs = {}
+    unpicklable = []
+    if result.status == "ok":
+        for name in cell.defs:
+            try:
+                outputs[name] = pickle.dumps(runner.values[name], protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                unpicklable.append(name)
+    runner.values = {}
+    return result, outputs, output_hashes, unpicklable, os.getpid()
+
+
+class ParallelRunner:
+    """
+    按依赖关系并发调度单元格：
+    主进程始终执行一个就绪单元格，其余可并发的单元格在输入都能pickle时提交到进程池，
+    否则在主进程排队执行；
+    工作进程产出无法pickle的结果时，该单元格会在主进程重新执行一次。
+    提供历史耗时 estimates 时，低于 min_cost 秒的单元格不值得跨进程，直接在主进程执行。
+    """
+
+    def __init__(self, path, workers=None, estimates=None, min_cost=0.05, cache_root=None,
+                 cache_size=DEFAULT_MAX_BYTES):
+        self.cache_root = str(cache_root) if cache_root else None
+        self.cache_size = cache_size
+        cache = CellCache(cache_root, cache_size) if cache_root else None
+        self.local = NotebookRunner(path, profile_memory=False, cache=cache)
+        self.path = self.local.path
+        self.graph = self.local.graph
+        self.workers = workers or os.cpu_count() or 1
+        self.estimates = estimates or {}
+        self.min_cost = min_cost
+        self.payloads = {}
+        self.local_only = set()
+        self.placement = {}
+
+    def payload(self, name):
+        """取得变量的序列化结果，失败时标记为只能在主进程使用"""
+        if name not in self.payloads and name not in self.local_only:
+            try:
+                self.payloads[name] = pickle.dumps(self.local.values[name], protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                self.local_only.add(name)
+        return self.payloads.get(name)
+
+    def can_dispatch(self, cell):
+        if self.estimates.get(cell.index, self.min_cost) < self.min_cost:
+            return False
+        names = [name for name in cell.refs if name in self.local.values]
+        return all(self.payload(name) is not None for name in names)
+
+    def run_local(self, cell):
+        self.placement[cell.index] = "main"
+        return self.local.run_cell(cell)
+
+    def run(self):
+        order = self.graph.topological_order()
+        position = {index: rank for rank, index in enumerate(order)}
+        pending = set(order)
+        done = set()
+        failed = set()
+        running = {}
+        local_queue = []
+
+        sys.path.insert(0, str(self.path.parent))
+        started = time.perf_counter()
+        preload_modules(self.graph)
+        try:
+            with ProcessPoolExecutor(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(str(self.path), self.cache_root, self.cache_size),
+            ) as pool:
+                while pending or running or local_queue:
+                    ready = sorted(
+                        (index for index in pending if self.graph.parents[index] <= (done | failed)),
+                        key=position.get,
+                    )
+                    for index in ready:
+                        pending.discard(index)
+                        cell = self.graph.cells[index]
+                        if self.graph.parents[index] & failed:
+                            self.local.results[index].status = "skipped"
+                            failed.add(index)
+                        elif not local_queue and not running:
+                            # 主进程空闲时自己执行一个单元格，只把多出来的并发分支交给进程池
+                            local_queue.append(index)
+                        elif self.can_dispatch(cell):
+                            payloads = {name: self.payloads[name] for name in cell.refs if name in self.payloads}
+                            hashes = {}
+                            if self.local.cache is not None:
+                                hashes = {name: self.local.input_hash(name) for name in payloads}
+                            running[pool.submit(_run_in_worker, index, payloads, hashes)] = index
+                        else:
+                            local_queue.append(index)
+
+                    if local_queue:
+                        # 主进程执行时，进程池中的单元格继续并发运行
+                        index = local_queue.pop(0)
+                        result = self.run_local(self.graph.cells[index])
+                        (done if result.status == "ok" else failed).add(index)
+                        continue
+                    if not running:
+                        continue
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        index = running.pop(future)
+                        cell = self.graph.cells[index]
+                        result, outputs, output_hashes, unpicklable, pid = future.result()
+                        if unpicklable:
+                            # 结果无法传回主进程，改为在主进程重新执行
+                            local_queue.append(index)
+                            continue
+                        self.local.results[index] = result
+                        self.placement[index] = pid
+                        for name, data in outputs.items():
+                            self.payloads[name] = data
+                            self.local.values[name] = pickle.loads(data)
+                        self.local.value_hashes.update(output_hashes)
+                        (done if result.status == "ok" else failed).add(index)
+        finally:
+            sys.path.remove(str(self.path.parent))
+            record_cache_stats(self.local.cache, self.local.results)
+
+        report = build_report(self.path, self.graph.digest, time.perf_counter() - started, self.local.results)
+        report["workers"] = self.workers
+        for cell in report["cells"]:
+            cell["placement"] = str(self.placement.get(cell["index"], "-"))
+        return report
+
+
+def load_estimates(store_root, notebook):
+    """读取最近一次性能分析的单元格耗时，笔记本内容变化后不再使用"""
+    runs = ProfileStore(store_root).latest(notebook, count=1)
+    graph_digest = NotebookRunner(notebook, profile_memory=False).graph.digest
+    if not runs or runs[0]["digest"] != graph_digest:
+        return {}
+    return {cell["index"]: cell["wall_time"] for cell in runs[0]["cells"]}
+
+
+def run_subprocess(arguments, cwd):
+    """在独立进程中运行并读取JSON报告"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output = Path(temp_dir) / "report.json"
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, *arguments, "--output", str(output)],
+            cwd=cwd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if result.returncode != 0 or not output.exists():
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "运行失败")
+        report = json.loads(output.read_text(encoding="utf-8"))
+    report["process_time"] = elapsed
+    return report
+
+
+def compare(notebook, workers, min_cost):
+    """分别以顺序和并行方式运行，并行运行使用顺序运行测得的耗时做调度"""
+    notebook = Path(notebook).resolve()
+    with tempfile.TemporaryDirectory() as store:
+        sequential = run_subprocess(
+            [str(RUNNER_SCRIPT), "profile", str(notebook), "--no-memory", "--store", store], notebook.parent
+        )
+        parallel = run_subprocess(
+            [str(Path(__file__).resolve()), "run", str(notebook), "--workers", str(workers),
+             "--profiles", store, "--min-cost", str(min_cost)],
+            notebook.parent,
+        )
+    return {
+        "notebook": str(notebook),
+        "workers": workers,
+        "sequential_time": sequential["total_time"],
+        "parallel_time": parallel["total_time"],
+        "sequential_process_time": sequential["process_time"],
+        "parallel_process_time": parallel["process_time"],
+        "speedup": sequential["total_time"] / parallel["total_time"] if parallel["total_time"] else None,
+        "dispatched": sum(1 for cell in parallel["cells"] if cell["placement"] not in ("main", "-")),
+        "errors": sum(1 for cell in parallel["cells"] if cell["status"] == "error"),
+    }
+
+
+def run_command(args):
+    estimates = load_estimates(args.profiles, args.notebook) if args.profiles else {}
+    report = ParallelRunner(
+        args.notebook, args.workers, estimates, args.min_cost / 1000, args.cache, args.cache_size * 1024 ** 2
+    ).run()
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"并行执行总耗时: {report['total_time'] * 1000:.1f} ms（{report['workers']} 个工作进程）")
+    for cell in report["cells"]:
+        print(f"{cell['label']:<40} {cell['wall_time'] * 1000:>10.1f} ms  {cell['placement']:<8} {cell['status']}")
+    return 0
+
+
+def batch_command(args):
+    """依次并行运行多个笔记本（可使用单元格缓存）"""
+    failures = 0
+    for notebook in args.notebooks:
+        estimates = load_estimates(args.profiles, notebook) if args.profiles else {}
+        try:
+            report = ParallelRunner(
+                notebook, args.workers, estimates, args.min_cost / 1000, args.cache, args.cache_size * 1024 ** 2
+            ).run()
+        except (OSError, SyntaxError, ValueError) as e:
+            print(f"{Path(notebook).name}: 运行失败 - {e}")
+            failures += 1
+            continue
+        cells = report["cells"]
+        hits = sum(1 for cell in cells if cell["cache"] == "hit")
+        # 被 mo.stop() 停止的单元格及其下游与 marimo 中一样不算失败
+        errors = sum(1 for cell in cells if cell["status"] == "error")
+        halted = sum(1 for cell in cells if cell["status"] in ("stopped", "skipped"))
+        print(f"{Path(notebook).name}: {report['total_time'] * 1000:.1f} ms, "
+              f"{len(cells)} 个单元格, 缓存命中 {hits}, 出错 {errors}, 停止/跳过 {halted}")
+        failures += 1 if errors else 0
+    if args.cache:
+        stats = CellCache(args.cache, args.cache_size * 1024 ** 2).stats()
+        ratio = f"{stats['hit_ratio'] * 100:.1f}%" if stats["hit_ratio"] is not None else "-"
+        print(f"缓存: {stats['entries']} 个条目, {stats['size'] / 1024 ** 2:.1f} MB, 累计命中率 {ratio}")
+    return 1 if failures else 0
+
+
+def bench_command(args):
+    workers = args.workers or os.cpu_count() or 1
+    results = []
+    print(f"{'笔记本':<40} {'顺序(ms)':>10} {'并行(ms)':>10} {'加速比':>8} {'进程池单元格':>12}")
+    for notebook in args.notebooks:
+        try:
+            result = compare(notebook, workers, args.min_cost)
+        except RuntimeError as e:
+            print(f"{Path(notebook).name:<40} 运行失败: {e}")
+            continue
+        results.append(result)
+        speedup = f"{result['speedup']:.2f}x" if result["speedup"] else "-"
+        print(f"{Path(notebook).name:<40} {result['sequential_time'] * 1000:>10.1f} "
+              f"{result['parallel_time'] * 1000:>10.1f} {speedup:>8} {result['dispatched']:>12}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+def main():
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+    parser = argparse.ArgumentParser(description="并行执行marimo笔记本")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="按依赖图并行执行一个笔记本")
+    run_parser.add_argument("notebook", help="marimo笔记本文件")
+    run_parser.add_argument("--workers", type=int, help="工作进程数（默认CPU核数）")
+    run_parser.add_argument("--output", help="把结果写入JSON文件")
+    run_parser.add_argument("--profiles", help="性能分析历史目录，用于估计单元格耗时")
+    run_parser.add_argument("--min-cost", type=float, default=50, help="提交到进程池的最小估计耗时（毫秒）")
+    run_parser.add_argument("--cache", help="单元格结果缓存目录")
+    run_parser.add_argument("--cache-size", type=int, default=2048, help="缓存容量上限（MB）")
+    run_parser.set_defaults(handler=run_command)
+
+    batch_parser = subparsers.add_parser("batch", help="依次并行运行多个笔记本")
+    batch_parser.add_argument("notebooks", nargs="+", help="marimo笔记本文件")
+    batch_parser.add_argument("--workers", type=int, help="工作进程数（默认CPU核数）")
+    batch_parser.add_argument("--profiles", help="性能分析历史目录，用于估计单元格耗时")
+    batch_parser.add_argument("--min-cost", type=float, default=50, help="提交到进程池的最小估计耗时（毫秒）")
+    batch_parser.add_argument("--cache", help="单元格结果缓存目录")
+    batch_parser.add_argument("--cache-size", type=int, default=2048, help="缓存容量上限（MB）")
+    batch_parser.set_defaults(handler=batch_command)
+
+    bench_parser = subparsers.add_parser("bench", help="对比顺序与并行执行的加速比")
+    bench_parser.add_argument("notebooks", nargs="+", help="marimo笔记本文件")
+    bench_parser.add_argument("--workers", type=int, help="工作进程数（默认CPU核数）")
+    bench_parser.add_argument("--output", help="把对比结果写入JSON文件")
+    bench_parser.add_argument("--min-cost", type=float, default=50, help="提交到进程池的最小估计耗时（毫秒）")
+    bench_parser.set_defaults(handler=bench_command)
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
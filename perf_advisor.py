@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+性能建议 - 通过AST静态检查marimo笔记本的每个单元格，找出数据量变大后会变慢的写法
+（逐列/逐行循环、逐项分派、循环中增长数组、循环中读文件、未关闭的 matplotlib 图形）并给出替代写法；
+多个文件并行分析，结果按文件内容哈希缓存
+"""
+
+import argparse
+import ast
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from notebook_graph import file_digest, parse_source
+
+
+# 规则变化时递增，旧的缓存结果随之失效
+RULES_VERSION = 1
+
+CACHE_LIMIT = 10000
+
+RULES = {
+    "column-loop": (
+        "逐列循环修改数据框",
+        "对所有列一次性运算，例如 cols = df.select_dtypes('number').columns; "
+        "df[cols] = (df[cols] - df[cols].mean()) / df[cols].std()",
+    ),
+    "row-iteration": (
+        "逐行遍历数据框",
+        "改用列运算、np.where 或 Series.map；iterrows/apply(axis=1) 每行都会创建 Series",
+    ),
+    "per-item-dispatch": (
+        "逐项调用函数并 append",
+        "按类型分组后批量处理（数值转为 numpy 数组整体运算），或用列表推导；"
+        "计数器在循环后一次加 len(batch)",
+    ),
+    "growing-array": (
+        "循环中拼接数组或数据框",
+        "每次拼接都复制全部已有数据（总耗时随次数平方增长）；先收集到列表，循环结束后 concat 一次",
+    ),
+    "read-in-loop": (
+        "循环中读取文件",
+        "把读取移到循环外只读一次，或一次读取所需的全部文件后再处理",
+    ),
+    "unclosed-figure": (
+        "创建 pyplot 图形但从未关闭",
+        "每次重新运行都会在 pyplot 中登记一个新图形且不会释放；显示后调用 plt.close(fig)，"
+        "或用 matplotlib.figure.Figure() 创建不受 pyplot 管理的图形",
+    ),
+}
+
+FRAME_CONCAT = {"concat", "append", "concatenate", "vstack", "hstack", "row_stack", "column_stack"}
+READ_CALLS = {"read_csv", "read_parquet", "read_excel", "read_json", "read_table", "read_feather",
+              "read_pickle", "load", "loadtxt", "genfromtxt", "open"}
+FIGURE_CALLS = {"subplots", "figure", "subplot_mosaic"}
+
+
+def dotted_name(node):
+    """把 a.b.c 形式的表达式转成字符串，其他表达式返回 None"""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return ".".join(reversed(parts))
+    return None
+
+
+def call_name(call):
+    func = call.func
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    if isinstance(func, ast.Name):
+        return func.id
+    return None
+
+
+def names_in(node):
+    return {child.id for child in ast.walk(node) if isinstance(child, ast.Name)}
+
+
+def pyplot_aliases(tree):
+    """笔记本中 matplotlib.pyplot 的别名（通常在导入单元格中定义）"""
+    aliases = {"plt"}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name == "matplotlib.pyplot" and alias.asname:
+                    aliases.add(alias.asname)
+        elif isinstance(node, ast.ImportFrom) and node.module == "matplotlib":
+            for alias in node.names:
+                if alias.name == "pyplot":
+                    aliases.add(alias.asname or "pyplot")
+    return aliases
+
+
+class CellAdvisor(ast.NodeVisitor):
+    """检查一个单元格；scope 记录当前所在的类和函数，用于报告 DataProcessor.process_batch 这样的位置"""
+
+    def __init__(self, cell, pyplot):
+        self.cell = cell
+        self.pyplot = pyplot
+        self.scope = []
+        self.loops = []
+        self.column_names = set()
+        self.figures = []
+        self.closes = False
+        self.findings = []
+
+    def run(self):
+        for statement in self.cell.node.body:
+            self.visit(statement)
+        if self.figures and not self.closes:
+            line, where = self.figures[0]
+            self.add("unclosed-figure", line, where, f"{len(self.figures)} 处创建图形")
+        return self.findings
+
+    def add(self, rule, line, where=None, detail=""):
+        title, suggestion = RULES[rule]
+        self.findings.append({
+            "rule": rule,
+            "cell": self.cell.label,
+            "cell_index": self.cell.index,
+            "line": line,
+            "where": where if where is not None else self.where(),
+            "message": f"{title}（{detail}）" if detail else title,
+            "suggestion": suggestion,
+        })
+
+    def where(self):
+        return ".".join(self.scope)
+
+    def visit_FunctionDef(self, node):
+        self.scope.append(node.name)
+        loops, self.loops = self.loops, []
+        self.generic_visit(node)
+        self.loops = loops
+        self.scope.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def visit_Assign(self, node):
+        # numeric_columns = data.select_dtypes(...).columns 之后对它的循环也是逐列循环
+        if isinstance(node.value, ast.Attribute) and node.value.attr == "columns":
+            self.column_names.update(target.id for target in node.targets if isinstance(target, ast.Name))
+        self.generic_visit(node)
+
+    def visit_For(self, node):
+        target_names = names_in(node.target)
+        iterator = node.iter
+        if self.is_column_iterable(iterator) and self.assigns_by_key(node.body, target_names):
+            self.add("column-loop", node.lineno, detail=f"for {ast.unparse(node.target)} in {ast.unparse(iterator)}")
+        elif isinstance(iterator, ast.Call) and call_name(iterator) in {"iterrows", "itertuples"}:
+            self.add("row-iteration", node.lineno, detail=f".{call_name(iterator)}()")
+        elif not self.is_range(iterator):
+            dispatch = self.item_dispatch(node.body, target_names)
+            if dispatch:
+                self.add("per-item-dispatch", node.lineno, detail=dispatch)
+        self.loops.append(node)
+        self.generic_visit(node)
+        self.loops.pop()
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node):
+        self.loops.append(node)
+        self.generic_visit(node)
+        self.loops.pop()
+
+    def visit_Call(self, node):
+        name = call_name(node)
+        func = dotted_name(node.func) or ""
+        if self.loops:
+            if name in FRAME_CONCAT and func.split(".")[0] in {"pd", "pandas", "np", "numpy"}:
+                self.add("growing-array", node.lineno, detail=f"{func}()")
+            elif name in READ_CALLS and (name == "open" or func.split(".")[0] in {"pd", "pandas", "np", "numpy"}):
+                self.add("read-in-loop", node.lineno, detail=f"{func}()")
+        if name == "apply" and any(keyword.arg == "axis" and isinstance(keyword.value, ast.Constant)
+                                   and keyword.value.value in (1, "columns") for keyword in node.keywords):
+            self.add("row-iteration", node.lineno, detail=".apply(axis=1)")
+        if isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name):
+            owner = node.func.value.id
+            if owner in self.pyplot and name in FIGURE_CALLS:
+                self.figures.append((node.lineno, self.where()))
+            elif owner in self.pyplot and name == "close":
+                self.closes = True
+        self.generic_visit(node)
+
+    def is_column_iterable(self, node):
+        if isinstance(node, ast.Attribute) and node.attr == "columns":
+            return True
+        if isinstance(node, ast.Name) and node.id in self.column_names:
+            return True
+        return isinstance(node, ast.Call) and call_name(node) in {"items", "iteritems"} \
+            and isinstance(node.func, ast.Attribute) and not node.args
+
+    @staticmethod
+    def is_range(node):
+        return isinstance(node, ast.Call) and call_name(node) in {"range", "enumerate"} and (
+            call_name(node) == "range" or not node.args or isinstance(node.args[0], ast.Call)
+            and call_name(node.args[0]) == "range"
+        )
+
+    @staticmethod
+    def assigns_by_key(body, target_names):
+        """循环体中有 df[col] = ... 这样以循环变量为键的赋值"""
+        for statement in body:
+            for node in ast.walk(statement):
+                targets = node.targets if isinstance(node, ast.Assign) else (
+                    [node.target] if isinstance(node, ast.AugAssign) else [])
+                for target in targets:
+                    if isinstance(target, ast.Subscript) and names_in(target.slice) & target_names:
+                        return True
+        return False
+
+    @staticmethod
+    def item_dispatch(body, target_names):
+        """循环体对每一项调用函数并把结果 append 到列表时，返回描述，否则返回 None"""
+        calls = []
+        appends = False
+        counters = []
+        for statement in body:
+            for node in ast.walk(statement):
+                if isinstance(node, ast.Call):
+                    if call_name(node) == "append" and isinstance(node.func, ast.Attribute):
+                        appends = True
+                    elif call_name(node) != "append" and any(
+                            names_in(argument) & target_names for argument in node.args):
+                        calls.append(ast.unparse(node.func))
+                elif isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Attribute):
+                    counters.append(ast.unparse(node.target))
+        if not (calls and appends):
+            return None
+        detail = f"每项调用 {calls[0]}()"
+        if counters:
+            detail += f"，每项更新 {counters[0]}"
+        return detail
+
+
+def advise_source(source, path="<notebook>"):
+    """检查笔记本源码，返回按行号排序的建议列表"""
+    tree = ast.parse(source, filename=str(path))
+    graph = parse_source(source, path)
+    pyplot = pyplot_aliases(tree)
+    findings = []
+    for cell in graph.cells:
+        findings.extend(CellAdvisor(cell, pyplot).run())
+    return sorted(findings, key=lambda finding: (finding["line"], finding["rule"]))
+
+
+def advise_file(path):
+    """进程池中运行：返回 (路径, 建议列表, 错误)"""
+    try:
+        return path, advise_source(Path(path).read_bytes(), path), None
+    except (OSError, SyntaxError, ValueError) as e:
+        return path, None, str(e)
+
+
+class AdvisorCache:
+    """内容哈希 -> 建议列表，保存在一个JSON文件中；规则版本变化时整体失效"""
+
+    def __init__(self, path):
+        self.path = Path(path) if path else None
+        self.entries = {}
+        if self.path is not None and self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                data = {}
+            if data.get("version") == RULES_VERSION:
+                self.entries = data.get("entries", {})
+        self.changed = False
+
+    def get(self, digest):
+        return self.entries.get(digest)
+
+    def put(self, digest, findings):
+        self.entries.pop(digest, None)
+        self.entries[digest] = findings
+        self.changed = True
+
+    def save(self):
+        if self.path is None or not self.changed:
+            return
+        # 字典按插入顺序，超出上限时丢弃最早写入的结果
+        entries = dict(list(self.entries.items())[-CACHE_LIMIT:])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps({"version": RULES_VERSION, "entries": entries}, ensure_ascii=False),
+                             encoding="utf-8")
+        os.replace(temporary, self.path)
+
+
+def advise_many(paths, cache_path=None, workers=None, mp_context=None):
+    """
+    检查多个笔记本，返回 (结果字典, 错误字典, 缓存命中数)；
+    内容哈希命中缓存的文件不再解析，其余文件在进程池中并行检查。
+    在多线程进程（如GUI）中调用时应传入 forkserver 或 spawn 的 mp_context，避免 fork 带锁的线程
+    """
+    cache = AdvisorCache(cache_path)
+    results = {}
+    errors = {}
+    pending = {}
+    hits = 0
+    for path in paths:
+        path = str(path)
+        try:
+            digest = file_digest(Path(path).read_bytes())
+        except OSError as e:
+            errors[path] = str(e)
+            continue
+        cached = cache.get(digest)
+        if cached is not None:
+            results[path] = cached
+            hits += 1
+        else:
+            pending[path] = digest
+
+    workers = workers or os.cpu_count() or 1
+    if len(pending) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=mp_context) as pool:
+            outcomes = list(pool.map(advise_file, pending, chunksize=max(1, len(pending) // (workers * 4))))
+    else:
+        outcomes = [advise_file(path) for path in pending]
+
+    for path, findings, error in outcomes:
+        if error is not None:
+            errors[path] = error
+            continue
+        results[path] = findings
+        cache.put(pending[path], findings)
+    cache.save()
+    return {path: results[path] for path in map(str, paths) if path in results}, errors, hits
+
+
+def collect(paths):
+    """展开目录为其中的 marimo 笔记本"""
+    from site_builder import discover
+
+    files = []
+    for item in paths:
+        item = Path(item)
+        if item.is_dir():
+            files.extend(str(item / relative) for relative in discover(item, item / "site"))
+        else:
+            files.append(str(item))
+    return files
+
+
+def default_cache_path(working_dir):
+    return Path(working_dir) / ".marimo_ui" / "advisor_cache.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="静态检查marimo笔记本中的性能问题")
+    parser.add_argument("paths", nargs="+", help="笔记本文件或项目目录")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数，默认为CPU核心数")
+    parser.add_argument("--cache", default=str(default_cache_path(".")), help="结果缓存文件")
+    parser.add_argument("--no-cache", action="store_true", help="不读取也不写入缓存")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    args = parser.parse_args()
+
+    files = collect(args.paths)
+    start = time.perf_counter()
+    results, errors, hits = advise_many(files, None if args.no_cache else args.cache, args.workers)
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps({"results": results, "errors": errors}, ensure_ascii=False, indent=2))
+    else:
+        for path, findings in results.items():
+            if not findings:
+                continue
+            print(f"{path}:")
+            for finding in findings:
+                where = f" {finding['where']}" if finding["where"] else ""
+                print(f"  {finding['line']:>5}  单元格 {finding['cell']}{where}: {finding['message']}")
+                print(f"         建议: {finding['suggestion']}")
+        for path, error in errors.items():
+            print(f"{path}: 解析失败 - {error}", file=sys.stderr)
+        total = sum(len(findings) for findings in results.values())
+        print(f"共检查 {len(files)} 个文件（缓存命中 {hits}），{total} 条建议，耗时 {elapsed:.3f} 秒")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
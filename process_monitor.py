@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+进程资源监控 - 直接读取 /proc 采样进程树的 CPU%、RSS、线程数和打开的文件描述符，
+为每个进程树保留固定长度的时间序列，可绘制迷你趋势图并导出CSV
+"""
+
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+
+PROC = Path("/proc")
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# 每个进程树保留的采样点数
+DEFAULT_HISTORY = 300
+
+# 进程树成员每隔多少秒重新扫描一次（两次扫描之间只读取已知进程的 stat）
+TREE_REFRESH = 5.0
+
+# 只有根进程的树（例如刚启动的 shell）首次重试的间隔，之后每次翻倍直到 TREE_REFRESH
+TREE_RETRY = 0.25
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+CSV_FIELDS = ["label", "pid", "timestamp", "cpu_percent", "rss_bytes", "threads", "fds"]
+
+
+def read_stat(pid):
+    """读取 /proc/<pid>/stat，返回 (CPU时钟滴答数, RSS字节数, 线程数)，进程不存在时返回None"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # 进程名可能包含空格和括号，从最后一个 ')' 之后开始解析
+    fields = data[data.rindex(b")") + 2:].split()
+    # fields[0] 是状态字段（stat 的第3个字段）
+    if fields[0] == b"Z":
+        return None
+    utime, stime = int(fields[11]), int(fields[12])
+    threads = int(fields[17])
+    rss = int(fields[21]) * PAGE_SIZE
+    return utime + stime, rss, threads
+
+
+def count_fds(pid):
+    try:
+        return len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        # 没有权限或进程已退出
+        return 0
+
+
+def children_of(pid):
+    """通过 /proc/<pid>/task/*/children 读取直接子进程（需要内核支持）"""
+    children = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return children
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children", "rb") as f:
+                children.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return children
+
+
+def parent_map():
+    """扫描全部进程得到 {父进程: [子进程]}，内核不提供 children 文件时使用"""
+    mapping = {}
+    for entry in os.listdir(PROC):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        ppid = int(data[data.rindex(b")") + 2:].split()[1])
+        mapping.setdefault(ppid, []).append(int(entry))
+    return mapping
+
+
+def process_tree(root, mapping=None):
+    """返回以 root 为根的所有进程ID（含自身）"""
+    pids = []
+    stack = [root]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(mapping.get(pid, []) if mapping is not None else children_of(pid))
+    return pids
+
+
+def children_supported():
+    """内核是否提供 /proc/<pid>/task/<tid>/children（需要 CONFIG_PROC_CHILDREN）"""
+    return os.path.exists(f"/proc/{os.getpid()}/task/{os.getpid()}/children")
+
+
+def discover_tree(root):
+    """返回以 root 为根的所有进程ID；内核不提供 children 文件时扫描全部进程建立父子映射"""
+    return process_tree(root, None if children_supported() else parent_map())
+
+
+def sparkline(values, width=30):
+    """用Unicode方块字符绘制迷你趋势图"""
+    values = [value for value in list(values)[-width:] if value is not None]
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARK_CHARS[0] * len(values)
+    scale = (len(SPARK_CHARS) - 1) / (high - low)
+    return "".join(SPARK_CHARS[int((value - low) * scale)] for value in values)
+
+
+class Sample:
+    """进程树的一个采样点"""
+
+    __slots__ = ("timestamp", "cpu", "rss", "threads", "fds")
+
+    def __init__(self, timestamp, cpu, rss, threads, fds):
+        self.timestamp = timestamp
+        self.cpu = cpu
+        self.rss = rss
+        self.threads = threads
+        self.fds = fds
+
+
+class TrackedProcess:
+    """被监控的进程树及其固定长度的时间序列"""
+
+    def __init__(self, pid, label, history=DEFAULT_HISTORY):
+        self.pid = pid
+        self.label = label
+        self.samples = deque(maxlen=history)
+        self.tree = [pid]
+        self.tree_checked = 0.0
+        self.tree_retry = TREE_RETRY
+        self.last_ticks = None
+        self.last_time = None
+        self.exited = False
+
+    @property
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def series(self, field):
+        return [getattr(sample, field) for sample in self.samples]
+
+
+class ProcessMonitor:
+    """
+    低开销采样器：每次采样只读取已知进程的 /proc/<pid>/stat 和 fd 目录，
+    进程树成员每 TREE_REFRESH 秒重新发现一次；可以在任意线程中登记进程
+    """
+
+    def __init__(self, history=DEFAULT_HISTORY, tree_refresh=TREE_REFRESH):
+        self.history = history
+        self.tree_refresh = tree_refresh
+        self.processes = {}
+        self.lock = threading.Lock()
+        self.use_children = children_supported()
+        # 采样器自身消耗的CPU时间，用于报告开销
+        self.sample_cpu = 0.0
+        self.sample_count = 0
+
+    @staticmethod
+    def available():
+        return PROC.joinpath("self", "stat").exists()
+
+    def track(self, pid, label):
+        with self.lock:
+            self.processes[pid] = TrackedProcess(pid, label, self.history)
+
+    def untrack(self, pid):
+        with self.lock:
+            self.processes.pop(pid, None)
+
+    def clear_exited(self):
+        with self.lock:
+            for pid in [pid for pid, process in self.processes.items() if process.exited]:
+                del self.processes[pid]
+
+    def tracked(self):
+        with self.lock:
+            return list(self.processes.values())
+
+    def sample(self):
+        """对所有仍在运行的进程树采样一次"""
+        started_cpu = time.process_time()
+        now = time.monotonic()
+        processes = [process for process in self.tracked() if not process.exited]
+
+        # 还没发现子进程的树按 tree_retry 退避重试，单进程服务器不会让每次采样都扫描全部进程
+        stale = set()
+        for process in processes:
+            interval = process.tree_retry if len(process.tree) == 1 else self.tree_refresh
+            if now - process.tree_checked >= interval:
+                stale.add(process)
+        mapping = parent_map() if stale and not self.use_children else None
+
+        for process in processes:
+            if process in stale:
+                process.tree = process_tree(process.pid, mapping if not self.use_children else None)
+                process.tree_checked = now
+                process.tree_retry = min(self.tree_refresh, process.tree_retry * 2) if len(process.tree) == 1 \
+                    else TREE_RETRY
+
+            ticks = rss = threads = fds = 0
+            alive = []
+            for pid in process.tree:
+                stat = read_stat(pid)
+                if stat is None:
+                    continue
+                alive.append(pid)
+                ticks += stat[0]
+                rss += stat[1]
+                threads += stat[2]
+                fds += count_fds(pid)
+
+            if process.pid not in alive:
+                process.exited = True
+                continue
+            process.tree = alive
+
+            cpu = None
+            if process.last_ticks is not None and now > process.last_time:
+                # 子进程退出会使累计滴答数下降，此时记为0
+                cpu = max(0.0, (ticks - process.last_ticks) / CLK_TCK / (now - process.last_time) * 100)
+            process.last_ticks = ticks
+            process.last_time = now
+            process.samples.append(Sample(time.time(), cpu, rss, threads, fds))
+
+        self.sample_cpu += time.process_time() - started_cpu
+        self.sample_count += 1
+
+    def overhead(self, interval):
+        """按平均每次采样的CPU时间估算采样器占用的CPU百分比"""
+        if not self.sample_count:
+            return 0.0
+        return self.sample_cpu / self.sample_count / interval * 100
+
+    def export_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            for process in self.tracked():
+                for sample in process.samples:
+                    writer.writerow([
+                        process.label, process.pid, f"{sample.timestamp:.3f}",
+                        "" if sample.cpu is None else f"{sample.cpu:.2f}",
+                        sample.rss, sample.threads, sample.fds,
+                    ])
+
+
+def bench(servers, duration, interval):
+    """启动若干带子进程的空闲Python进程，测量采样器自身的CPU开销"""
+    child = "import subprocess, sys, time; subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(3600)']); time.sleep(3600)"
+    processes = [subprocess.Popen([sys.executable, "-c", child]) for _ in range(servers)]
+    monitor = ProcessMonitor()
+    try:
+        time.sleep(1)
+        for index, process in enumerate(processes):
+            monitor.track(process.pid, f"server-{index}")
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            monitor.sample()
+            time.sleep(interval)
+    finally:
+        for process in processes:
+            for pid in process_tree(process.pid)[1:]:
+                try:
+                    os.kill(pid, 15)
+                except OSError:
+                    pass
+            process.terminate()
+            process.wait()
+    per_sample = monitor.sample_cpu / monitor.sample_count * 1000
+    tree_size = sum(len(process.tree) for process in monitor.tracked())
+    print(f"{servers} 个进程树（共 {tree_size} 个进程），采样 {monitor.sample_count} 次，"
+          f"每次 {per_sample:.2f} ms CPU，间隔 {interval}s 时开销 {monitor.overhead(interval):.3f}% CPU")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="采样进程树资源占用")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    watch_parser = subparsers.add_parser("watch", help="持续采样指定进程树")
+    watch_parser.add_argument("pids", type=int, nargs="+")
+    watch_parser.add_argument("--interval", type=float, default=1.0, help="采样间隔（秒）")
+    watch_parser.add_argument("--count", type=int, default=0, help="采样次数，0 表示一直运行")
+    watch_parser.add_argument("--csv", help="结束时导出CSV")
+
+    bench_parser = subparsers.add_parser("bench", help="测量采样器自身开销")
+    bench_parser.add_argument("--servers", type=int, default=50)
+    bench_parser.add_argument("--duration", type=float, default=10.0)
+    bench_parser.add_argument("--interval", type=float, default=1.0)
+
+    args = parser.parse_args()
+    if not ProcessMonitor.available():
+        sys.exit("当前系统没有 /proc，无法采样")
+
+    if args.command == "bench":
+        bench(args.servers, args.duration, args.interval)
+        return
+
+    monitor = ProcessMonitor()
+    for pid in args.pids:
+        monitor.track(pid, str(pid))
+    taken = 0
+    try:
+        while not args.count or taken < args.count:
+            monitor.sample()
+            taken += 1
+            for process in monitor.tracked():
+                latest = process.latest
+                if latest is None:
+                    continue
+                cpu = f"{latest.cpu:6.1f}%" if latest.cpu is not None else "     -"
+                print(f"{process.label:>8} {cpu} {latest.rss / 1024 ** 2:8.1f} MB {latest.threads:4} 线程 "
+                      f"{latest.fds:4} fd  {sparkline(process.series('cpu'))}")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    if args.csv:
+        monitor.export_csv(args.csv)
+        print(f"已导出 {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
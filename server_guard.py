@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+服务器守护 - 监督一个 marimo 服务器进程树：超过软内存限制时记录警告，超过硬限制时平滑重启，
+端口上持续 N 分钟没有HTTP/WebSocket连接时自动停止；所有动作写入日志
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from process_monitor import discover_tree, read_stat
+
+
+# TCP 状态码（/proc/net/tcp 的 st 列）
+TCP_ESTABLISHED = "01"
+
+# 平滑停止时等待进程退出的秒数，超时后强制结束
+TERMINATE_TIMEOUT = 10.0
+
+# 在此时间窗口（秒）内重启超过 MAX_RESTARTS 次说明启动后即超限，停止守护以免反复重启
+RESTART_WINDOW = 300.0
+MAX_RESTARTS = 3
+
+
+def guard_available():
+    """连接数和内存都从 /proc 读取；没有 /proc 的系统（macOS、Windows）上两者都会读到 0，不能守护"""
+    return Path("/proc/net/tcp").exists() and Path("/proc/self/stat").exists()
+
+
+def established_connections(port):
+    """统计本地端口上已建立的TCP连接数（HTTP keep-alive 和 WebSocket 都计入）"""
+    count = 0
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table, encoding="ascii") as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[3] == TCP_ESTABLISHED and int(fields[1].rsplit(":", 1)[1], 16) == port:
+                        count += 1
+        except (OSError, StopIteration):
+            continue
+    return count
+
+
+def tree_rss(pid):
+    """进程树的RSS总和（字节）"""
+    total = 0
+    for member in discover_tree(pid):
+        stat = read_stat(member)
+        if stat is not None:
+            total += stat[1]
+    return total
+
+
+def terminate_tree(pid, timeout=TERMINATE_TIMEOUT):
+    """先向整个进程树发送 SIGTERM，超时后对剩余进程发送 SIGKILL"""
+    members = discover_tree(pid)
+    for member in members:
+        try:
+            os.kill(member, signal.SIGTERM)
+        except OSError:
+            pass
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(read_stat(member) is None for member in members):
+            return True
+        time.sleep(0.1)
+    for member in members:
+        try:
+            os.kill(member, signal.SIGKILL)
+        except OSError:
+            pass
+    return False
+
+
+def format_mb(value):
+    return f"{value / 1024 ** 2:.0f} MB"
+
+
+class GuardPolicy:
+    """内存和空闲策略；值为 None 表示不启用对应检查"""
+
+    def __init__(self, soft_rss=None, hard_rss=None, idle_timeout=None):
+        self.soft_rss = soft_rss
+        self.hard_rss = hard_rss
+        self.idle_timeout = idle_timeout
+
+    def describe(self):
+        parts = []
+        if self.soft_rss:
+            parts.append(f"软限制 {format_mb(self.soft_rss)}")
+        if self.hard_rss:
+            parts.append(f"硬限制 {format_mb(self.hard_rss)}")
+        if self.idle_timeout:
+            parts.append(f"空闲 {self.idle_timeout / 60:g} 分钟后停止")
+        return "，".join(parts) or "无"
+
+
+class ServerGuard:
+    """根据RSS和连接数决定动作：None / "soft" / "restart" / "stop" """
+
+    def __init__(self, label, policy, log_path=None):
+        self.label = label
+        self.policy = policy
+        self.log_path = Path(log_path) if log_path else None
+        self.restarts = 0
+        self.restart_times = []
+        self.reset()
+
+    def reset(self, now=None):
+        self.last_activity = time.monotonic() if now is None else now
+        self.soft_exceeded = False
+
+    def check(self, rss, connections, now=None):
+        """返回 (动作, 说明)"""
+        now = time.monotonic() if now is None else now
+        if connections:
+            self.last_activity = now
+
+        policy = self.policy
+        if policy.hard_rss and rss >= policy.hard_rss:
+            return "restart", f"RSS {format_mb(rss)} 超过硬限制 {format_mb(policy.hard_rss)}"
+        if policy.soft_rss:
+            if rss >= policy.soft_rss and not self.soft_exceeded:
+                # 只在越过软限制时记录一次，回落后再次越过才重新记录
+                self.soft_exceeded = True
+                return "soft", f"RSS {format_mb(rss)} 超过软限制 {format_mb(policy.soft_rss)}"
+            if rss < policy.soft_rss:
+                self.soft_exceeded = False
+        if policy.idle_timeout and now - self.last_activity >= policy.idle_timeout:
+            return "stop", f"{(now - self.last_activity) / 60:.1f} 分钟没有连接"
+        return None, ""
+
+    def allow_restart(self, now=None):
+        """记录一次重启；窗口内重启次数过多时返回 False"""
+        now = time.monotonic() if now is None else now
+        self.restart_times = [moment for moment in self.restart_times if now - moment < RESTART_WINDOW]
+        self.restart_times.append(now)
+        self.restarts += 1
+        return len(self.restart_times) <= MAX_RESTARTS
+
+    def log(self, action, message):
+        line = f"{datetime.now().isoformat(timespec='seconds')} [{self.label}] {action}: {message}"
+        print(line, flush=True)
+        if self.log_path is not None:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        return line
+
+
+def supervise(command, port, guard, interval=5.0, cwd=None):
+    """运行命令并按策略守护，返回最终的退出码"""
+    stopping = False
+
+    def handle_signal(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    guard.log("start", f"{subprocess.list2cmdline(command)}（策略: {guard.policy.describe()}）")
+    while True:
+        process = subprocess.Popen(command, cwd=cwd, start_new_session=True)
+        guard.reset()
+        action = None
+        while process.poll() is None and not stopping:
+            time.sleep(interval)
+            if process.poll() is not None or stopping:
+                break
+            action, message = guard.check(tree_rss(process.pid), established_connections(port))
+            if action == "soft":
+                guard.log("warning", message)
+                action = None
+            elif action is not None:
+                break
+
+        if stopping:
+            terminate_tree(process.pid)
+            guard.log("stop", "收到停止信号")
+            return 0
+        if action is None:
+            guard.log("exit", f"服务器退出，返回码 {process.returncode}")
+            return process.returncode
+        graceful = terminate_tree(process.pid)
+        process.wait()
+        suffix = "" if graceful else "（超时后强制结束）"
+        if action == "stop":
+            guard.log("idle-shutdown", message + suffix)
+            return 0
+        if not guard.allow_restart():
+            guard.log("give-up", f"{message}，{RESTART_WINDOW / 60:g} 分钟内已重启 {MAX_RESTARTS} 次，停止服务器")
+            return 1
+        guard.log("restart", f"{message}，第 {guard.restarts} 次重启{suffix}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="按内存和空闲策略守护 marimo 服务器",
+        usage="%(prog)s [选项] -- 命令 [参数...]",
+    )
+    parser.add_argument("--port", type=int, required=True, help="服务器监听的端口（用于检测连接）")
+    parser.add_argument("--soft-rss", type=int, default=0, help="软内存限制（MB），超过时记录警告")
+    parser.add_argument("--hard-rss", type=int, default=0, help="硬内存限制（MB），超过时平滑重启")
+    parser.add_argument("--idle-minutes", type=float, default=0, help="无连接多少分钟后停止服务器")
+    parser.add_argument("--interval", type=float, default=5.0, help="检查间隔（秒）")
+    parser.add_argument("--label", default=None, help="日志中的服务器名称")
+    parser.add_argument("--log", default=None, help="日志文件")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="要守护的命令")
+    args = parser.parse_args()
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        parser.error("缺少要守护的命令")
+    if not guard_available():
+        # 读不到连接数时空闲策略会停止正在使用的服务器，宁可不启动
+        sys.exit("当前系统没有 /proc，无法检测连接数和内存，不能启用守护")
+
+    policy = GuardPolicy(
+        soft_rss=args.soft_rss * 1024 ** 2 or None,
+        hard_rss=args.hard_rss * 1024 ** 2 or None,
+        idle_timeout=args.idle_minutes * 60 or None,
+    )
+    guard = ServerGuard(args.label or f"port {args.port}", policy, args.log)
+    sys.exit(supervise(command, args.port, guard, args.interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+静态站点构建 - 导出工作目录中的所有 marimo 笔记本并生成索引页，标题取自每个笔记本第一个 mo.md 标题；
+按笔记本内容、本地导入的模块和引用的数据文件计算依赖哈希，只重新导出变化的笔记本，导出并行运行
+"""
+
+import argparse
+import ast
+import hashlib
+import html
+import inspect
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
+
+from notebook_graph import parse_source
+
+
+SITE_FORMATS = ("html", "html-wasm")
+
+MANIFEST_NAME = ".site_manifest.json"
+
+# 遍历时跳过的目录
+SKIP_DIRS = {".git", ".venv", "venv", "__pycache__", "node_modules", "__marimo__", ".marimo_ui", "site"}
+
+HEADING_PATTERN = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$", re.M)
+
+
+def is_notebook(path):
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return False
+    return b"marimo.App" in data and b"@app.cell" in data
+
+
+def discover(root, output_dir):
+    """工作目录中的所有 marimo 笔记本（相对路径，排序）"""
+    root = Path(root).resolve()
+    output_dir = Path(output_dir).resolve()
+    notebooks = []
+    for directory, dirnames, filenames in os.walk(root):
+        current = Path(directory)
+        dirnames[:] = sorted(
+            name for name in dirnames
+            if name not in SKIP_DIRS and not name.startswith(".") and (current / name).resolve() != output_dir
+        )
+        for filename in sorted(filenames):
+            path = current / filename
+            if filename.endswith(".py") and is_notebook(path):
+                notebooks.append(path.relative_to(root).as_posix())
+    return notebooks
+
+
+def markdown_text(node):
+    """mo.md 的参数：普通字符串、r 字符串或只取常量部分的 f 字符串"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        return "".join(part.value for part in node.values if isinstance(part, ast.Constant))
+    return None
+
+
+def notebook_title(source, fallback):
+    """第一个 mo.md 中的第一个 Markdown 标题，否则使用 App(app_title=...)，最后使用文件名"""
+    try:
+        graph = parse_source(source)
+    except SyntaxError:
+        return fallback
+    for cell in graph.cells:
+        calls = sorted(
+            (node for node in ast.walk(cell.node)
+             if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "md"
+             and node.args),
+            key=lambda node: (node.lineno, node.col_offset),
+        )
+        for call in calls:
+            text = markdown_text(call.args[0])
+            # 与 mo.md 相同，先去掉三引号字符串的公共缩进
+            match = HEADING_PATTERN.search(inspect.cleandoc(text or ""))
+            if match:
+                return match.group(1).strip()
+    match = re.search(r"app_title\s*=\s*[\"'](.+?)[\"']", source)
+    return match.group(1) if match else fallback
+
+
+def local_dependencies(path, root):
+    """
+    笔记本直接或间接导入的本地模块，以及源码中以字符串常量引用且存在的数据文件；
+    这些文件变化时，笔记本的导出结果也可能变化
+    """
+    root = Path(root).resolve()
+    pending = [Path(path).resolve()]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            tree = ast.parse(current.read_text(encoding="utf-8"), filename=str(current))
+        except (OSError, SyntaxError, UnicodeDecodeError):
+            continue
+        for node in ast.walk(tree):
+            names = []
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                names = [node.module]
+            elif isinstance(node, ast.ImportFrom) and node.level > 0:
+                names = [node.module or ""]
+            for name in names:
+                for base in (current.parent, root):
+                    relative = Path(*name.split(".")) if name else Path()
+                    for candidate in (base / relative.with_suffix(".py") if name else None,
+                                      base / relative / "__init__.py"):
+                        if candidate is not None and candidate.is_file():
+                            pending.append(candidate.resolve())
+            if (isinstance(node, ast.Constant) and isinstance(node.value, str) and 0 < len(node.value) < 256
+                    and "\n" not in node.value and "." in node.value):
+                candidate = (current.parent / node.value)
+                try:
+                    if candidate.is_file():
+                        seen.add(candidate.resolve())
+                except OSError:
+                    pass
+    seen.discard(Path(path).resolve())
+    return sorted(
+        dependency.relative_to(root).as_posix() for dependency in seen if dependency.is_relative_to(root)
+    )
+
+
+class FileHashes:
+    """按 (修改时间, 大小) 缓存文件哈希，未改动的文件不重复读取"""
+
+    def __init__(self, cache=None):
+        self.cache = cache or {}
+
+    def digest(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return "missing"
+        key = str(path)
+        cached = self.cache.get(key)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        digest = hashlib.sha256(Path(path).read_bytes()).hexdigest()
+        self.cache[key] = [stat.st_mtime_ns, stat.st_size, digest]
+        return digest
+
+
+def output_name(notebook, export_format):
+    relative = Path(notebook)
+    if export_format == "html-wasm":
+        return (relative.parent / f"{relative.stem}_wasm" / "index.html").as_posix()
+    return relative.with_suffix(".html").as_posix()
+
+
+def build_page(root, notebook, output_dir, export_format, include_code, asset_store):
+    """在工作进程中导出一个笔记本，返回 (笔记本, 错误信息, 是否有单元格出错, 耗时)"""
+    from multi_export import export_all
+
+    started = time.perf_counter()
+    page_dir = Path(output_dir) / Path(notebook).parent
+    try:
+        result = export_all(Path(root) / notebook, [export_format], page_dir, include_code,
+                            wasm_assets="shared", asset_store=asset_store, assets_root=output_dir)
+    except Exception as e:
+        return notebook, f"{type(e).__name__}: {e}", False, time.perf_counter() - started
+    error = result["errors"].get(export_format)
+    return notebook, error, result["did_error"], time.perf_counter() - started
+
+
+def render_index(title, pages, export_format):
+    items = []
+    for notebook, page in sorted(pages.items(), key=lambda item: item[0]):
+        href = html.escape(quote(output_name(notebook, export_format)), quote=True)
+        note = " <span class=\"warn\">（部分单元格出错）</span>" if page.get("did_error") else ""
+        items.append(f"<li><a href=\"{href}\">{html.escape(page['title'])}</a> "
+                     f"<span class=\"path\">{html.escape(notebook)}</span>{note}</li>")
+    return (
+        "<!DOCTYPE html>\n<html lang=\"zh-CN\">\n<head>\n<meta charset=\"utf-8\">\n"
+        "<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">\n"
+        f"<title>{html.escape(title)}</title>\n"
+        "<style>body{font-family:system-ui,sans-serif;max-width:760px;margin:2rem auto;padding:0 1rem}"
+        "li{margin:.4rem 0}.path{color:#888;font-size:.85em;margin-left:.5em}.warn{color:#b45309}</style>\n"
+        f"</head>\n<body>\n<h1>{html.escape(title)}</h1>\n<p>{len(pages)} 个笔记本</p>\n<ul>\n"
+        + "\n".join(items) + "\n</ul>\n</body>\n</html>\n"
+    )
+
+
+def build_site(root, output_dir=None, export_format="html", include_code=True, workers=None, force=False,
+               asset_store=None, title=None, log=print):
+    """
+    增量构建站点，返回 {"built": [...], "skipped": n, "removed": [...], "failed": {...}, "index": bool, "seconds": s}；
+    清单 .site_manifest.json 保存在输出目录中，导出设置或 marimo 版本变化时全部重新导出
+    """
+    import marimo
+
+    started = time.perf_counter()
+    root = Path(root).resolve()
+    output_dir = Path(output_dir).resolve() if output_dir else root / "site"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+    settings = {"format": export_format, "include_code": include_code, "marimo": marimo.__version__}
+    if force or manifest.get("settings") != settings:
+        manifest = {"settings": settings, "pages": {}, "hashes": manifest.get("hashes", {})}
+    hashes = FileHashes(manifest.get("hashes"))
+    pages = manifest["pages"]
+
+    notebooks = discover(root, output_dir)
+    stale = []
+    current = {}
+    for notebook in notebooks:
+        path = root / notebook
+        dependencies = local_dependencies(path, root)
+        digest = hashlib.sha256(json.dumps(
+            [hashes.digest(path)] + [[dependency, hashes.digest(root / dependency)] for dependency in dependencies]
+        ).encode("utf-8")).hexdigest()
+        previous = pages.get(notebook)
+        output = output_dir / output_name(notebook, export_format)
+        if previous and previous["digest"] == digest and output.exists():
+            current[notebook] = previous
+            continue
+        page_title = notebook_title(path.read_text(encoding="utf-8"), Path(notebook).stem)
+        current[notebook] = {"digest": None, "title": page_title, "dependencies": dependencies, "pending": digest}
+        stale.append(notebook)
+
+    removed = sorted(set(pages) - set(current))
+    for notebook in removed:
+        output = output_dir / output_name(notebook, export_format)
+        if export_format == "html-wasm":
+            shutil.rmtree(output.parent, ignore_errors=True)
+        elif output.exists():
+            output.unlink()
+
+    failed = {}
+    built = []
+    if stale:
+        log(f"需要导出 {len(stale)} / {len(notebooks)} 个笔记本")
+        store = asset_store or output_dir / ".marimo_assets"
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(build_page, root, notebook, output_dir, export_format, include_code, store)
+                       for notebook in stale]
+            for future in as_completed(futures):
+                notebook, error, did_error, seconds = future.result()
+                page = current[notebook]
+                if error:
+                    failed[notebook] = error
+                    log(f"失败 {notebook}: {error}")
+                    continue
+                page["digest"] = page.pop("pending")
+                page["did_error"] = did_error
+                page["seconds"] = seconds
+                built.append(notebook)
+                log(f"导出 {notebook}（{seconds:.1f}s）{'，部分单元格出错' if did_error else ''}")
+
+    # 失败的页面不写入清单，下次构建时重试
+    for notebook in failed:
+        current.pop(notebook)
+    index_path = output_dir / "index.html"
+    index = render_index(title or root.name, current, export_format)
+    index_changed = not index_path.exists() or index_path.read_text(encoding="utf-8") != index
+    if index_changed:
+        index_path.write_text(index, encoding="utf-8")
+
+    manifest = {
+        "settings": settings,
+        "pages": current,
+        "hashes": {key: value for key, value in hashes.cache.items() if Path(key).exists()},
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    return {"notebooks": len(notebooks), "built": sorted(built), "skipped": len(notebooks) - len(stale),
+            "removed": removed, "failed": failed, "index": index_changed,
+            "seconds": time.perf_counter() - started, "output_dir": str(output_dir)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量构建工作目录中所有笔记本的静态站点")
+    parser.add_argument("root", nargs="?", default=".", help="工作目录")
+    parser.add_argument("--output-dir", help="站点目录，默认是工作目录下的 site")
+    parser.add_argument("--format", choices=SITE_FORMATS, default="html",
+                        help="html 执行笔记本并导出静态结果；html-wasm 不执行，静态资源在站点中共用一份")
+    parser.add_argument("--no-include-code", action="store_true", help="页面中不包含代码")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数，默认为CPU核心数")
+    parser.add_argument("--force", action="store_true", help="忽略清单，全部重新导出")
+    parser.add_argument("--asset-store", help="html-wasm 资源存储目录，默认是站点目录下的 .marimo_assets")
+    parser.add_argument("--title", help="索引页标题，默认是工作目录名")
+    parser.add_argument("--output", help="把构建结果写入JSON文件")
+    args = parser.parse_args()
+
+    result = build_site(args.root, args.output_dir, args.format, not args.no_include_code, args.workers,
+                        args.force, args.asset_store, args.title)
+    print(f"{result['notebooks']} 个笔记本：导出 {len(result['built'])}，未变化 {result['skipped']}，"
+          f"删除 {len(result['removed'])}，失败 {len(result['failed'])}；"
+          f"索引页{'已更新' if result['index'] else '未变化'}；用时 {result['seconds']:.2f} 秒")
+    print(f"站点: {Path(result['output_dir']) / 'index.html'}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    if result["failed"]:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
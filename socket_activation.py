@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+按需启动 - 预先监听笔记本的端口，第一个连接到达时才启动 marimo run，
+启动期间的连接排队等待，服务器空闲一段时间后自动停止（缩容到零）
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+from app_proxy import free_port, stop_on_signals
+
+
+READ_SIZE = 64 * 1024
+
+# 监听队列长度，启动期间到达的连接在此排队
+BACKLOG = 512
+
+# 每隔多少秒检查一次空闲
+IDLE_CHECK_INTERVAL = 5.0
+
+# 监听就绪时输出到标准输出的标记，供基准测试等待
+READY_MARKER = "listening"
+
+
+def log(message):
+    print(f"{datetime.now().isoformat(timespec='seconds')} {message}", flush=True)
+
+
+class ActivatedServer:
+    """
+    持有公开端口的监听socket，在内部端口上按需启动 marimo run 并在两者之间转发TCP字节流，
+    HTTP 和 WebSocket 都无需解析
+    """
+
+    def __init__(self, notebook, port, host="127.0.0.1", idle_timeout=600, extra_args=(), status_path=None):
+        self.notebook = Path(notebook).resolve()
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.extra_args = list(extra_args)
+        self.status_path = Path(status_path) if status_path else None
+        self.backend_port = None
+        self.process = None
+        self.ready = False
+        self.starting = None
+        self.active = 0
+        self.last_activity = time.monotonic()
+        self.cold_starts = 0
+        self.last_cold_start = None
+        self.server = None
+
+    @property
+    def state(self):
+        if self.process is None or self.process.returncode is not None:
+            return "stopped"
+        return "running" if self.ready else "starting"
+
+    def write_status(self):
+        if self.status_path is None:
+            return
+        status = {
+            "notebook": str(self.notebook),
+            "port": self.port,
+            "state": self.state,
+            "pid": self.process.pid if self.state == "running" else None,
+            "active": self.active,
+            "cold_starts": self.cold_starts,
+            "last_cold_start_ms": round(self.last_cold_start * 1000, 1) if self.last_cold_start else None,
+            "updated": time.time(),
+        }
+        self.status_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.status_path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(status, ensure_ascii=False), encoding="utf-8")
+        os.replace(temp_path, self.status_path)
+
+    async def listen(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port, backlog=BACKLOG)
+        self.write_status()
+        log(f"{READY_MARKER} {self.host}:{self.port} -> {self.notebook.name}（空闲 {self.idle_timeout:g} 秒后停止）")
+
+    async def ensure_started(self):
+        """服务器未运行时启动它；并发到达的连接等待同一次启动"""
+        if self.state == "running":
+            return
+        if self.starting is None or self.starting.done():
+            self.starting = asyncio.ensure_future(self.start_backend())
+        await asyncio.shield(self.starting)
+
+    async def start_backend(self, timeout=120):
+        started = time.perf_counter()
+        self.backend_port = free_port()
+        self.ready = False
+        command = [
+            sys.executable, "-m", "marimo", "run", str(self.notebook),
+            "--host", "127.0.0.1", "--port", str(self.backend_port), "--headless", *self.extra_args,
+        ]
+        self.process = await asyncio.create_subprocess_exec(
+            *command, cwd=self.notebook.parent, stdout=subprocess.DEVNULL
+        )
+        self.write_status()
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                if self.process.returncode is not None:
+                    raise RuntimeError(f"marimo 进程退出，返回码 {self.process.returncode}")
+                try:
+                    _, writer = await asyncio.open_connection("127.0.0.1", self.backend_port)
+                    writer.close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("等待 marimo 启动超时")
+                    await asyncio.sleep(0.05)
+        except BaseException:
+            # 超时、出错或被取消时结束并回收启动到一半的进程，下一个连接会重新启动
+            await self.stop_backend("启动失败")
+            raise
+        self.ready = True
+        self.cold_starts += 1
+        self.last_cold_start = time.perf_counter() - started
+        log(f"已启动 marimo（PID {self.process.pid}），冷启动 {self.last_cold_start * 1000:.0f} ms")
+        self.write_status()
+
+    async def stop_backend(self, reason):
+        if self.process is None or self.process.returncode is not None:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), 10)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+        self.ready = False
+        log(f"已停止 marimo: {reason}")
+        self.write_status()
+
+    async def handle(self, reader, writer):
+        self.active += 1
+        self.last_activity = time.monotonic()
+        try:
+            try:
+                await self.ensure_started()
+                upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", self.backend_port)
+            except (RuntimeError, OSError) as e:
+                log(f"无法转发连接: {e}")
+                return
+
+            async def pipe(source, destination):
+                try:
+                    while data := await source.read(READ_SIZE):
+                        destination.write(data)
+                        await destination.drain()
+                except ConnectionError:
+                    pass
+                finally:
+                    destination.close()
+
+            await asyncio.gather(pipe(reader, upstream_writer), pipe(upstream_reader, writer))
+        finally:
+            writer.close()
+            self.active -= 1
+            self.last_activity = time.monotonic()
+
+    async def idle_loop(self):
+        while True:
+            await asyncio.sleep(min(IDLE_CHECK_INTERVAL, self.idle_timeout))
+            if self.state != "running":
+                continue
+            if self.active:
+                self.last_activity = time.monotonic()
+            elif time.monotonic() - self.last_activity >= self.idle_timeout:
+                await self.stop_backend(f"{self.idle_timeout:g} 秒没有连接，缩容到零")
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+        await self.stop_backend("激活器退出")
+        if self.status_path is not None:
+            self.status_path.unlink(missing_ok=True)
+
+
+async def serve(args):
+    extra_args = ["--session-ttl", str(args.session_ttl)]
+    if args.include_code:
+        extra_args.append("--include-code")
+    server = ActivatedServer(args.notebook, args.port, args.host, args.idle_minutes * 60, extra_args, args.status)
+
+    stop = asyncio.Event()
+    stop_on_signals(stop)
+
+    await server.listen()
+    idle_task = asyncio.create_task(server.idle_loop())
+    try:
+        await stop.wait()
+    finally:
+        idle_task.cancel()
+        await server.close()
+
+
+def timed_get(url, timeout=120):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def wait_for_port(port, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("服务器进程提前退出")
+        try:
+            timed_get(f"http://127.0.0.1:{port}/health", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("等待服务器就绪超时")
+
+
+def stop_process(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def bench(notebook, runs, warm_requests):
+    """比较按需启动的首个请求、按需启动后的后续请求和常驻服务器的请求延迟"""
+    script = str(Path(__file__).resolve())
+    cold, warm = [], []
+    for _ in range(runs):
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, script, "serve", notebook, "--port", str(port), "--idle-minutes", "60"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+        try:
+            # 等待监听就绪；不能用连接探测，否则探测本身会触发启动
+            while READY_MARKER not in (process.stdout.readline() or READY_MARKER):
+                pass
+            cold.append(timed_get(f"http://127.0.0.1:{port}/"))
+            warm.extend(timed_get(f"http://127.0.0.1:{port}/") for _ in range(warm_requests))
+        finally:
+            stop_process(process)
+
+    always_on = []
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "marimo", "run", notebook, "--host", "127.0.0.1", "--port", str(port), "--headless"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port, process)
+        timed_get(f"http://127.0.0.1:{port}/")
+        always_on.extend(timed_get(f"http://127.0.0.1:{port}/") for _ in range(warm_requests * runs))
+    finally:
+        stop_process(process)
+
+    results = {}
+    for name, values in (("按需启动-首个请求", cold), ("按需启动-后续请求", warm), ("常驻服务器", always_on)):
+        results[name] = {
+            "count": len(values),
+            "median_ms": statistics.median(values) * 1000,
+            "max_ms": max(values) * 1000,
+        }
+        print(f"{name:<12} n={len(values):<4} 中位数 {results[name]['median_ms']:8.1f} ms  "
+              f"最大 {results[name]['max_ms']:8.1f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按需启动 marimo 应用（socket 激活）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="监听端口，首个连接到达时启动 marimo run")
+    serve_parser.add_argument("notebook")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=2718)
+    serve_parser.add_argument("--idle-minutes", type=float, default=10, help="没有连接多少分钟后停止服务器")
+    serve_parser.add_argument("--session-ttl", type=int, default=120, help="会话超时（秒）")
+    serve_parser.add_argument("--include-code", action="store_true", help="在应用中包含代码")
+    serve_parser.add_argument("--status", help="把当前状态写入此JSON文件")
+
+    bench_parser = subparsers.add_parser("bench", help="比较首个请求延迟与常驻服务器")
+    bench_parser.add_argument("notebook")
+    bench_parser.add_argument("--runs", type=int, default=3, help="冷启动次数")
+    bench_parser.add_argument("--requests", type=int, default=5, help="每次冷启动后的后续请求数")
+    bench_parser.add_argument("--output", help="把结果写入JSON文件")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        asyncio.run(serve(args))
+    else:
+        results = bench(args.notebook, args.runs, args.requests)
+        if args.output:
+            Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
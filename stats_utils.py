@@ -0,0 +1,13 @@
+"""
+统计工具 - 代理延迟统计、负载测试和启动历史共用的百分位数计算
+"""
+
+import math
+
+
+def percentile(values, q):
+    """已排序列表的最近秩百分位数：第 ceil(q/100 * n) 个值"""
+    if not values:
+        return None
+    rank = max(0, min(len(values) - 1, math.ceil(q * len(values) / 100) - 1))
+    return values[rank]